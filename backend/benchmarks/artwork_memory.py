@@ -0,0 +1,135 @@
+"""
+Peak RSS of rendering a production PDF with large artwork embedded.
+
+Writes a synthetic full-resolution PPM, converts it to the requested format
+(JPEG by default, which is what customers upload; at 300x250 cm and 150 DPI it
+decodes to about 800 MB), renders it through ProductionGenerator in a child
+process and fails if the child's peak RSS exceeds the configured image cap plus
+interpreter overhead plus the compressed output. reportlab assembles the whole
+document in memory on save, so the JPEG strip data is resident twice at the end;
+raw decoded pixels never are beyond the cap.
+
+Usage (from backend/):
+    python benchmarks/artwork_memory.py --size "300x250 cm" --dpi 150 --max-image-mb 256 --format jpeg
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Interpreter, SQLModel, reportlab and PIL before any artwork is touched
+BASELINE_ALLOWANCE_MB = 150
+
+def write_synthetic_ppm(path: str, width: int, height: int):
+    row = bytes((x * 7 + c * 85) % 256 for x in range(width) for c in range(3))
+    with open(path, "wb") as f:
+        f.write(f"P6\n{width} {height}\n255\n".encode())
+        for y in range(height):
+            # Shift rows so the image is not trivially compressible
+            shift = (y * 3) % len(row)
+            f.write(row[shift:] + row[:shift])
+
+def render(args):
+    from sqlmodel import Session
+    from database import engine
+    from models import Order
+    from services.line_items import build_line_items
+    from services.production_generator import ProductionGenerator
+    from services.storage import LocalStorage
+
+    order = Order(
+        id=1, amount=0, recipient_name="Bench", street="-", city="-", zip_code="-", country="-",
+        line_items_json=json.dumps([{"sku": "BENCH", "variant": args.size, "image_path": args.image}]),
+    )
+    with Session(engine) as session:
+        session.add(order)
+        session.add_all(build_line_items(order.id, order.line_items_json))
+        session.commit()
+        session.refresh(order)
+    generator = ProductionGenerator(LocalStorage(args.output_dir), dpi=args.dpi, max_image_memory_mb=args.max_image_mb)
+    key = generator.generate_pdf(order)
+    print(json.dumps({"pdf_bytes": generator.storage.stat(key).size, "peak_rss_mb": round(peak_rss_mb(), 1)}))
+
+def peak_rss_mb() -> float:
+    """High-water RSS of this process image. ru_maxrss would also count the parent's
+    RSS at fork, which includes the artwork it decoded to convert it."""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", default="300x250 cm")
+    parser.add_argument("--dpi", type=int, default=150)
+    parser.add_argument("--max-image-mb", type=int, default=256)
+    parser.add_argument("--format", choices=["jpeg", "png", "ppm"], default="jpeg", help="Format of the artwork file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--image", help=argparse.SUPPRESS)
+    parser.add_argument("--output-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        render(args)
+        return
+
+    from services.artwork import cm_to_px
+    from services.line_items import parse_variant_dimensions
+
+    width_cm, height_cm = parse_variant_dimensions(args.size)
+    # Artwork covers the 2 cm bleed on each side
+    width_px, height_px = cm_to_px(width_cm + 4, args.dpi), cm_to_px(height_cm + 4, args.dpi)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Preflight results are cached in the database
+        env = {**os.environ, "DATABASE_URL": f"sqlite:///{tmp}/artwork.db"}
+        subprocess.run([sys.executable, "-m", "migrations.migrate"], cwd=BACKEND_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+        image = os.path.join(tmp, "artwork.ppm")
+        write_synthetic_ppm(image, width_px, height_px)
+        if args.format != "ppm":
+            # The parent can afford the full decode; the child under test cannot
+            from PIL import Image
+
+            Image.MAX_IMAGE_PIXELS = None
+            with Image.open(image) as im:
+                converted = os.path.join(tmp, f"artwork.{args.format}")
+                if args.format == "jpeg":
+                    im.save(converted, quality=90)
+                else:
+                    im.save(converted, compress_level=1)
+            os.remove(image)
+            image = converted
+        child = subprocess.run(
+            [sys.executable, __file__, "--child", "--size", args.size, "--dpi", str(args.dpi),
+             "--max-image-mb", str(args.max_image_mb), "--image", image, "--output-dir", tmp],
+            cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+        )
+        if child.returncode != 0:
+            sys.exit(child.stderr)
+
+    decoded_mb = width_px * height_px * 3 / (1024 * 1024)
+    output = json.loads(child.stdout)
+    peak_mb = output["peak_rss_mb"]
+    pdf_mb = output["pdf_bytes"] / (1024 * 1024)
+    limit_mb = round(args.max_image_mb + BASELINE_ALLOWANCE_MB + 2 * pdf_mb)
+    result = {
+        "artwork_format": args.format,
+        "artwork_px": [width_px, height_px],
+        "decoded_artwork_mb": round(decoded_mb, 1),
+        "limit_mb": limit_mb,
+        **output,
+    }
+    print(json.dumps(result, indent=2))
+    if peak_mb > limit_mb:
+        sys.exit(f"Peak RSS {peak_mb:.0f} MB exceeds {limit_mb} MB")
+
+if __name__ == "__main__":
+    main()
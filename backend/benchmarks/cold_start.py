@@ -0,0 +1,98 @@
+"""
+Cold start: time from launching uvicorn to the first successful request, and
+where the import time goes.
+
+Migrates a temporary SQLite database (as the release phase would), then starts
+`uvicorn main:app` --runs times, polling /health until it answers, and reports
+the median time-to-first-request. One more run with PYTHONPROFILEIMPORTTIME=1
+(the interpreter's own import profiler) lists the slowest modules and packages
+by self time.
+
+Usage (from backend/):
+    python benchmarks/cold_start.py --runs 5 --top 15
+"""
+import argparse
+import collections
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def first_request(env: dict) -> tuple:
+    """Launches uvicorn; returns (ms until /health answered, import profile lines)."""
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stderr=subprocess.PIPE, text=True,
+    )
+    try:
+        while True:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        break
+            except OSError:
+                if server.poll() is not None:
+                    sys.exit(f"uvicorn exited with {server.returncode}:\n{server.stderr.read()}")
+                time.sleep(0.005)
+        elapsed = (time.perf_counter() - started) * 1000
+    finally:
+        server.terminate()
+        _, stderr = server.communicate()
+    return elapsed, [line for line in stderr.splitlines() if line.startswith("import time:")]
+
+def parse_profile(lines: list) -> list:
+    """(module, self us, cumulative us) from -X importtime output."""
+    rows = []
+    for line in lines:
+        if "self [us]" in line:
+            continue # Header; every process prints one
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Modules and packages to list")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{tmp}/cold.db"}
+    env.pop("PYTHONPROFILEIMPORTTIME", None)
+    subprocess.run([sys.executable, "-m", "migrations.migrate"], cwd=BACKEND_DIR, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+
+    # Profiling imports slows them down, so it gets a run of its own
+    timings = [first_request(env)[0] for _ in range(args.runs)]
+    _, profile = first_request({**env, "PYTHONPROFILEIMPORTTIME": "1"})
+    print(f"time to first request: median {statistics.median(timings):.0f} ms "
+          f"(min {min(timings):.0f}, max {max(timings):.0f}) over {args.runs} runs")
+
+    rows = parse_profile(profile)
+    print(f"\n{len(rows)} modules imported, {sum(r[1] for r in rows) / 1000:.0f} ms in total")
+    print(f"\n{'slowest modules (self)':<48} {'self':>8} {'cumulative':>11}")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda r: -r[1])[:args.top]:
+        print(f"{name:<48} {self_us / 1000:>6.1f}ms {cumulative_us / 1000:>9.1f}ms")
+
+    packages = collections.Counter()
+    for name, self_us, _ in rows:
+        packages[name.split(".")[0]] += self_us
+    print(f"\n{'packages (self time summed)':<48} {'total':>8}")
+    for name, total_us in packages.most_common(args.top):
+        print(f"{name:<48} {total_us / 1000:>6.1f}ms")
+
+if __name__ == "__main__":
+    main()
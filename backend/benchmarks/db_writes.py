@@ -0,0 +1,77 @@
+"""
+Concurrent write throughput: the original engine setup vs. database.build_engine.
+
+Usage (from backend/):
+    python benchmarks/db_writes.py --writers 8 --writes 200
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.exc import DBAPIError
+from sqlmodel import SQLModel, Session, create_engine
+
+from database import build_engine
+from models import Payment
+
+def run_writers(engine, writers: int, writes: int) -> dict:
+    SQLModel.metadata.create_all(engine)
+    errors = []
+    barrier = threading.Barrier(writers)
+
+    def worker():
+        barrier.wait()
+        for _ in range(writes):
+            try:
+                with Session(engine) as session:
+                    session.add(Payment(order_id=1, amount=10.0))
+                    session.commit()
+            except DBAPIError as e:
+                errors.append(str(e.orig))
+
+    threads = [threading.Thread(target=worker) for _ in range(writers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    committed = writers * writes - len(errors)
+    engine.dispose()
+    return {
+        "committed": committed,
+        "errors": len(errors),
+        "seconds": round(elapsed, 3),
+        "writes_per_sec": round(committed / elapsed, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=200)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        # Before: the engine database.py used to build (echo on, rollback journal, FULL sync).
+        # Echo output goes to /dev/null so the terminal itself is not what we measure.
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            before = create_engine(f"sqlite:///{tmp}/before.db", echo=True)
+            results["before"] = run_writers(before, args.writers, args.writes)
+
+        after = build_engine(f"sqlite:///{tmp}/after.db", echo=False)
+        results["after"] = run_writers(after, args.writers, args.writes)
+
+    results["speedup"] = round(results["after"]["writes_per_sec"] / max(results["before"]["writes_per_sec"], 0.1), 2)
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
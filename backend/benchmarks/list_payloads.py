@@ -0,0 +1,111 @@
+"""
+List endpoint cost: server time and bytes per listed row, with and without
+gzip, for the admin and import order lists and the user list.
+
+Seeds a temporary SQLite database with realistic orders (full address, a few
+line items each) and calls the endpoints in-process, so the numbers are the
+app's own: query, serialization and compression, no network.
+
+Usage (from backend/):
+    python benchmarks/list_payloads.py --orders 5000 --limit 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+REPEAT = 30
+FIRST_NAMES = ["John", "Sarah", "Hans", "Michael", "Emma", "Olivia", "Liam", "Noah", "Ava", "Mia", "Lucas", "Zoe"]
+LAST_NAMES = ["Doe", "Smith", "Muller", "Brown", "Watson", "Garcia", "Rossi", "Novak", "Kowalski", "Jensen"]
+CITIES = ["Springfield", "London", "Berlin", "Toronto", "New York", "Paris", "Madrid", "Vienna", "Oslo", "Prague"]
+
+def seed(engine, orders: int, users: int):
+    from sqlalchemy import insert
+    from sqlmodel import SQLModel
+    from migrations import migrate
+    from models import Order, User
+
+    SQLModel.metadata.create_all(engine)
+    rng = random.Random(1)
+    items = [
+        {"sku": "WL-204", "title": "Tropical Jungle Wallpaper", "quantity": 2, "variant": "300x250 cm",
+         "image_url": "https://cdn.example.com/designs/tropical-jungle-wallpaper-full-resolution.png"},
+        {"sku": "CNV-001", "title": "Abstract Canvas Art", "quantity": 1, "variant": "100x70 cm",
+         "image_url": "https://cdn.example.com/designs/abstract-canvas-art-full-resolution.png"},
+    ]
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"email": f"customer{i}@example.com", "full_name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+             "password_hash": f"$2b$12${rng.getrandbits(350):x}"[:60],
+             "custom_pricing_json": json.dumps({f"material-{m}": 12.5 for m in range(8)}) if i % 3 == 0 else None}
+            for i in range(users)
+        ])
+        conn.execute(insert(Order), [
+            {"source": "etsy", "external_id": f"ETSY-{100000 + i}", "amount": round(rng.uniform(20, 400), 2), "currency": "USD",
+             "payment_status": "paid", "status": rng.choice(["draft", "in_production", "shipped"]),
+             "line_items_json": json.dumps(rng.sample(items, rng.randint(1, 2))),
+             "recipient_name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+             "recipient_email": f"customer{rng.randint(1, 10 ** 6)}@example.com",
+             "street": f"{rng.randint(1, 9999)} {rng.choice(LAST_NAMES)} Street, Apt {rng.randint(1, 300)}",
+             "city": rng.choice(CITIES), "state": "-", "zip_code": str(rng.randint(10000, 99999)), "country": "US",
+             "tracking_number": f"1Z{rng.randint(10 ** 15, 10 ** 16)}", "version": 0}
+            for i in range(orders)
+        ])
+    migrate.upgrade(engine) # As a deploy would, before the app starts
+
+async def measure(client, path: str, params: dict) -> dict:
+    samples = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        response = await client.get(path, params=params, headers={"Accept-Encoding": "identity"})
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    body = response.json()
+    rows = len(body) if isinstance(body, list) else len(body["items"])
+    async with client.stream("GET", path, params=params, headers={"Accept-Encoding": "gzip"}) as compressed:
+        wire = b"".join([chunk async for chunk in compressed.aiter_raw()])
+    return {
+        "rows": rows, "p50_ms": samples[len(samples) // 2], "bytes_per_row": len(response.content) / max(rows, 1),
+        "gzip_bytes_per_row": len(wire) / max(rows, 1), "encoding": compressed.headers.get("content-encoding", "identity"),
+    }
+
+async def run(args):
+    import httpx
+    from main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for path, params in (
+                ("/admin/orders", {"limit": args.limit}),
+                ("/integrations/orders", {"limit": args.limit}),
+                ("/admin/users", {"limit": args.limit}),
+            ):
+                result = await measure(client, path, params)
+                print(f"{path:<22} {result['rows']:>5} rows  {result['p50_ms']:>7.2f} ms  "
+                      f"{result['bytes_per_row']:>6.0f} B/row  {result['gzip_bytes_per_row']:>5.0f} B/row "
+                      f"on the wire ({result['encoding']})")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=500)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/lists.db"
+    from database import engine
+
+    seed(engine, args.orders, args.users)
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Memory and latency of the streaming order export.
+
+Seeds a temporary SQLite database with a small and a large number of orders,
+streams each through OrderExporter in a child process and reports time to
+first byte, throughput and peak RSS. Fails if the large export needs
+noticeably more memory than the small one, i.e. if memory grows with rows.
+SQLite's mmap window and page cache are shrunk in the child: both are capped
+by the pragmas but would otherwise show up in RSS as the file is read.
+
+Usage (from backend/):
+    python benchmarks/order_export.py --rows 1000000 --format csv
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+SMALL_ROWS = 10000
+# Allowed RSS growth between the small and the large export
+MAX_GROWTH_MB = 32
+
+def seed(database_url: str, rows: int):
+    from sqlalchemy import insert
+    from sqlmodel import SQLModel
+    from database import build_engine
+    from models import Order
+
+    engine = build_engine(database_url)
+    SQLModel.metadata.create_all(engine)
+    line_items = json.dumps([{"sku": "WL-204", "title": "Tropical Jungle Wallpaper", "quantity": 1, "variant": "100x100 cm"}])
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        for offset in range(0, rows, 10000):
+            conn.execute(insert(Order), [
+                {
+                    "amount": 49.0, "currency": "USD", "payment_status": "paid", "status": "shipped",
+                    "source": "etsy", "external_id": f"ETSY-{i}", "line_items_json": line_items,
+                    "recipient_name": "Bench Customer", "recipient_email": "bench@example.com",
+                    "street": "123 Maple Avenue", "city": "Springfield", "state": "IL",
+                    "zip_code": "62704", "country": "United States",
+                    "created_at": start + timedelta(seconds=i), "version": 0,
+                }
+                for i in range(offset, min(rows, offset + 10000))
+            ])
+    engine.dispose()
+
+def export(args):
+    from services.order_export import OrderExporter
+
+    started = time.perf_counter()
+    first_byte = None
+    total = 0
+    with open(os.devnull, "wb") as sink:
+        for chunk in OrderExporter(args.format):
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+            total += len(chunk)
+            sink.write(chunk)
+    print(json.dumps({
+        "first_byte_ms": round(first_byte * 1000, 1),
+        "seconds": round(time.perf_counter() - started, 2),
+        "bytes": total,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }))
+
+def measure(tmp: str, rows: int, fmt: str) -> dict:
+    database_url = f"sqlite:///{tmp}/export-{rows}.db"
+    # Seed from a child too: a forked child inherits the parent's peak RSS
+    subprocess.run([sys.executable, __file__, "--seed", database_url, "--rows", str(rows)], cwd=BACKEND_DIR, check=True)
+    child = subprocess.run(
+        [sys.executable, __file__, "--child", "--format", fmt],
+        cwd=BACKEND_DIR, capture_output=True, text=True,
+        env={**os.environ, "DATABASE_URL": database_url, "SQLITE_MMAP_SIZE": "0", "SQLITE_CACHE_SIZE": "-2000"},
+    )
+    if child.returncode != 0:
+        sys.exit(child.stderr)
+    return json.loads(child.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--format", default="csv", choices=["csv", "ndjson"])
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--seed", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.seed:
+        seed(args.seed, args.rows)
+        return
+    if args.child:
+        export(args)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        small = measure(tmp, SMALL_ROWS, args.format)
+        large = measure(tmp, args.rows, args.format)
+
+    for rows, result in ((SMALL_ROWS, small), (args.rows, large)):
+        print(f"{rows:>9} rows: first byte {result['first_byte_ms']} ms, {result['seconds']} s, "
+              f"{result['bytes'] / 1e6:.1f} MB out, peak RSS {result['peak_rss_mb']} MB")
+
+    growth = large["peak_rss_mb"] - small["peak_rss_mb"]
+    if growth > MAX_GROWTH_MB:
+        sys.exit(f"FAILED: peak RSS grew {growth:.1f} MB with row count")
+    print("OK")
+
+if __name__ == "__main__":
+    main()
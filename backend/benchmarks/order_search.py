@@ -0,0 +1,113 @@
+"""
+Order search latency: the FTS index vs. the LIKE scan it replaces.
+
+Seeds a temporary SQLite database, builds the search index from the existing
+rows (as a first start on an old database would), then times prefix queries
+through search_orders and the equivalent LIKE scan. Also reports the extra
+cost the triggers add to inserting orders with line items.
+
+Usage (from backend/):
+    python benchmarks/order_search.py --orders 1000000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+FIRST_NAMES = ["John", "Sarah", "Hans", "Michael", "Emma", "Olivia", "Liam", "Noah", "Ava", "Mia", "Lucas", "Zoe"]
+LAST_NAMES = ["Doe", "Smith", "Muller", "Brown", "Watson", "Garcia", "Rossi", "Novak", "Kowalski", "Jensen"]
+CITIES = ["Springfield", "London", "Berlin", "Toronto", "New York", "Paris", "Madrid", "Vienna", "Oslo", "Prague"]
+PRODUCTS = [("WL-204", "Tropical Jungle Wallpaper"), ("CNV-001", "Abstract Canvas Art"),
+            ("WL-999", "Mountain View Wallpaper"), ("PST-003", "Vintage Map Poster")]
+QUERIES = ["ETSY-123456", "hans mul", "sarah.smith", "jungle", "WL-9", "berlin watson", "ko", "zzzz"]
+REPEAT = 20
+
+def rows(rng: random.Random, start: int, count: int):
+    orders, items = [], []
+    for i in range(start, start + count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        sku, title = rng.choice(PRODUCTS)
+        orders.append({
+            "id": i + 1, "amount": 49.0, "currency": "USD", "payment_status": "paid", "status": "shipped",
+            "source": "etsy", "external_id": f"ETSY-{100000 + i}",
+            "line_items_json": json.dumps([{"sku": sku, "title": title}]),
+            "recipient_name": f"{first} {last}", "recipient_email": f"{first}.{last}{i % 97}@example.com".lower(),
+            "street": "-", "city": rng.choice(CITIES), "zip_code": f"{rng.randint(10000, 99999)}", "country": "-",
+            "version": 0,
+        })
+        items.append({"order_id": i + 1, "position": 0, "sku": sku, "title": title, "quantity": 1})
+    return orders, items
+
+def timed(fn) -> tuple:
+    samples = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2], samples[int(len(samples) * 0.95) - 1], result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--orders", type=int, default=200000)
+    parser.add_argument("--insert-batch", type=int, default=10000, help="Orders inserted to measure trigger cost")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/search.db"
+
+    from sqlalchemy import insert, or_
+    from sqlmodel import SQLModel, Session, select
+    from database import engine
+    from models import Order, OrderLineItem
+    from services.order_search import install_search_index, search_orders, search_terms
+
+    rng = random.Random(1)
+    SQLModel.metadata.create_all(engine)
+
+    def insert_orders(start: int, count: int) -> float:
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            for offset in range(start, start + count, 10000):
+                orders, items = rows(rng, offset, min(10000, start + count - offset))
+                conn.execute(insert(Order), orders)
+                conn.execute(insert(OrderLineItem), items)
+        return time.perf_counter() - started
+
+    plain_insert = insert_orders(0, args.orders)
+    started = time.perf_counter()
+    install_search_index(engine)
+    print(f"{args.orders} orders: index built from existing rows in {time.perf_counter() - started:.1f}s")
+
+    indexed_insert = insert_orders(args.orders, args.insert_batch)
+    per_order_plain = plain_insert / args.orders * 1e6
+    per_order_indexed = indexed_insert / args.insert_batch * 1e6
+    print(f"insert cost per order: {per_order_plain:.0f} us without index, {per_order_indexed:.0f} us with triggers")
+
+    print(f"\n{'query':<16} {'matches':>8} {'fts p50':>9} {'fts p95':>9} {'like p50':>9}")
+    with Session(engine) as session:
+        for q in QUERIES:
+            p50, p95, (orders, _) = timed(lambda: search_orders(session, q, limit=50))
+
+            def like_scan():
+                conditions = []
+                for term in search_terms(q):
+                    pattern = f"%{term}%"
+                    conditions.append(or_(
+                        Order.recipient_name.ilike(pattern), Order.recipient_email.ilike(pattern),
+                        Order.external_id.ilike(pattern), Order.city.ilike(pattern),
+                        Order.line_items_json.ilike(pattern),
+                    ))
+                return session.exec(select(Order.id).where(*conditions).order_by(Order.id.desc()).limit(50)).all()
+
+            like_p50, _, _ = timed(like_scan)
+            print(f"{q:<16} {len(orders):>8} {p50:>8.2f}ms {p95:>8.2f}ms {like_p50:>8.2f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Dashboard totals: the trigger-maintained OrderStat rows vs. aggregating the
+order table on every request.
+
+Seeds a temporary SQLite database, installs the triggers (which backfills the
+totals, as a first start on an old database would), then runs a mix of writes
+through the usual paths: new orders, payments, bulk verify/ship, store and
+source changes, deletes. Checks the incremental totals match a full rebuild
+and times the stats read against the GROUP BY queries it replaces, plus the
+cost the triggers add to inserts.
+
+Usage (from backend/):
+    python benchmarks/order_stats.py --orders 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+STATUSES = ["draft", "ready_for_print", "in_production", "shipped", "cancelled"]
+SOURCES = ["manual", "etsy", "shopify"]
+REPEAT = 20
+
+def order_rows(rng: random.Random, count: int, stores: int):
+    now = datetime.utcnow()
+    for i in range(count):
+        yield {
+            "amount": round(rng.uniform(10, 300), 2), "currency": rng.choice(["USD", "USD", "EUR"]),
+            "payment_status": rng.choice(["pending", "paid", "paid"]), "status": rng.choice(STATUSES),
+            "source": rng.choice(SOURCES), "store_id": rng.choice([None] + list(range(1, stores + 1))),
+            "line_items_json": "[]", "recipient_name": "Bench", "street": "-", "city": "-", "zip_code": "-",
+            "country": "-", "version": 0, "created_at": now - timedelta(minutes=rng.randint(0, 60 * 24 * 90)),
+        }
+
+def timed(fn) -> tuple:
+    samples = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2], result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--orders", type=int, default=200000)
+    parser.add_argument("--stores", type=int, default=5)
+    parser.add_argument("--writes", type=int, default=2000, help="Orders touched by each kind of write")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/stats.db"
+
+    from sqlalchemy import case, delete, insert, update
+    from sqlmodel import SQLModel, Session, func, select
+    from database import engine
+    from models import Order, OrderStat, Shipment, Store, User
+    from services.order_service import OrderService
+    from services.order_stats import install_order_stats, read_order_stats, rebuild_order_stats
+
+    rng = random.Random(1)
+    SQLModel.metadata.create_all(engine)
+
+    def insert_orders(count: int) -> float:
+        started = time.perf_counter()
+        rows = list(order_rows(rng, count, args.stores))
+        with engine.begin() as conn:
+            for offset in range(0, count, 10000):
+                conn.execute(insert(Order), rows[offset:offset + 10000])
+        return time.perf_counter() - started
+
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"email": "bench@example.com", "full_name": "Bench", "password_hash": "-"}])
+        conn.execute(insert(Store), [
+            {"user_id": 1, "shop_name": f"bench-shop-{i}", "access_token": "bench"} for i in range(args.stores)
+        ])
+    plain_insert = insert_orders(args.orders)
+    started = time.perf_counter()
+    install_order_stats(engine)
+    print(f"{args.orders} orders: totals built from existing rows in {time.perf_counter() - started:.2f}s")
+    indexed_insert = insert_orders(args.writes)
+    print(f"insert cost per order: {plain_insert / args.orders * 1e6:.0f} us without triggers, "
+          f"{indexed_insert / args.writes * 1e6:.0f} us with triggers")
+
+    with Session(engine) as session:
+        ids = session.exec(select(Order.id)).all()
+        paid_now = rng.sample(ids, args.writes)
+        session.exec(update(Order).where(Order.id.in_(paid_now)).values(payment_status="paid"))
+        moved = rng.sample(ids, args.writes)
+        session.exec(update(Order).where(Order.id.in_(moved)).values(
+            store_id=case((Order.store_id.is_(None), 1), else_=None), source="shopify", amount=Order.amount + 1,
+        ))
+        session.commit()
+        service = OrderService(session)
+        service.bulk_verify(rng.sample(ids, args.writes))
+        service.bulk_ship([Shipment(order_id=i, tracking_number=f"TRK{i}") for i in rng.sample(ids, args.writes)])
+        gone = rng.sample(ids, args.writes)
+        session.exec(delete(Order).where(Order.id.in_(gone)))
+        session.commit()
+
+    def snapshot():
+        with Session(engine) as session:
+            return {
+                (s.dimension, s.key, s.currency): (s.orders, s.paid_orders, round(s.revenue, 2))
+                for s in session.exec(select(OrderStat).where(OrderStat.orders != 0)).all()
+            }
+
+    incremental = snapshot()
+    rows = rebuild_order_stats(engine)
+    rebuilt = snapshot()
+    mismatched = {key for key in incremental.keys() | rebuilt.keys() if incremental.get(key) != rebuilt.get(key)}
+    print(f"after mixed writes: {rows} stat rows, {len(mismatched)} differ from a full rebuild")
+
+    paid = Order.payment_status == "paid"
+    aggregates = [
+        (Order.status, Order.currency), (Order.store_id, Order.currency),
+        (Order.source, Order.currency), (func.date(Order.created_at), Order.currency),
+    ]
+    since = datetime.utcnow() - timedelta(days=30)
+
+    def group_by_scan():
+        results = []
+        for dimension, currency in aggregates:
+            query = select(dimension, currency, func.count(), func.sum(case((paid, 1), else_=0)),
+                           func.sum(case((paid, Order.amount), else_=0))).group_by(dimension, currency)
+            if dimension is aggregates[-1][0]:
+                query = query.where(Order.created_at >= since)
+            results.append(session.exec(query).all())
+        return results
+
+    with Session(engine) as session:
+        stats_ms, stats = timed(lambda: read_order_stats(session, days=30))
+        scan_ms, _ = timed(group_by_scan)
+    print(f"stats read: {stats_ms:.2f} ms from totals ({len(stats.daily)} daily rows), {scan_ms:.1f} ms as GROUP BY scans")
+
+    if mismatched:
+        sys.exit(f"FAILED: incremental totals differ from rebuild for {sorted(mismatched)[:5]}")
+    print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Outbox end to end: bulk-ships orders (which writes the notifications to the
+outbox in the same transaction) and drains them through two concurrent
+dispatchers into the local SMTP stand-in, which rejects a share of messages
+with a temporary error.
+
+Checks every message is delivered exactly once and marked sent, and reports
+the request-path cost of the ship call, dispatch throughput and the number of
+SMTP connections opened.
+
+Usage (from backend/):
+    python benchmarks/outbox_dispatch.py --orders 2000 --fail-rate 0.1
+"""
+import argparse
+import collections
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--fail-rate", type=float, default=0.1)
+    parser.add_argument("--dispatchers", type=int, default=2, help="Simulated worker processes")
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/outbox.db"
+    os.environ.setdefault("OUTBOX_BACKOFF_BASE_SECONDS", "0.05") # Keep retries quick
+    os.environ["SMTP_STARTTLS"] = "false" # The stand-in speaks plain SMTP
+
+    from sqlalchemy import insert
+    from sqlmodel import SQLModel, Session, func, select
+    from database import engine
+    from mock_smtp import MockSMTPServer
+    from models import Order, OutboxMessage, Shipment
+    from services.order_service import OrderService
+    from services.outbox import OutboxDispatcher
+
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Order), [
+            {
+                "amount": 49.0, "currency": "USD", "payment_status": "paid", "status": "in_production",
+                "line_items_json": "[]", "recipient_name": "Bench", "recipient_email": f"customer{i}@example.com",
+                "street": "-", "city": "-", "zip_code": "-", "country": "-", "version": 0,
+            }
+            for i in range(args.orders)
+        ])
+
+    smtp = MockSMTPServer(port=0, fail_rate=args.fail_rate, verbose=False)
+    port = smtp.start_in_thread()
+
+    shipments = [Shipment(order_id=i + 1, tracking_number=f"TRK{i + 1}") for i in range(args.orders)]
+    started = time.perf_counter()
+    with Session(engine) as session:
+        result = OrderService(session).bulk_ship(shipments)
+    ship_seconds = time.perf_counter() - started
+    # Shipping the same batch again must not queue a second notification
+    with Session(engine) as session:
+        OrderService(session).bulk_ship(shipments)
+
+    dispatchers = [OutboxDispatcher(smtp_host="127.0.0.1", smtp_port=port) for _ in range(args.dispatchers)]
+    started = time.perf_counter()
+    for dispatcher in dispatchers:
+        dispatcher.start()
+        dispatcher.wake()
+
+    def remaining():
+        with Session(engine) as session:
+            return session.exec(
+                select(func.count()).select_from(OutboxMessage).where(OutboxMessage.status.in_(("pending", "sending")))
+            ).one()
+
+    while remaining() and time.perf_counter() - started < args.timeout:
+        for dispatcher in dispatchers:
+            dispatcher.wake()
+        time.sleep(0.05)
+    dispatch_seconds = time.perf_counter() - started
+    for dispatcher in dispatchers:
+        dispatcher.shutdown()
+    smtp.stop()
+
+    with Session(engine) as session:
+        statuses = dict(session.exec(
+            select(OutboxMessage.status, func.count()).group_by(OutboxMessage.status)
+        ).all())
+        retried = session.exec(select(func.count()).select_from(OutboxMessage).where(OutboxMessage.attempts > 1)).one()
+    deliveries = collections.Counter(message["Message-ID"] for message in smtp.messages)
+    duplicates = sum(n - 1 for n in deliveries.values() if n > 1)
+
+    print(f"ship {result.updated} orders: {ship_seconds * 1000:.0f} ms (outbox rows written in the same transaction)")
+    print(f"dispatch: {len(smtp.messages)} mails in {dispatch_seconds:.2f}s "
+          f"({len(smtp.messages) / dispatch_seconds:.0f}/s), {smtp.connections} SMTP connections, "
+          f"{retried} messages retried")
+    print(f"outbox: {statuses}, duplicate deliveries: {duplicates}")
+
+    failures = []
+    if statuses.get("sent") != args.orders or len(statuses) != 1:
+        failures.append(f"expected {args.orders} sent messages, got {statuses}")
+    if len(deliveries) != args.orders or duplicates:
+        failures.append(f"{len(deliveries)} distinct deliveries, {duplicates} duplicates")
+    if failures:
+        sys.exit("FAILED: " + "; ".join(failures))
+    print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Packing slips: time to first chunk, throughput and peak memory of the streamed
+packing-slip/manifest PDF, against building the same pages on one reportlab
+canvas.
+
+Seeds a temporary SQLite database with in_production orders for one day (a few
+with enough line items to need a second slip page), checks
+/admin/orders/packing-slips answers with a complete PDF, then times the
+response body generator. Peak Python memory is measured with tracemalloc; the
+streamed document only keeps object offsets per page (plus up to 1 MB of
+spooled manifest rows), the canvas keeps every page.
+
+Usage (from backend/):
+    python benchmarks/packing_slips.py --orders 5000
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+DAY = datetime(2026, 3, 2)
+SKUS = ["WL-204", "WL-310", "CNV-001", "CNV-045", "PST-12", "PST-30"]
+
+def seed(engine, orders: int):
+    from sqlalchemy import insert
+    from migrations import migrate
+    from models import Order, OrderLineItem
+
+    migrate.upgrade(engine)
+    rng = random.Random(1)
+    rows, line_items = [], []
+    for i in range(orders):
+        items = [{"sku": rng.choice(SKUS), "title": "Tropical Jungle Wallpaper, matte, pre-pasted", "variant": "300x250 cm",
+                  "quantity": rng.randint(1, 3)} for _ in range(60 if i % 500 == 0 else rng.randint(1, 4))]
+        line_items += [{"order_id": i + 1, "position": position, "width_cm": 300.0, "height_cm": 250.0, **item}
+                       for position, item in enumerate(items)]
+        rows.append({
+            "id": i + 1, "source": "etsy", "external_id": f"ETSY-{100000 + i}", "amount": 99.0, "currency": "EUR",
+            "payment_status": "paid", "status": "in_production", "line_items_json": json.dumps(items),
+            "recipient_name": f"Customer {i} Müller", "street": f"{rng.randint(1, 200)} Hauptstraße",
+            "city": "Berlin", "state": "-", "zip_code": "10115", "country": "DE", "version": 0,
+            "created_at": DAY + timedelta(seconds=rng.randint(0, 86399)),
+        })
+    with engine.begin() as conn:
+        for offset in range(0, len(rows), 5000):
+            conn.execute(insert(Order), rows[offset:offset + 5000])
+        for offset in range(0, len(line_items), 5000):
+            conn.execute(insert(OrderLineItem), line_items[offset:offset + 5000])
+
+def streamed() -> dict:
+    """Consumes the response body generator directly; an in-process HTTP client would buffer it whole."""
+    from services.packing_slips import PackingSlipDocument
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    first_chunk = None
+    size = 0
+    for chunk in PackingSlipDocument(day=DAY.date()):
+        first_chunk = first_chunk or time.perf_counter() - started
+        size += len(chunk)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"first_chunk_ms": first_chunk * 1000, "seconds": elapsed, "bytes": size, "peak_mb": peak / 1024 / 1024}
+
+def one_canvas(pages: int) -> dict:
+    """The same number of text pages drawn on a single reportlab canvas, kept until save()."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf, pagesize=A4)
+    for page in range(pages):
+        c.setFont("Helvetica-Bold", 18)
+        c.drawString(40, 780, "PACKING SLIP")
+        c.setFont("Helvetica", 9)
+        for line in range(20):
+            c.drawString(40, 700 - line * 14, f"Order {page} line {line}: WL-204 Tropical Jungle Wallpaper 300x250 cm")
+        c.showPage()
+    c.save()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"seconds": elapsed, "bytes": len(buf.getvalue()), "peak_mb": peak / 1024 / 1024}
+
+async def check_endpoint() -> int:
+    import httpx
+    from main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            response = await client.get("/admin/orders/packing-slips", params={"day": DAY.date().isoformat()})
+    if response.status_code != 200 or not response.content.startswith(b"%PDF") or b"%%EOF" not in response.content[-8:]:
+        sys.exit(f"FAILED: status {response.status_code}, {len(response.content)} bytes")
+    return len(response.content)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--orders", type=int, default=5000)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/slips.db"
+    from database import engine
+
+    seed(engine, args.orders)
+    size = asyncio.run(check_endpoint())
+    result = streamed()
+    print(f"streamed: {result['bytes'] / 1024 / 1024:.1f} MB in {result['seconds']:.2f}s "
+          f"({args.orders / result['seconds']:.0f} orders/s), first chunk after {result['first_chunk_ms']:.0f} ms, "
+          f"peak {result['peak_mb']:.1f} MB (endpoint: {size / 1024 / 1024:.1f} MB)")
+    baseline = one_canvas(args.orders)
+    print(f"one reportlab canvas, {args.orders} pages: {baseline['bytes'] / 1024 / 1024:.1f} MB in "
+          f"{baseline['seconds']:.2f}s, peak {baseline['peak_mb']:.1f} MB")
+
+if __name__ == "__main__":
+    main()
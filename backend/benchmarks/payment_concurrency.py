@@ -0,0 +1,124 @@
+"""
+Fires hundreds of parallel payment requests at a multi-worker uvicorn and checks
+that exactly one payment is recorded per order.
+
+1. N identical requests sharing one Idempotency-Key: all must return the same
+   transaction, one Payment row exists.
+2. N requests for one order with distinct keys: exactly one succeeds, the
+   rest get 409, one Payment row exists.
+
+Usage (from backend/):
+    python benchmarks/payment_concurrency.py --requests 300 --workers 4
+"""
+import argparse
+import asyncio
+import collections
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def seed(database_url: str) -> list:
+    from sqlmodel import Session
+    from database import build_engine
+    from migrations import migrate
+    from models import Order
+
+    engine = build_engine(database_url)
+    migrate.upgrade(engine)
+    with Session(engine) as session:
+        orders = [
+            Order(amount=49.0, line_items_json="[]", recipient_name="Bench", street="-", city="-", zip_code="-", country="-")
+            for _ in range(2)
+        ]
+        session.add_all(orders)
+        session.commit()
+        ids = [order.id for order in orders]
+    engine.dispose()
+    return ids
+
+def payment_count(database_url: str, order_id: int) -> int:
+    from sqlmodel import Session, func, select
+    from database import build_engine
+    from models import Payment
+
+    engine = build_engine(database_url)
+    with Session(engine) as session:
+        count = session.exec(select(func.count()).select_from(Payment).where(Payment.order_id == order_id)).one()
+    engine.dispose()
+    return count
+
+async def fire(base_url: str, order_id: int, n: int, same_key: bool):
+    import httpx
+
+    limits = httpx.Limits(max_connections=n)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        async def one(i):
+            headers = {"Idempotency-Key": "bench-same-key" if same_key else f"bench-key-{i}"}
+            return await client.post("/api/payments/process", json={"order_id": order_id, "amount": 49.0}, headers=headers)
+        return await asyncio.gather(*(one(i) for i in range(n)))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite:///{tmp}/bench.db"
+        same_key_order, distinct_key_order = seed(database_url)
+
+        port = free_port()
+        env = {**os.environ, "DATABASE_URL": database_url}
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(args.workers), "--log-level", "warning"],
+            cwd=tmp, env={**env, "PYTHONPATH": BACKEND_DIR},
+        )
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            import httpx
+            for _ in range(100):
+                try:
+                    httpx.get(f"{base_url}/health")
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.2)
+
+            started = time.perf_counter()
+            responses = asyncio.run(fire(base_url, same_key_order, args.requests, same_key=True))
+            statuses = collections.Counter(r.status_code for r in responses)
+            transactions = {r.json().get("transaction_id") for r in responses if r.status_code == 200}
+            rows = payment_count(database_url, same_key_order)
+            print(f"same key:      {dict(statuses)} transactions={len(transactions)} payment_rows={rows} "
+                  f"({time.perf_counter() - started:.2f}s)")
+            if statuses != {200: args.requests} or len(transactions) != 1 or rows != 1:
+                failures.append("same-key requests did not collapse into one payment")
+
+            started = time.perf_counter()
+            responses = asyncio.run(fire(base_url, distinct_key_order, args.requests, same_key=False))
+            statuses = collections.Counter(r.status_code for r in responses)
+            rows = payment_count(database_url, distinct_key_order)
+            print(f"distinct keys: {dict(statuses)} payment_rows={rows} ({time.perf_counter() - started:.2f}s)")
+            if statuses.get(200) != 1 or statuses.get(409) != args.requests - 1 or rows != 1:
+                failures.append("order accepted more than one payment")
+        finally:
+            server.terminate()
+            server.wait()
+
+    if failures:
+        sys.exit("FAILED: " + "; ".join(failures))
+    print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Artwork preflight: cost of the first analysis, of reusing the stored result,
+and how far the downsampled proxy's numbers are from full resolution.
+
+Writes synthetic artworks to a temporary directory (a large RGB gradient with
+a rich-black band, the same as CMYK JPEG, its red channel as 16-bit grayscale
+PNG, a small low-resolution file), checks
+them through preflight_artwork on a freshly migrated SQLite database, and
+compares the proxy's ink coverage with a per-pixel pass over the whole image.
+Pass a press ICC profile to include the gamut check.
+
+Usage (from backend/):
+    python benchmarks/preflight.py --size 6000 --cmyk-profile /path/to/press.icc
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+def make_artworks(directory: str, size: int) -> dict:
+    from PIL import Image, ImageDraw
+
+    gradient = Image.linear_gradient("L").resize((size, size))
+    rgb = Image.merge("RGB", [gradient, gradient.transpose(Image.Transpose.ROTATE_90), Image.new("L", (size, size), 160)])
+    ImageDraw.Draw(rgb).rectangle((0, size * 3 // 4, size, size), fill=(0, 0, 0)) # Rich black
+    paths = {
+        "rgb_png": os.path.join(directory, "gradient.png"),
+        "cmyk_jpeg": os.path.join(directory, "gradient_cmyk.jpg"),
+        "gray16_png": os.path.join(directory, "gradient_16bit.png"),
+        "low_res_jpeg": os.path.join(directory, "low_res.jpg"),
+    }
+    rgb.save(paths["rgb_png"])
+    rgb.convert("CMYK").save(paths["cmyk_jpeg"], quality=92)
+    rgb.getchannel("R").convert("I").point(lambda v: v * 257).convert("I;16").save(paths["gray16_png"])
+    rgb.resize((size // 20, size // 20)).save(paths["low_res_jpeg"], quality=92)
+    return paths
+
+def full_resolution_ink(path: str) -> float:
+    """Mean total ink over every pixel, one at a time, with the same separation as the proxy."""
+    from PIL import Image, ImageCms
+    from services import preflight
+    from services.artwork import _to_8bit
+
+    im = _to_8bit(Image.open(path))
+    if im.mode != "CMYK":
+        if preflight.CMYK_PROFILE:
+            press = preflight._press(preflight.CMYK_PROFILE)[0]
+            im = ImageCms.applyTransform(im.convert("RGB"), ImageCms.buildTransform(
+                ImageCms.createProfile("sRGB"), press, "RGB", "CMYK", renderingIntent=preflight.INTENT))
+        else:
+            im = preflight._naive_cmyk(im.convert("RGB"))
+    total = 0
+    for pixel in im.getdata():
+        total += sum(pixel)
+    return total / (im.width * im.height) * 100 / 255
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=4000, help="Side of the large artworks in pixels")
+    parser.add_argument("--cmyk-profile", default="", help="Press ICC profile for separation and gamut")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/preflight.db"
+    os.environ["PREFLIGHT_CMYK_PROFILE"] = args.cmyk_profile
+
+    from sqlmodel import Session
+    from database import engine
+    from migrations import migrate
+    from models import OrderLineItem
+    from services.preflight import preflight_artwork, preflight_item
+
+    migrate.upgrade(engine)
+    paths = make_artworks(tmp, args.size)
+    print(f"press profile: {args.cmyk_profile or 'none (naive separation, no gamut check)'}")
+
+    for name, path in paths.items():
+        with Session(engine) as session:
+            started = time.perf_counter()
+            artwork = preflight_artwork(session, path)
+            first_ms = (time.perf_counter() - started) * 1000
+        with Session(engine) as session:
+            started = time.perf_counter()
+            preflight_artwork(session, path)
+            reused_ms = (time.perf_counter() - started) * 1000
+            item = OrderLineItem(order_id=0, sku=name, variant="100x100 cm", width_cm=100, height_cm=100, image_path=path)
+            report = preflight_item(session, item)
+        gamut = "n/a" if artwork.out_of_gamut_percent is None else f"{artwork.out_of_gamut_percent:.1f}%"
+        print(f"\n{name} ({artwork.width_px}x{artwork.height_px} {artwork.mode}): analyzed in {first_ms:.0f} ms, "
+              f"reused in {reused_ms:.1f} ms")
+        print(f"  ink mean {artwork.ink_mean_percent:.1f}% max {artwork.ink_max_percent:.0f}%, "
+              f"{artwork.over_ink_limit_percent:.1f}% over limit, out of gamut {gamut}, "
+              f"{report.effective_dpi:.0f} dpi at 104x104 cm")
+        for warning in report.warnings:
+            print(f"  ! {warning}")
+
+        started = time.perf_counter()
+        reference = full_resolution_ink(path)
+        print(f"  full-resolution per-pixel mean ink {reference:.1f}% "
+              f"(proxy off by {abs(reference - artwork.ink_mean_percent):.1f} points) "
+              f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+if __name__ == "__main__":
+    main()
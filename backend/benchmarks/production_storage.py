@@ -0,0 +1,188 @@
+"""
+Production file storage: streamed upload throughput to the local and S3
+backends, and what the download endpoint sends for full, ranged and
+conditional requests.
+
+Writes a file of random bytes through each backend (the S3 one against
+mock_s3.py, in multipart parts) and touches the local one, which must keep its
+ETag and Last-Modified. Renders one production PDF through the S3 backend (and
+once more, which must be a cache hit) and touches it, which must move its
+Last-Modified. Then starts the app with uvicorn three times, serving a
+succeeded job's file from local storage, from S3 via presigned redirect and from
+S3 proxied through the API. Checks status codes, Content-Range and the bytes
+received, and reports the time to fetch the whole file against its last MB.
+
+Usage (from backend/):
+    python benchmarks/production_storage.py --mb 256
+"""
+import argparse
+import hashlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+KEY = "items/BENCH-1_WL-204_0_0123456789abcdef0123.pdf"
+CHUNK = 1024 * 1024
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def serve(module: str, port: int, env: dict) -> subprocess.Popen:
+    import urllib.request
+
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", f"{module}:app", "--port", str(port), "--log-level", "warning"],
+                              cwd=BACKEND_DIR, env=env)
+    for _ in range(200):
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/docs", timeout=1)
+            return server
+        except OSError:
+            time.sleep(0.05)
+    server.kill()
+    sys.exit(f"{module} did not start")
+
+def check(condition: bool, message: str):
+    if not condition:
+        sys.exit(f"FAILED: {message}")
+
+def upload(storage, size_mb: int) -> tuple:
+    """Streams size_mb of random data into storage under KEY. Returns (sha256, seconds)."""
+    digest = hashlib.sha256()
+    started = time.perf_counter()
+    with storage.open_write(KEY) as out:
+        for _ in range(size_mb):
+            chunk = os.urandom(CHUNK)
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest(), time.perf_counter() - started
+
+def download_checks(client, url: str, size: int, sha: str, tail: bytes) -> dict:
+    started = time.perf_counter()
+    digest, received = hashlib.sha256(), 0
+    with client.stream("GET", url) as response:
+        check(response.status_code == 200, f"full download: HTTP {response.status_code}")
+        etag, modified = response.headers["etag"], response.headers["last-modified"]
+        for chunk in response.iter_bytes():
+            digest.update(chunk)
+            received += len(chunk)
+    full = time.perf_counter() - started
+    check(received == size and digest.hexdigest() == sha, "full download: wrong bytes")
+
+    started = time.perf_counter()
+    response = client.get(url, headers={"Range": f"bytes=-{len(tail)}"})
+    ranged = time.perf_counter() - started
+    check(response.status_code == 206 and response.content == tail, f"suffix range: HTTP {response.status_code}")
+    check(response.headers["content-range"] == f"bytes {size - len(tail)}-{size - 1}/{size}", "suffix range: Content-Range")
+
+    response = client.get(url, headers={"Range": "bytes=1000-1999", "If-Range": etag})
+    check(response.status_code == 206 and len(response.content) == 1000, f"resume with If-Range: HTTP {response.status_code}")
+    with client.stream("GET", url, headers={"Range": "bytes=1000-1999", "If-Range": '"stale"'}) as response:
+        check(response.status_code == 200, f"stale If-Range should send the whole file: HTTP {response.status_code}")
+    check(client.get(url, headers={"Range": f"bytes={size}-"}).status_code == 416, "range past the end")
+    check(client.get(url, headers={"If-None-Match": etag}).status_code == 304, "If-None-Match")
+    check(client.get(url, headers={"If-Modified-Since": modified}).status_code == 304, "If-Modified-Since")
+    return {"full_s": full, "last_mb_ms": ranged * 1000}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mb", type=int, default=256, help="Size of the production file")
+    parser.add_argument("--part-mb", type=int, default=8, help="S3 multipart part size")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    db_path = f"{tmp}/storage.db"
+    s3_port = free_port()
+    env = {
+        **os.environ, "DATABASE_URL": f"sqlite:///{db_path}", "PRODUCTION_STORAGE_DIR": f"{tmp}/local",
+        "MOCK_S3_DIR": f"{tmp}/s3", "S3_ENDPOINT_URL": f"http://127.0.0.1:{s3_port}", "S3_BUCKET": "production",
+        "S3_ACCESS_KEY_ID": "mock", "S3_SECRET_ACCESS_KEY": "mock-secret", "S3_PART_MB": str(args.part_mb),
+    }
+    env.pop("PYTHONPROFILEIMPORTTIME", None)
+    os.environ.update(env)
+    subprocess.run([sys.executable, "-m", "migrations.migrate"], cwd=BACKEND_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+
+    import httpx
+    from sqlalchemy import insert
+    from database import engine
+    from models import Order, OrderLineItem, ProductionJob
+    from services.production_generator import ProductionGenerator
+    from services.storage import LocalStorage, S3Storage
+
+    order = {"id": 1, "external_id": "BENCH-1", "amount": 0, "recipient_name": "Bench", "street": "-", "city": "-",
+             "zip_code": "-", "country": "-", "line_items_json": json.dumps([{"sku": "WL-204", "variant": "100x100 cm"}])}
+    with engine.begin() as conn:
+        conn.execute(insert(Order), [order])
+        conn.execute(insert(OrderLineItem), [{"order_id": 1, "sku": "WL-204", "variant": "100x100 cm",
+                                              "width_cm": 100.0, "height_cm": 100.0, "material": "wallpaper"}])
+        conn.execute(insert(ProductionJob), [{"order_id": 1, "status": "succeeded", "file_path": KEY}])
+
+    servers = [serve("mock_s3", s3_port, env)]
+    try:
+        local, s3 = LocalStorage(), S3Storage()
+        sha, seconds = upload(local, args.mb)
+        print(f"local: wrote {args.mb} MB in {seconds:.2f}s ({args.mb / seconds:.0f} MB/s)")
+        before = local.stat(KEY)
+        local.touch(KEY)
+        after = local.stat(KEY)
+        check((after.etag, after.modified) == (before.etag, before.modified), "local touch changed the file's validators")
+        s3_sha, seconds = upload(s3, args.mb)
+        stored = s3.stat(KEY)
+        check(stored and stored.size == args.mb * CHUNK, "S3 upload: wrong size")
+        print(f"s3: wrote {args.mb} MB in {seconds:.2f}s ({args.mb / seconds:.0f} MB/s) as "
+              f"{-(-args.mb // args.part_mb)} parts, ETag {stored.etag}")
+        check(hashlib.sha256(b"".join(s3.read(KEY))).hexdigest() == s3_sha, "S3 read back: wrong bytes")
+
+        generator = ProductionGenerator(s3)
+        rendered = generator.generate_pdf(Order(**order))
+        check(generator.generate_pdf(Order(**order)) == rendered and generator.cache.stats()["hits"] == 1,
+              "second render was not a cache hit")
+        check(next(s3.read(rendered)).startswith(b"%PDF"), "rendered file is not a PDF")
+        print(f"s3: rendered {rendered} ({s3.stat(rendered).size} bytes), second render served from the cache")
+        before = s3.stat(rendered)
+        time.sleep(1.1) # Last-Modified has one-second resolution
+        s3.touch(rendered)
+        after = s3.stat(rendered)
+        check(after.modified > before.modified and after.size == before.size, "touch did not move Last-Modified")
+        check(next(s3.read(rendered)).startswith(b"%PDF"), "touched file is not a PDF")
+
+        tail = b"".join(local.read(KEY, args.mb * CHUNK - CHUNK))
+        s3_tail = b"".join(s3.read(KEY, args.mb * CHUNK - CHUNK))
+        for name, backend_env, expected_sha, expected_tail in (
+            ("local", {"PRODUCTION_STORAGE": "local"}, sha, tail),
+            ("s3 presigned", {"PRODUCTION_STORAGE": "s3"}, s3_sha, s3_tail),
+            ("s3 proxied", {"PRODUCTION_STORAGE": "s3", "S3_PRESIGN_SECONDS": "0"}, s3_sha, s3_tail),
+        ):
+            port = free_port()
+            app = serve("main", port, {**env, **backend_env})
+            try:
+                url = f"http://127.0.0.1:{port}/admin/production-jobs/1/download"
+                with httpx.Client(timeout=120) as client:
+                    if name == "s3 presigned":
+                        redirect = client.get(url)
+                        check(redirect.status_code == 307, f"expected a redirect, got HTTP {redirect.status_code}")
+                        url = redirect.headers["location"]
+                        forged = url[:-1] + ("0" if url[-1] != "0" else "1")
+                        check(client.get(forged).status_code == 403, "tampered presigned URL was accepted")
+                    result = download_checks(client, url, args.mb * CHUNK, expected_sha, expected_tail)
+            finally:
+                app.terminate()
+                app.wait()
+            print(f"{name}: whole file in {result['full_s']:.2f}s, last MB in {result['last_mb_ms']:.0f} ms; "
+                  f"Range, If-Range, If-None-Match, If-Modified-Since and 416 checked")
+        print("OK")
+    finally:
+        for server in servers:
+            server.terminate()
+            server.wait()
+
+if __name__ == "__main__":
+    main()
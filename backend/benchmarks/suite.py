@@ -0,0 +1,436 @@
+"""
+End-to-end API benchmark: seeds a database, drives the real FastAPI app and
+reports throughput and p50/p95/p99 latency per scenario as JSON.
+
+Scenarios:
+    list_orders   GET /admin/orders, walking pages with the cursor and status filters
+    sync          POST /integrations/sync/{store_id} with new orders waiting in the mock marketplace
+    payments      POST /api/payments/process, one unpaid order per request
+    production    POST /admin/orders/{id}/production-file, timed until the job finishes
+
+The app runs in-process (httpx ASGI transport, default) or behind uvicorn
+with --workers. The marketplace APIs are served by mock_marketplace.py on a
+free port. Data is generated from --seed, so runs are comparable.
+
+Usage (from backend/):
+    python benchmarks/suite.py --orders 50000 --output baseline.json
+    # ... change something ...
+    python benchmarks/suite.py --orders 50000 --baseline baseline.json --fail-on-regression
+
+PostgreSQL: pass --database-url postgresql+psycopg2://... --reset (drops and
+recreates all tables in that database).
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+SCENARIOS = ("list_orders", "sync", "payments", "production")
+STATUSES = ("draft", "ready_for_print", "in_production", "shipped")
+PRODUCTS = [
+    ("WL-204", "Tropical Jungle Wallpaper", "100x100 cm"),
+    ("CNV-001", "Abstract Canvas Art", "50x70 cm"),
+    ("PST-003", "Vintage Map Poster", "60x90 cm"),
+]
+# Lower is better for latencies, higher for throughput
+COMPARED_METRICS = {"p50_ms": -1, "p95_ms": -1, "p99_ms": -1, "throughput_rps": 1}
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def wait_until_up(url: str):
+    import httpx
+
+    for _ in range(150):
+        try:
+            httpx.get(url)
+            return
+        except httpx.TransportError:
+            time.sleep(0.2)
+    sys.exit(f"{url} did not come up")
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def write_artwork(path: str, size_px: int):
+    from PIL import Image
+
+    gradient = Image.linear_gradient("L").resize((size_px, size_px))
+    Image.merge("RGB", (gradient, gradient.rotate(90), gradient.rotate(180))).save(path)
+
+# ---------------------------------------------------------------------------
+# Seeding
+
+def seed(database_url: str, args, artwork_path: str) -> dict:
+    """Bulk-inserts users, stores and orders; returns the ids the scenarios need."""
+    from sqlalchemy import insert, select
+    from sqlmodel import SQLModel
+    from database import build_engine
+    from migrations import migrate
+    from models import Order, OrderLineItem, Store, User
+    from services.line_items import material_for, parse_variant_dimensions
+
+    rng = random.Random(args.seed)
+    engine = build_engine(database_url)
+    if args.reset:
+        with engine.begin() as conn:
+            conn.exec_driver_sql("DROP TABLE IF EXISTS order_search") # Not in the metadata; references order
+        SQLModel.metadata.drop_all(engine)
+    # Tables only: seeding bulk-inserts without the index/stats triggers, the migrations backfill afterwards
+    SQLModel.metadata.create_all(engine)
+
+    with engine.begin() as conn:
+        if conn.execute(select(Order.id).limit(1)).first():
+            sys.exit("Database already has orders; pass --reset to start from a clean schema")
+
+        conn.execute(insert(User), [
+            {
+                "email": f"bench{i}@example.com", "full_name": f"Bench User {i}", "password_hash": "-",
+                "is_active": True, "discount_percentage": rng.choice([0.0, 5.0, 10.0]),
+                "created_at": datetime(2024, 1, 1),
+            }
+            for i in range(args.users)
+        ])
+        user_ids = conn.execute(select(User.id).order_by(User.id)).scalars().all()
+        conn.execute(insert(Store), [
+            {
+                "user_id": user_ids[i % len(user_ids)], "platform": "etsy" if i % 2 == 0 else "shopify",
+                "shop_name": f"bench-shop-{i}", "access_token": "bench", "is_connected": True,
+                "created_at": datetime(2024, 1, 1),
+            }
+            for i in range(args.stores)
+        ])
+        stores = conn.execute(select(Store.id, Store.platform, Store.shop_name).order_by(Store.id)).all()
+
+        start = datetime(2024, 1, 1)
+        # The tail of the id range is reserved: unpaid orders for payments, artwork orders for production
+        reserved = args.requests + args.production_requests
+        total = args.orders + reserved
+        for offset in range(0, total, 5000):
+            orders, items = [], []
+            for i in range(offset, min(total, offset + 5000)):
+                sku, title, variant = rng.choice(PRODUCTS)
+                item = {"sku": sku, "title": title, "quantity": rng.randint(1, 3), "variant": variant}
+                if i >= args.orders + args.requests:
+                    item["image_path"] = artwork_path
+                store = rng.choice(stores) if stores and rng.random() < 0.7 else None
+                orders.append({
+                    "user_id": rng.choice(user_ids), "store_id": store.id if store else None,
+                    "source": store.platform if store else "manual",
+                    "external_id": f"BENCH-{i}" if store else None,
+                    "amount": 49.0, "currency": "USD",
+                    "payment_status": "pending" if i >= args.orders else "paid",
+                    "status": "draft" if i >= args.orders else rng.choice(STATUSES),
+                    "line_items_json": json.dumps([item]),
+                    "recipient_name": "Bench Customer", "street": "123 Maple Avenue", "city": "Springfield",
+                    "zip_code": "62704", "country": "United States",
+                    "created_at": start + timedelta(seconds=i * 37), "version": 0,
+                })
+                width_cm, height_cm = parse_variant_dimensions(variant)
+                items.append({
+                    "order_id": i + 1, "position": 0, "sku": sku, "title": title, "quantity": item["quantity"],
+                    "variant": variant, "width_cm": width_cm, "height_cm": height_cm,
+                    "material": material_for(item), "image_path": item.get("image_path"),
+                })
+            conn.execute(insert(Order), orders)
+            conn.execute(insert(OrderLineItem), items)
+    migrate.upgrade(engine)
+    engine.dispose()
+
+    first_reserved = args.orders + 1
+    return {
+        "stores": [{"id": s.id, "platform": s.platform, "shop_name": s.shop_name} for s in stores],
+        "unpaid_orders": list(range(first_reserved, first_reserved + args.requests)),
+        "artwork_orders": list(range(first_reserved + args.requests, first_reserved + reserved)),
+    }
+
+# ---------------------------------------------------------------------------
+# Scenarios: each returns a list of request callables; a callable returns the HTTP status
+
+def list_orders_requests(client, seeded: dict, args) -> List[Callable[[], Awaitable[int]]]:
+    rng = random.Random(args.seed)
+
+    def walk(status):
+        async def request():
+            # One logical request is a first page plus a follow-up page via the cursor
+            params = {"limit": 100, **({"status": status} if status else {})}
+            response = await client.get("/admin/orders", params=params)
+            cursor = response.json().get("next_cursor") if response.status_code == 200 else None
+            if cursor:
+                response = await client.get("/admin/orders", params={**params, "cursor": cursor})
+            return response.status_code
+        return request
+
+    return [walk(rng.choice((None,) + STATUSES)) for _ in range(args.requests)]
+
+def sync_requests(client, seeded: dict, args, mock_url: str) -> List[Callable[[], Awaitable[int]]]:
+    import httpx
+
+    stores = seeded["stores"]
+
+    def sync(store):
+        async def prepare():
+            async with httpx.AsyncClient() as mock:
+                await mock.post(f"{mock_url}/_mock/{store['platform']}/shops/{store['shop_name']}/orders",
+                                params={"count": args.sync_orders})
+
+        async def request():
+            return (await client.post(f"/integrations/sync/{store['id']}")).status_code
+        request.prepare = prepare
+        return request
+
+    # Round-robin over stores; the same store is never synced twice at once
+    count = min(args.sync_requests, len(stores)) if stores else 0
+    return [sync(stores[i]) for i in range(count)]
+
+def payment_requests(client, seeded: dict, args) -> List[Callable[[], Awaitable[int]]]:
+    def pay(order_id):
+        async def request():
+            response = await client.post(
+                "/api/payments/process", json={"order_id": order_id, "amount": 49.0},
+                headers={"Idempotency-Key": f"bench-{args.seed}-{order_id}"},
+            )
+            return response.status_code
+        return request
+
+    return [pay(order_id) for order_id in seeded["unpaid_orders"]]
+
+def production_requests(client, seeded: dict, args) -> List[Callable[[], Awaitable[int]]]:
+    def render(order_id):
+        async def request():
+            response = await client.post(f"/admin/orders/{order_id}/production-file")
+            if response.status_code != 202:
+                return response.status_code
+            job = response.json()
+            while job["status"] not in ("succeeded", "failed"):
+                await asyncio.sleep(0.05)
+                job = (await client.get(f"/admin/production-jobs/{job['id']}")).json()
+            return 200 if job["status"] == "succeeded" else 500
+        return request
+
+    return [render(order_id) for order_id in seeded["artwork_orders"]]
+
+async def run_scenario(requests: List[Callable[[], Awaitable[int]]], concurrency: int) -> dict:
+    for request in requests:
+        prepare = getattr(request, "prepare", None)
+        if prepare:
+            await prepare()
+
+    latencies, errors = [], 0
+    queue = list(reversed(requests))
+
+    async def worker():
+        nonlocal errors
+        while queue:
+            request = queue.pop()
+            started = time.perf_counter()
+            try:
+                status = await request()
+            except Exception:
+                status = 599
+            latencies.append((time.perf_counter() - started) * 1000)
+            if status >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(latencies[-1], 2) if latencies else 0.0,
+    }
+
+# ---------------------------------------------------------------------------
+# Drivers
+
+@asynccontextmanager
+async def in_process_client():
+    import httpx
+    from main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+            yield client
+
+@asynccontextmanager
+async def uvicorn_client(args, env: dict, cwd: str):
+    import httpx
+
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=cwd, env={**env, "PYTHONPATH": BACKEND_DIR},
+    )
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        wait_until_up(f"{base_url}/health")
+        limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, timeout=300, limits=limits) as client:
+            yield client
+    finally:
+        server.terminate()
+        server.wait()
+
+async def run_all(args, seeded: dict, env: dict, cwd: str, mock_url: str) -> Dict[str, dict]:
+    context = uvicorn_client(args, env, cwd) if args.mode == "uvicorn" else in_process_client()
+    results = {}
+    async with context as client:
+        builders = {
+            "list_orders": lambda: list_orders_requests(client, seeded, args),
+            "sync": lambda: sync_requests(client, seeded, args, mock_url),
+            "payments": lambda: payment_requests(client, seeded, args),
+            "production": lambda: production_requests(client, seeded, args),
+        }
+        for name in args.scenarios:
+            results[name] = await run_scenario(builders[name](), args.concurrency)
+            print(f"{name:<12} {json.dumps(results[name])}", file=sys.stderr)
+    return results
+
+# ---------------------------------------------------------------------------
+# Baseline comparison
+
+def compare(current: dict, baseline: dict, threshold_pct: float) -> List[str]:
+    """Prints a per-metric diff; returns descriptions of regressions beyond the threshold."""
+    regressions = []
+    print(f"\n{'scenario':<12} {'metric':<15} {'baseline':>10} {'current':>10} {'change':>8}", file=sys.stderr)
+    for name, result in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            continue
+        for metric, direction in COMPARED_METRICS.items():
+            old, new = before.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            worse = -change * direction > threshold_pct
+            flag = "  REGRESSION" if worse else ""
+            print(f"{name:<12} {metric:<15} {old:>10} {new:>10} {change:>+7.1f}%{flag}", file=sys.stderr)
+            if worse:
+                regressions.append(f"{name}.{metric} {change:+.1f}%")
+    if current["config"] != baseline.get("config"):
+        print("warning: benchmark configuration differs from the baseline", file=sys.stderr)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--database-url", help="Defaults to a fresh SQLite file in a temp dir")
+    parser.add_argument("--reset", action="store_true", help="Drop and recreate all tables before seeding")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--stores", type=int, default=20)
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--workers", type=int, default=2, help="uvicorn workers")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="Requests for list_orders and payments")
+    parser.add_argument("--sync-requests", type=int, default=20, help="Capped at --stores")
+    parser.add_argument("--sync-orders", type=int, default=50, help="New marketplace orders per synced store")
+    parser.add_argument("--production-requests", type=int, default=10)
+    parser.add_argument("--artwork-px", type=int, default=2000)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", help="Earlier JSON report to diff against")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Percent change counted as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or f"sqlite:///{tmp}/bench.db"
+        mock_port = free_port()
+        mock_url = f"http://127.0.0.1:{mock_port}"
+        env = {
+            **os.environ,
+            "DATABASE_URL": database_url,
+            "ETSY_API_URL": f"{mock_url}/etsy",
+            "SHOPIFY_API_URL": f"{mock_url}/shopify",
+        }
+        # Seen by the in-process app, which reads its settings at import
+        os.environ.update(env)
+
+        artwork = os.path.join(tmp, "artwork.png")
+        write_artwork(artwork, args.artwork_px)
+        started = time.perf_counter()
+        seeded = seed(database_url, args, artwork)
+        seed_seconds = time.perf_counter() - started
+
+        mock = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "mock_marketplace:app", "--port", str(mock_port), "--log-level", "warning"],
+            cwd=BACKEND_DIR,
+        )
+        # Production files and other relative paths land in the temp dir
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            wait_until_up(f"{mock_url}/docs")
+            scenarios = asyncio.run(run_all(args, seeded, env, tmp, mock_url))
+        finally:
+            os.chdir(cwd)
+            mock.terminate()
+            mock.wait()
+
+    config_keys = ("users", "stores", "orders", "seed", "mode", "workers", "concurrency", "requests",
+                   "sync_requests", "sync_orders", "production_requests", "artwork_px")
+    report = {
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "database": database_url.split(":", 1)[0],
+        },
+        "config": {key: getattr(args, key) for key in config_keys},
+        "seed_seconds": round(seed_seconds, 2),
+        "scenarios": scenarios,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print("regressions: " + ", ".join(regressions), file=sys.stderr)
+            if args.fail_on_regression:
+                sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Webhook ingestion: acknowledgement latency, time until pushed orders are in
+the database, and dedup of redeliveries.
+
+Starts the app and the mock marketplace with uvicorn on a temporary SQLite
+database, then acts as the platforms: posts signed Shopify order webhooks
+(concurrently, a share of them redelivered; an orders/paid event, which the
+import can't apply, must be refused), and has the mock push Etsy notifications for a burst of new
+receipts, which the consumer coalesces into incremental syncs. Reports ack
+latency percentiles and the time until every order is imported.
+
+Usage (from backend/):
+    python benchmarks/webhooks.py --orders 2000 --concurrency 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+SHOPIFY_SHOP = "bench-shop.myshopify.com"
+ETSY_SHOP = "4242"
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def serve(module: str, port: int, env: dict) -> subprocess.Popen:
+    import urllib.request
+
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", f"{module}:app", "--port", str(port), "--log-level", "warning"],
+                              cwd=BACKEND_DIR, env=env)
+    for _ in range(200):
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/docs", timeout=1)
+            return server
+        except OSError:
+            time.sleep(0.05)
+    server.kill()
+    sys.exit(f"{module} did not start")
+
+def count_orders(db_path: str, source: str) -> int:
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute('SELECT COUNT(*) FROM "order" WHERE source = ?', (source,)).fetchone()[0]
+
+def wait_for(db_path: str, source: str, expected: int, started: float, timeout: float = 120) -> float:
+    while count_orders(db_path, source) < expected:
+        if time.perf_counter() - started > timeout:
+            sys.exit(f"FAILED: {count_orders(db_path, source)} of {expected} {source} orders after {timeout}s")
+        time.sleep(0.02)
+    return time.perf_counter() - started
+
+async def post_all(url: str, requests: list, concurrency: int) -> list:
+    import httpx
+
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(timeout=30) as client:
+        async def post(body, headers):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post(url, content=body, headers=headers)
+                return response.status_code, response.json().get("status"), (time.perf_counter() - started) * 1000
+
+        return await asyncio.gather(*(post(body, headers) for body, headers in requests))
+
+def percentile(samples: list, p: float) -> float:
+    return sorted(samples)[min(len(samples) - 1, int(len(samples) * p))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--orders", type=int, default=2000, help="Shopify orders pushed")
+    parser.add_argument("--etsy-orders", type=int, default=200, help="Etsy receipts announced")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--redeliver", type=float, default=0.1, help="Share of webhooks sent twice")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    db_path = f"{tmp}/webhooks.db"
+    app_port, mock_port = free_port(), free_port()
+    env = {
+        **os.environ, "DATABASE_URL": f"sqlite:///{db_path}",
+        "SHOPIFY_WEBHOOK_SECRET": "shpss_bench", "ETSY_WEBHOOK_SECRET": "whsec_" + "YmVuY2gtc2VjcmV0LWtleQ==",
+        "ETSY_API_URL": f"http://127.0.0.1:{mock_port}/etsy", "SHOPIFY_API_URL": f"http://127.0.0.1:{mock_port}/shopify",
+    }
+    env.pop("PYTHONPROFILEIMPORTTIME", None)
+    os.environ.update(env)
+    subprocess.run([sys.executable, "-m", "migrations.migrate"], cwd=BACKEND_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+    from sqlalchemy import insert
+    from database import engine
+    from models import Store, User
+
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"email": "bench@example.com", "full_name": "Bench", "password_hash": "-"}])
+        conn.execute(insert(Store), [
+            {"user_id": 1, "platform": platform, "shop_name": shop, "access_token": "bench"}
+            for platform, shop in (("shopify", SHOPIFY_SHOP), ("etsy", ETSY_SHOP))
+        ])
+
+    import mock_marketplace
+
+    servers = [serve("mock_marketplace", mock_port, env), serve("main", app_port, env)]
+    try:
+        url = f"http://127.0.0.1:{app_port}/integrations/webhooks"
+        rng = random.Random(1)
+        created = []
+        for i in range(args.orders):
+            body, headers = mock_marketplace._signed_webhook("shopify", SHOPIFY_SHOP, mock_marketplace._shopify_order(900000 + i))
+            created.append((body, headers))
+        redelivered = rng.sample(created, int(args.orders * args.redeliver))
+        forged_body, forged_headers = created[0]
+        status = asyncio.run(post_all(f"{url}/shopify", [(forged_body + b" ", forged_headers)], 1))[0][0]
+        print(f"tampered body: HTTP {status}")
+        if status != 401:
+            sys.exit("FAILED: tampered webhook was accepted")
+        paid_body, paid_headers = created[0]
+        paid_headers = {**paid_headers, "X-Shopify-Topic": "orders/paid", "X-Shopify-Webhook-Id": str(uuid.uuid4())}
+        status = asyncio.run(post_all(f"{url}/shopify", [(paid_body, paid_headers)], 1))[0][0]
+        print(f"orders/paid: HTTP {status}")
+        if status != 400:
+            sys.exit("FAILED: an orders/paid webhook was acknowledged, its update would be dropped")
+
+        started = time.perf_counter()
+        results = asyncio.run(post_all(f"{url}/shopify", created + redelivered, args.concurrency))
+        acked = time.perf_counter() - started
+        imported = wait_for(db_path, "shopify", args.orders, started)
+        latencies = [ms for code, _, ms in results if code == 200]
+        outcomes = {}
+        for code, state, _ in results:
+            outcomes[state or code] = outcomes.get(state or code, 0) + 1
+        print(f"shopify: {len(results)} webhooks acknowledged in {acked:.2f}s ({outcomes}); "
+              f"ack p50 {statistics.median(latencies):.1f} ms, p99 {percentile(latencies, 0.99):.1f} ms")
+        time.sleep(2) # Let the redeliveries drain too
+        total = count_orders(db_path, "shopify")
+        print(f"shopify: all {args.orders} orders imported {imported:.2f}s after the first webhook; {total} orders in the "
+              f"database after {len(redelivered)} redeliveries")
+        if total != args.orders:
+            sys.exit(f"FAILED: expected {args.orders} shopify orders, found {total}")
+
+        import httpx
+
+        before = count_orders(db_path, "etsy")
+        started = time.perf_counter()
+        response = httpx.post(f"http://127.0.0.1:{mock_port}/_mock/etsy/shops/{ETSY_SHOP}/orders", timeout=300,
+                              params={"count": args.etsy_orders, "webhook_url": f"{url}/etsy"})
+        statuses = response.json()["webhook_statuses"]
+        # The first sync also imports the shop's seeded receipts
+        expected = before + args.etsy_orders + mock_marketplace.SEED_ORDERS
+        imported = wait_for(db_path, "etsy", expected, started)
+        # Deliveries are recorded once their sync finishes, just after its last page is committed
+        for _ in range(100):
+            with sqlite3.connect(db_path) as conn:
+                if not conn.execute("SELECT COUNT(*) FROM webhookdelivery WHERE status != 'done'").fetchone()[0]:
+                    break
+            time.sleep(0.1)
+        with sqlite3.connect(db_path) as conn:
+            deliveries = conn.execute("SELECT COUNT(*), COUNT(DISTINCT processed_at) FROM webhookdelivery "
+                                      "WHERE platform = 'etsy' AND status = 'done'").fetchone()
+        print(f"etsy: {len(statuses)} notifications ({set(statuses)}), {deliveries[0]} handled in {deliveries[1]} "
+              f"batches; all {expected - before} receipts imported {imported:.2f}s after the first")
+        with sqlite3.connect(db_path) as conn:
+            failed = conn.execute("SELECT COUNT(*) FROM webhookdelivery WHERE status != 'done'").fetchone()[0]
+        if failed:
+            sys.exit(f"FAILED: {failed} deliveries not done")
+        print("OK")
+    finally:
+        for server in servers:
+            server.terminate()
+            server.wait()
+
+if __name__ == "__main__":
+    main()
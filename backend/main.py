@@ -1,17 +1,57 @@
+import json
+import os
 from contextlib import asynccontextmanager
-from typing import List, Optional
-from fastapi import FastAPI, Depends, HTTPException, Query
+from datetime import date, datetime
+from email.utils import formatdate, parsedate_to_datetime
+from typing import List, Optional, Tuple
+from urllib.parse import quote
+from fastapi import FastAPI, Body, Depends, Header, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlmodel import Session, select
-from database import create_db_and_tables, get_session
-from models import User, Order, ShipOrderRequest, Payment, SiteConfig
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, RedirectResponse, StreamingResponse
+from sqlalchemy import Boolean, case, type_coerce
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import SQLModel, Session, select, update
+from database import as_dicts, engine, get_session, projection
+from models import (
+    User, UserPublic, UserSummary, Order, OrderLineItem, OrderPage, ShipOrderRequest, Payment, SiteConfig, ProductionJob,
+    BulkShipRequest, BulkUpdateResult, BulkVerifyRequest, OrderStats, ItemPreflight, GangSheetJob,
+)
+from services.order_service import OrderService, parse_tracking_csv
+from services.order_export import OrderExporter
+from services.order_search import search_orders
+from services.order_stats import read_order_stats
+from services.production_jobs import job_queue
+from services.config_cache import site_config_cache
+from services.pricing import Quote, QuoteRequest, pricing_engine
+from services.metrics import MetricsMiddleware, install_sql_hooks, metrics
+from services.outbox import emit, outbox_dispatcher, payment_message, shipped_message
+from services.webhooks import webhook_consumer
+from routers import integrations
+from migrations import migrate
+
+GZIP_MINIMUM_SIZE = int(os.getenv("GZIP_MINIMUM_SIZE", "1000"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "5"))
+
+# Schema changes run out-of-band (python -m migrations.migrate); startup only checks the version
+AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "false").strip().lower() in ("1", "true", "yes", "on")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    create_db_and_tables()
+    if AUTO_MIGRATE:
+        migrate.upgrade(engine)
+    else:
+        migrate.check_current(engine)
+    job_queue.start()
+    outbox_dispatcher.start()
+    webhook_consumer.start()
     yield
+    webhook_consumer.shutdown()
+    outbox_dispatcher.shutdown()
+    job_queue.shutdown()
 
-app = FastAPI(title="POD Platform API", version="0.1.0", lifespan=lifespan)
+# orjson encodes several times faster than the stdlib json FastAPI uses by default
+app = FastAPI(title="POD Platform API", version="0.1.0", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Configure CORS
 origins = [
@@ -27,33 +67,90 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Lists of a few hundred rows shrink 5-10x; small responses aren't worth the CPU
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE, compresslevel=GZIP_LEVEL)
+
+# Outermost, so latency covers CORS and error handling too
+install_sql_hooks(engine)
+app.add_middleware(MetricsMiddleware)
+
+app.include_router(integrations.router)
+
+def replay_payment(session: Session, payment: Payment, request_data: Payment, response: Response) -> Payment:
+    """Returns the payment recorded for an idempotency key, if the retried request matches it."""
+    # Hand the connection back now rather than at dependency teardown, which waits for
+    # a free threadpool thread; under a retry storm that would drain the pool.
+    session.close()
+    if payment.order_id != request_data.order_id or payment.amount != request_data.amount:
+        raise HTTPException(status_code=422, detail="Idempotency key was already used for a different payment")
+    response.headers["Idempotent-Replayed"] = "true"
+    return payment
+
 @app.post("/api/payments/process", response_model=Payment)
-def process_payment(payment_data: Payment, session: Session = Depends(get_session)):
+def process_payment(
+    payment_data: Payment,
+    response: Response,
+    session: Session = Depends(get_session),
+    idempotency_key: Optional[str] = Header(default=None),
+):
+    key = idempotency_key or payment_data.idempotency_key
+
+    # 0. A retry of a request we already processed gets the original result, the gateway is not called again
+    if key:
+        existing = session.exec(select(Payment).where(Payment.idempotency_key == key)).first()
+        if existing:
+            return replay_payment(session, existing, payment_data, response)
+
     # 1. Verify Order exists
     order = session.get(Order, payment_data.order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
 
-    # 2. Simulate Payment Gateway (Stripe/PayPal)
-    # In real world, we would call external API here.
-    import uuid
-    payment_data.transaction_id = f"txn_{uuid.uuid4().hex[:12]}"
-    payment_data.status = "completed"
-    
-    # 3. Save Payment
-    session.add(payment_data)
-    
-    # 4. Update Order Status
-    order.payment_status = "paid"
+    # 2. Claim the idempotency key; a concurrent duplicate fails on the unique constraint
+    payment = Payment(
+        order_id=payment_data.order_id,
+        amount=payment_data.amount,
+        currency=payment_data.currency,
+        method=payment_data.method,
+        status="pending",
+        idempotency_key=key,
+    )
+    session.add(payment)
+    try:
+        session.flush()
+    except IntegrityError:
+        session.rollback()
+        existing = session.exec(select(Payment).where(Payment.idempotency_key == key)).one()
+        return replay_payment(session, existing, payment_data, response)
+
+    # 3. Compare-and-set the order: only one payment can move it to paid.
     # If order was draft/pending, move to ready_for_print or whichever flow
-    if order.status == "draft" or order.status == "pending":
-         order.status = "ready_for_print"
-    
-    session.add(order)
+    result = session.exec(
+        update(Order)
+        .where(Order.id == order.id, Order.payment_status != "paid")
+        .values(
+            payment_status="paid",
+            status=case((Order.status.in_(("draft", "pending")), "ready_for_print"), else_=Order.status),
+            version=Order.version + 1,
+        )
+    )
+    if result.rowcount == 0:
+        session.rollback()
+        raise HTTPException(status_code=409, detail="Order is already paid")
+
+    # 4. Simulate Payment Gateway (Stripe/PayPal)
+    # In real world, we would call external API here; a failure rolls back the claim so the client can retry.
+    import uuid
+    payment.transaction_id = f"txn_{uuid.uuid4().hex[:12]}"
+    payment.status = "completed"
+
+    session.add(payment)
+    emit(session, [payment_message(order.id, order.recipient_email, payment.id, payment.amount, payment.currency)])
     session.commit()
-    session.refresh(payment_data)
-    
-    return payment_data
+    session.refresh(payment)
+    session.close()
+
+    return payment
 
 @app.get("/")
 def read_root():
@@ -63,14 +160,32 @@ def read_root():
 def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """Prometheus scrape endpoint; numbers are per worker process."""
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Admin API Endpoints
 
-@app.get("/admin/users", response_model=List[User])
-def get_users(session: Session = Depends(get_session), offset: int = 0, limit: int = 100):
-    users = session.exec(select(User).offset(offset).limit(limit)).all()
-    return users
+@app.get("/admin/users", response_model=List[UserSummary])
+def get_users(session: Session = Depends(get_session), offset: int = 0, limit: int = Query(default=100, ge=1, le=1000)):
+    has_custom_pricing = type_coerce(
+        User.custom_pricing_json.is_not(None) & (User.custom_pricing_json != ""), Boolean
+    ).label("has_custom_pricing")
+    rows = as_dicts(session.exec(
+        select(*projection(User, UserSummary), has_custom_pricing).order_by(User.id).offset(offset).limit(limit)
+    ))
+    # Rows are already the response shape; encode directly rather than validating each through the model
+    return ORJSONResponse(rows)
+
+@app.get("/admin/users/{user_id}", response_model=UserPublic)
+def get_user(user_id: int, session: Session = Depends(get_session)):
+    user = session.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
 
-@app.post("/admin/users/{user_id}/activate", response_model=User)
+@app.post("/admin/users/{user_id}/activate", response_model=UserPublic)
 def activate_user(user_id: int, session: Session = Depends(get_session)):
     user = session.get(User, user_id)
     if not user:
@@ -81,7 +196,7 @@ def activate_user(user_id: int, session: Session = Depends(get_session)):
     session.refresh(user)
     return user
 
-@app.post("/admin/users/{user_id}/deactivate", response_model=User)
+@app.post("/admin/users/{user_id}/deactivate", response_model=UserPublic)
 def deactivate_user(user_id: int, session: Session = Depends(get_session)):
     user = session.get(User, user_id)
     if not user:
@@ -98,7 +213,7 @@ class UserPricingUpdate(SQLModel):
     custom_pricing_json: Optional[str] = None
     allow_on_account_payment: Optional[bool] = None
 
-@app.put("/admin/users/{user_id}/pricing", response_model=User)
+@app.put("/admin/users/{user_id}/pricing", response_model=UserPublic)
 def update_user_pricing(user_id: int, pricing_data: UserPricingUpdate, session: Session = Depends(get_session)):
     user = session.get(User, user_id)
     if not user:
@@ -114,14 +229,111 @@ def update_user_pricing(user_id: int, pricing_data: UserPricingUpdate, session:
         user.allow_on_account_payment = pricing_data.allow_on_account_payment
         
     session.add(user)
+    pricing_engine.bump(session)
     session.commit()
     session.refresh(user)
     return user
 
-@app.get("/admin/orders", response_model=List[Order])
-def get_orders(session: Session = Depends(get_session), offset: int = 0, limit: int = 100):
-    orders = session.exec(select(Order).offset(offset).limit(limit)).all()
-    return orders
+@app.post("/api/quotes", response_model=Quote)
+def create_quote(req: QuoteRequest, session: Session = Depends(get_session)):
+    """Prices a batch of line items with the user's compiled price table"""
+    if req.user_id is not None and not session.get(User, req.user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    return pricing_engine.quote(session, req.user_id, req.items)
+
+@app.get("/admin/orders", response_model=OrderPage)
+def get_orders(
+    session: Session = Depends(get_session),
+    cursor: Optional[str] = None,
+    limit: int = Query(default=100, ge=1, le=500),
+    status: Optional[str] = None,
+    store_id: Optional[int] = None,
+    source: Optional[str] = None,
+):
+    try:
+        orders, next_cursor = OrderService(session).list_orders(
+            limit=limit, cursor=cursor, status=status, store_id=store_id, source=source
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return ORJSONResponse({"items": orders, "next_cursor": next_cursor})
+
+@app.get("/admin/orders/search", response_model=OrderPage)
+def search_orders_endpoint(
+    q: str = Query(min_length=1),
+    cursor: Optional[str] = None,
+    limit: int = Query(default=50, ge=1, le=200),
+    session: Session = Depends(get_session),
+):
+    """Prefix search over customer name, email, city, zip, external id and line-item SKUs/titles, newest first."""
+    try:
+        orders, next_cursor = search_orders(session, q, limit=limit, before_id=int(cursor) if cursor else None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return ORJSONResponse({"items": orders, "next_cursor": next_cursor})
+
+@app.get("/admin/orders/stats", response_model=OrderStats)
+def get_order_stats(days: int = Query(default=30, ge=1, le=366), session: Session = Depends(get_session)):
+    """Order counts and paid revenue per status, store, source and day, from the running totals."""
+    return read_order_stats(session, days=days)
+
+@app.get("/admin/orders/export")
+def export_orders(
+    format: str = Query(default="csv"),
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    status: Optional[str] = None,
+    store_id: Optional[int] = None,
+    source: Optional[str] = None,
+):
+    """Streams every matching order as CSV or NDJSON, oldest first."""
+    try:
+        exporter = OrderExporter(
+            format, created_from=created_from, created_to=created_to,
+            status=status, store_id=store_id, source=source,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        exporter,
+        media_type=exporter.media_type,
+        headers={"Content-Disposition": f'attachment; filename="{exporter.filename()}"'},
+    )
+
+@app.get("/admin/orders/packing-slips")
+def packing_slips(
+    status: Optional[str] = Query(default="in_production"),
+    day: Optional[date] = None,
+    store_id: Optional[int] = None,
+    source: Optional[str] = None,
+):
+    """Streams one PDF: the shipping manifest, then a packing slip per matching order, oldest first."""
+    from services.packing_slips import PackingSlipDocument
+
+    document = PackingSlipDocument(status=status, day=day, store_id=store_id, source=source)
+    return StreamingResponse(
+        document,
+        media_type="application/pdf",
+        headers={"Content-Disposition": f'attachment; filename="{document.filename()}"'},
+    )
+
+@app.get("/admin/line-items", response_model=List[OrderLineItem])
+def get_line_items(
+    session: Session = Depends(get_session),
+    sku: Optional[str] = None,
+    material: Optional[str] = None,
+    order_status: Optional[str] = None,
+    limit: int = Query(default=100, ge=1, le=1000),
+):
+    """Production queue view, e.g. all WL-204 items of orders that are ready_for_print"""
+    query = select(OrderLineItem)
+    if sku is not None:
+        query = query.where(OrderLineItem.sku == sku)
+    if material is not None:
+        query = query.where(OrderLineItem.material == material)
+    if order_status is not None:
+        query = query.join(Order, Order.id == OrderLineItem.order_id).where(Order.status == order_status)
+    return session.exec(query.order_by(OrderLineItem.order_id, OrderLineItem.position).limit(limit)).all()
 
 @app.post("/admin/orders/{order_id}/verify", response_model=Order)
 def verify_order(order_id: int, session: Session = Depends(get_session)):
@@ -144,16 +356,55 @@ def ship_order(order_id: int, ship_req: ShipOrderRequest, session: Session = Dep
     order.status = "shipped"
     order.tracking_number = ship_req.tracking_number
     session.add(order)
+    # Committed together with the status; the outbox dispatcher sends it off the request path
+    emit(session, [shipped_message(order.id, order.recipient_email, order.tracking_number)])
     session.commit()
     session.refresh(order)
-    print(f"Sending email to user {order.user_id} with tracking number {order.tracking_number}")
     return order
 
-from models import SiteConfig
+@app.post("/admin/orders/bulk-verify", response_model=BulkUpdateResult)
+def bulk_verify_orders(req: BulkVerifyRequest, session: Session = Depends(get_session)):
+    try:
+        return OrderService(session).bulk_verify(req.order_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/admin/orders/bulk-ship", response_model=BulkUpdateResult)
+def bulk_ship_orders(req: BulkShipRequest, session: Session = Depends(get_session)):
+    try:
+        return OrderService(session).bulk_ship(req.shipments)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/admin/orders/tracking-upload", response_model=BulkUpdateResult)
+def upload_tracking_numbers(
+    csv_text: str = Body(..., media_type="text/csv"),
+    session: Session = Depends(get_session),
+):
+    """Ships the orders in an `order_id,tracking_number` CSV sent as the raw request body."""
+    rows, errors = parse_tracking_csv(csv_text)
+    try:
+        result = OrderService(session).bulk_ship_rows(rows)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    result.results = sorted(result.results + errors, key=lambda row: row.line)
+    result.failed += len(errors)
+    return result
+
+# Browsers revalidate on every load; an unchanged config is answered with a bodiless 304
+CONFIG_CACHE_CONTROL = "no-cache"
+
+def not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """Sets validators on the response; returns a 304 to send instead if the client copy is current."""
+    headers = {"ETag": etag, "Cache-Control": CONFIG_CACHE_CONTROL}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
 
 @app.get("/admin/site-config", response_model=List[SiteConfig])
-def get_site_config(session: Session = Depends(get_session)):
-    configs = session.exec(select(SiteConfig)).all()
+def get_site_config(request: Request, response: Response, session: Session = Depends(get_session)):
+    configs = site_config_cache.all(session)
     # Initialize defaults if empty (for prototype)
     if not configs:
         defaults = [
@@ -164,38 +415,186 @@ def get_site_config(session: Session = Depends(get_session)):
         ]
         for config in defaults:
             session.add(config)
+        site_config_cache.bump(session)
         session.commit()
-        configs = defaults
+        configs = site_config_cache.all(session)
+
+    cached = not_modified(request, response, site_config_cache.etag(session, "site-config"))
+    if cached:
+        return cached
     return configs
 
+@app.post("/admin/site-config")
+def update_site_config(configs: List[SiteConfig], session: Session = Depends(get_session)):
+    for config in configs:
+        item = session.get(SiteConfig, config.key)
+        if not item:
+            item = SiteConfig(key=config.key, value=config.value, group=config.group, type=config.type, label=config.label)
+        else:
+            item.value = config.value
+        session.add(item)
+
+    site_config_cache.bump(session)
     session.commit()
     return {"status": "updated"}
 
-from services.production_generator import ProductionGenerator
-from fastapi.responses import FileResponse
-import os
+@app.post("/admin/orders/{order_id}/production-file", response_model=ProductionJob, status_code=202)
+def generate_production_file(order_id: int, item_index: int = 0, session: Session = Depends(get_session)):
+    """Queues production-file rendering; poll the returned job and download when it succeeds"""
+    order = session.get(Order, order_id)
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+
+    try:
+        return job_queue.enqueue(session, order, item_index=item_index)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/admin/orders/{order_id}/preflight", response_model=List[ItemPreflight])
+def preflight_order_artwork(order_id: int, bleed_cm: float = 2.0, session: Session = Depends(get_session)):
+    """Resolution, ink coverage and gamut checks of each line item's artwork; analyses are stored per file"""
+    from services.preflight import preflight_order
 
-@app.post("/admin/orders/{order_id}/production-file")
-def generate_production_file(order_id: int, session: Session = Depends(get_session)):
     order = session.get(Order, order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
-    
-    generator = ProductionGenerator()
     try:
-        # Generate PDF for the first item (prototype assumption)
-        filepath = generator.generate_pdf(order, item_index=0)
-        
-        # Update order with file path
-        order.production_file_url = filepath
-        order.status = "in_production" # Automatically move to production
-        session.add(order)
-        session.commit()
-        session.refresh(order)
-        
-        return FileResponse(filepath, media_type='application/pdf', filename=os.path.basename(filepath))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        return preflight_order(session, order, bleed_cm=bleed_cm)
+    except (OSError, ValueError) as e: # Unreadable artwork, ArtworkTooLarge, bad press profile
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/admin/production/cache")
+def get_production_cache_stats():
+    """Hit/miss counters and size of the production file cache"""
+    from services.production_generator import ProductionGenerator
+    return ProductionGenerator().cache.stats()
+
+@app.get("/admin/production-jobs/{job_id}", response_model=ProductionJob)
+def get_production_job(job_id: int, session: Session = Depends(get_session)):
+    job = session.get(ProductionJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+def _byte_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    (first, last) of a single "bytes=" range. None serves the whole file, which is
+    also the answer to malformed and multi-range requests. Raises ValueError if
+    the range lies outside the file.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    if not (first or last) or not all(part.isdigit() for part in (first, last) if part):
+        return None
+    if not first: # Suffix range: the last N bytes
+        if int(last) == 0 or size == 0:
+            raise ValueError("Range not satisfiable")
+        return max(0, size - int(last)), size - 1
+    if int(first) >= size or (last and int(last) < int(first)):
+        raise ValueError("Range not satisfiable")
+    return int(first), min(int(last), size - 1) if last else size - 1
+
+def _not_modified(request: Request, etag: str, modified: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None: # Takes precedence over If-Modified-Since
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag.removeprefix("W/") in tags
+    since = request.headers.get("if-modified-since")
+    if since:
+        try:
+            return int(modified) <= parsedate_to_datetime(since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+@app.get("/admin/production-jobs/{job_id}/download")
+def download_production_file(job_id: int, request: Request, session: Session = Depends(get_session)):
+    """
+    The rendered file. Redirects to a presigned URL when the storage has them (S3);
+    otherwise streams it with Range and If-None-Match / If-Modified-Since support,
+    so interrupted downloads resume and unchanged files aren't sent again.
+    """
+    from services.storage import get_storage
+
+    job = session.get(ProductionJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    storage = get_storage()
+    stored = storage.stat(job.file_path) if job.status == "succeeded" and job.file_path else None
+    if not stored:
+        raise HTTPException(status_code=409, detail=f"Production file not ready (job {job.status})")
+
+    filename = os.path.basename(stored.key)
+    url = storage.presigned_url(stored.key, filename=filename)
+    if url:
+        return RedirectResponse(url, status_code=307)
+
+    headers = {
+        "ETag": stored.etag,
+        "Last-Modified": formatdate(stored.modified, usegmt=True),
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f"attachment; filename*=utf-8''{quote(filename)}",
+        # Keeps GZipMiddleware out: ranges count stored bytes, and the artwork inside is JPEG already
+        "Content-Encoding": "identity",
+    }
+    if _not_modified(request, stored.etag, stored.modified):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    # If-Range: only resume if the file is still the one the client has the start of
+    if "range" in request.headers and (if_range is None or if_range in (stored.etag, headers["Last-Modified"])):
+        try:
+            byte_range = _byte_range(request.headers["range"], stored.size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{stored.size}"})
+    if byte_range is None:
+        return StreamingResponse(storage.read(stored.key), media_type="application/pdf",
+                                 headers={**headers, "Content-Length": str(stored.size)})
+    first, last = byte_range
+    return StreamingResponse(storage.read(stored.key, first, last), status_code=206, media_type="application/pdf",
+                             headers={**headers, "Content-Length": str(last - first + 1),
+                                      "Content-Range": f"bytes {first}-{last}/{stored.size}"})
+
+class GangSheetRequest(SQLModel):
+    order_ids: List[int]
+    roll_width_cm: float = 160.0
+    max_segment_length_cm: Optional[float] = None # Cut the roll into sheets of at most this length
+    bleed_cm: float = 2.0
+    gap_cm: float = 0.5
+
+class GangSheetJobStatus(SQLModel):
+    job: GangSheetJob
+    result: Optional[dict] = None # The placement manifest, once the job has succeeded
+
+@app.post("/admin/production/gang-sheets", response_model=GangSheetJob, status_code=202)
+def generate_gang_sheets(req: GangSheetRequest, session: Session = Depends(get_session)):
+    """Queues nesting the line items of many orders onto roll-width gang sheets; poll the returned job"""
+    from services.line_items import line_items_by_order, unsized_items
+
+    order_ids = session.exec(select(Order.id).where(Order.id.in_(req.order_ids))).all()
+    if not order_ids:
+        raise HTTPException(status_code=404, detail="No orders found")
+    unsized = unsized_items(item for items in line_items_by_order(session, order_ids).values() for item in items)
+    if unsized:
+        raise HTTPException(status_code=400, detail=unsized)
+
+    return job_queue.enqueue_gang_sheets(session, order_ids, req.model_dump(exclude={"order_ids"}))
+
+@app.get("/admin/production/gang-sheets/{job_id}", response_model=GangSheetJobStatus)
+def get_gang_sheet_job(job_id: int, session: Session = Depends(get_session)):
+    """The job, and its segment files and placements once it has succeeded"""
+    from services.storage import get_storage
+
+    job = session.get(GangSheetJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    result = None
+    if job.status == "succeeded" and job.file_path:
+        result = json.loads(b"".join(get_storage().read(job.file_path)))
+    return GangSheetJobStatus(job=job, result=result)
 
 # --- Payment Integration Endpoints ---
 
@@ -206,10 +605,13 @@ class PaymentConfig(SQLModel):
     paypal_enabled: bool = False
 
 @app.get("/api/config/payment", response_model=PaymentConfig)
-def get_payment_config(session: Session = Depends(get_session)):
+def get_payment_config(request: Request, response: Response, session: Session = Depends(get_session)):
     """Public endpoint to get enabled payment methods and public keys"""
-    configs = session.exec(select(SiteConfig).where(SiteConfig.group == "payment")).all()
-    config_dict = {c.key: c.value for c in configs}
+    cached = not_modified(request, response, site_config_cache.etag(session, "payment"))
+    if cached:
+        return cached
+
+    config_dict = site_config_cache.group(session, "payment")
     
     return PaymentConfig(
         stripe_public_key=config_dict.get("payment.stripe.public_key", ""),
@@ -247,6 +649,7 @@ def save_payment_config(config: AdminPaymentConfig, session: Session = Depends(g
             item.value = value
         session.add(item)
     
+    site_config_cache.bump(session)
     session.commit()
     return {"status": "saved"}
 
@@ -258,13 +661,13 @@ class PaymentIntentRequest(SQLModel):
 def create_payment_intent(req: PaymentIntentRequest, session: Session = Depends(get_session)):
     """Create Stripe PaymentIntent"""
     # 1. Get Secret Key
-    secret_key_config = session.get(SiteConfig, "payment.stripe.secret_key")
-    if not secret_key_config or not secret_key_config.value:
+    secret_key = site_config_cache.get(session, "payment.stripe.secret_key")
+    if not secret_key:
         raise HTTPException(status_code=400, detail="Stripe not configured")
 
     # 2. Call Stripe API (Mock for now, but structure is ready)
     # import stripe
-    # stripe.api_key = secret_key_config.value
+    # stripe.api_key = secret_key
     # intent = stripe.PaymentIntent.create(...)
     
     # MOCK RESPONSE
@@ -275,8 +678,8 @@ def create_payment_intent(req: PaymentIntentRequest, session: Session = Depends(
 def create_paypal_order(req: PaymentIntentRequest, session: Session = Depends(get_session)):
     """Create PayPal Order"""
     # 1. Get Secret Key (In real flow, we use this to get access token)
-    client_id = session.get(SiteConfig, "payment.paypal.client_id")
-    if not client_id or not client_id.value:
+    client_id = site_config_cache.get(session, "payment.paypal.client_id")
+    if not client_id:
         raise HTTPException(status_code=400, detail="PayPal not configured")
         
     # MOCK RESPONSE
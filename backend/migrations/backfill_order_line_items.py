@@ -0,0 +1,41 @@
+"""
+Creates the orderlineitem table and fills it from Order.line_items_json for
+orders that don't have rows yet. Safe to re-run.
+
+Usage (from backend/):
+    python -m migrations.backfill_order_line_items
+"""
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, SQLModel, select
+from database import engine as default_engine
+from models import Order, OrderLineItem
+from services.line_items import build_line_items
+
+BATCH_SIZE = 1000
+
+def upgrade(batch_size: int = BATCH_SIZE, engine: Engine = default_engine) -> int:
+    SQLModel.metadata.create_all(engine, tables=[OrderLineItem.__table__])
+
+    backfilled = 0
+    last_id = 0
+    with Session(engine) as session:
+        while True:
+            # Walk orders by id so each batch is an index range scan
+            batch = session.exec(
+                select(Order.id, Order.line_items_json)
+                .where(Order.id > last_id)
+                .where(~select(OrderLineItem.id).where(OrderLineItem.order_id == Order.id).exists())
+                .order_by(Order.id)
+                .limit(batch_size)
+            ).all()
+            if not batch:
+                break
+            for order_id, line_items_json in batch:
+                session.add_all(build_line_items(order_id, line_items_json))
+            session.commit()
+            backfilled += len(batch)
+            last_id = batch[-1][0]
+    return backfilled
+
+if __name__ == "__main__":
+    print(f"Backfilled line items for {upgrade()} orders")
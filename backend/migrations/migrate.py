@@ -0,0 +1,189 @@
+"""
+Versioned schema migrations. Run before starting the app (the Procfile release
+phase does this on deploy); the app itself only checks the database is current,
+so boots and scale-ups don't pay for schema reflection and DDL.
+
+Each migration runs once, in order, and is recorded in SchemaMigration. Add new
+ones at the end of MIGRATIONS with the next version number; keep them safe to
+re-run (create if missing, backfill only what's absent), since a fresh database
+gets the current tables from version 1.
+
+Usage (from backend/):
+    python -m migrations.migrate            # apply pending migrations
+    python -m migrations.migrate --status
+"""
+import argparse
+from contextlib import contextmanager
+from typing import Callable, List, Tuple
+from sqlalchemy import Table, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlmodel import Session, SQLModel, select
+from database import engine as default_engine
+from models import (
+    ArtworkPreflight, ConfigVersion, GangSheetJob, Order, Payment, ProductionJob, SchemaMigration, Store, WebhookDelivery,
+)
+from migrations import backfill_order_line_items
+from services.config_cache import SiteConfigCache
+from services.order_search import install_search_index
+from services.order_stats import install_order_stats
+from services.pricing import PricingEngine
+
+def _production_file_keys(engine: Engine):
+    # Files used to be referenced by path relative to backend/; they are now keys into
+    # the production storage, whose local backend keeps the same production_files/ root
+    prefix = "production_files/"
+    with engine.begin() as conn:
+        for table, column in (("productionjob", "file_path"), ('"order"', "production_file_url")):
+            conn.execute(text(f"UPDATE {table} SET {column} = SUBSTR({column}, :start) WHERE {column} LIKE :pattern"),
+                         {"start": len(prefix) + 1, "pattern": prefix + "%"})
+
+def _seed_config_versions(engine: Engine):
+    # bump_version only updates these rows; creating them on first write raced
+    with Session(engine) as session:
+        existing = set(session.exec(select(ConfigVersion.name)).all())
+        session.add_all(ConfigVersion(name=name) for name in (SiteConfigCache.NAME, PricingEngine.NAME)
+                        if name not in existing)
+        session.commit()
+
+def _add_columns(table: Table, *names: str) -> Callable[[Engine], None]:
+    """
+    ALTER TABLE ... ADD COLUMN for columns added to an existing model. Version 1's
+    create_all only creates missing tables, so databases from before the column
+    need this; tables it created already have them and are skipped.
+    """
+    def migrate(engine: Engine):
+        existing = {column["name"] for column in inspect(engine).get_columns(table.name)}
+        quote = engine.dialect.identifier_preparer.quote
+        with engine.begin() as conn:
+            for name in names:
+                if name in existing:
+                    continue
+                column = table.c[name]
+                ddl = f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(name)} {column.type.compile(dialect=engine.dialect)}"
+                if column.default is not None and column.default.is_scalar:
+                    ddl += f" DEFAULT {column.default.arg!r}"
+                if not column.nullable:
+                    ddl += " NOT NULL" # Existing rows get the default
+                conn.execute(text(ddl))
+    return migrate
+
+def _add_indexes(table: Table, *names: str) -> Callable[[Engine], None]:
+    """Creates the model's named indexes that the table doesn't have yet."""
+    def migrate(engine: Engine):
+        existing = {index["name"] for index in inspect(engine).get_indexes(table.name)}
+        with engine.begin() as conn:
+            for index in table.indexes:
+                if index.name in names and index.name not in existing:
+                    index.create(conn)
+    return migrate
+
+def _add_unique(table: Table, name: str, *columns: str) -> Callable[[Engine], None]:
+    """
+    Unique index standing in for a unique constraint added to an existing model
+    (SQLite can't add constraints to a table). Skipped if the columns already are unique.
+    """
+    def migrate(engine: Engine):
+        inspector = inspect(engine)
+        unique = [index["column_names"] for index in inspector.get_indexes(table.name) if index["unique"]]
+        unique += [constraint["column_names"] for constraint in inspector.get_unique_constraints(table.name)]
+        if list(columns) in unique:
+            return
+        quote = engine.dialect.identifier_preparer.quote
+        column_list = ", ".join(quote(column) for column in columns)
+        not_null = " AND ".join(f"{quote(column)} IS NOT NULL" for column in columns)
+        with engine.begin() as conn:
+            duplicates = conn.execute(text(
+                f"SELECT COUNT(*) FROM (SELECT 1 FROM {quote(table.name)} WHERE {not_null} "
+                f"GROUP BY {column_list} HAVING COUNT(*) > 1) AS duplicates"
+            )).scalar()
+            if duplicates:
+                raise RuntimeError(f"{duplicates} duplicate ({', '.join(columns)}) values in {table.name}; "
+                                   f"merge or remove them, then re-run the migration")
+            conn.execute(text(f"CREATE UNIQUE INDEX {quote(name)} ON {quote(table.name)} ({column_list})"))
+    return migrate
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Engine], object]]] = [
+    (1, "create tables", lambda engine: SQLModel.metadata.create_all(engine)),
+    (2, "backfill order line items", lambda engine: backfill_order_line_items.upgrade(engine=engine)),
+    (3, "order search index", install_search_index),
+    (4, "order stats triggers", install_order_stats),
+    (5, "artwork preflight results", lambda engine: SQLModel.metadata.create_all(engine, tables=[ArtworkPreflight.__table__])),
+    (6, "webhook delivery queue", lambda engine: SQLModel.metadata.create_all(engine, tables=[WebhookDelivery.__table__])),
+    (7, "production files as storage keys", _production_file_keys),
+    # Columns and constraints added to tables that existed before versioned migrations
+    (8, "order version column", _add_columns(Order.__table__, "version")),
+    (9, "store sync cursor", _add_columns(Store.__table__, "sync_cursor", "last_synced_at")),
+    (10, "payment idempotency key", lambda engine: (
+        _add_columns(Payment.__table__, "idempotency_key")(engine),
+        _add_unique(Payment.__table__, "uq_payment_idempotency_key", "idempotency_key")(engine),
+    )),
+    (11, "order keyset indexes and external id per store", lambda engine: (
+        _add_indexes(Order.__table__, "ix_order_created_at_id", "ix_order_status_created_at_id",
+                     "ix_order_store_id_created_at_id", "ix_order_source_created_at_id")(engine),
+        _add_unique(Order.__table__, "uq_order_store_id_external_id", "store_id", "external_id")(engine),
+    )),
+    (12, "production job leases", _add_columns(ProductionJob.__table__, "claim_token", "lease_expires_at")),
+    (13, "gang sheet jobs", lambda engine: SQLModel.metadata.create_all(engine, tables=[GangSheetJob.__table__])),
+    (14, "config version rows", _seed_config_versions),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# Arbitrary key for the PostgreSQL advisory lock serializing concurrent migrate runs
+ADVISORY_LOCK_KEY = 72616017
+
+def current_version(engine: Engine = default_engine) -> int:
+    """Highest applied version; 0 for a database that was never migrated. One query."""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT MAX(version) FROM schemamigration")).scalar() or 0
+    except DBAPIError:
+        return 0 # No schemamigration table yet
+
+@contextmanager
+def _migration_lock(engine: Engine):
+    if engine.dialect.name != "postgresql":
+        yield # SQLite deployments run a single migrate at a time
+        return
+    with engine.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+
+def upgrade(engine: Engine = default_engine) -> List[str]:
+    """Applies pending migrations in order. Returns the names of those applied."""
+    applied = []
+    with _migration_lock(engine):
+        SQLModel.metadata.create_all(engine, tables=[SchemaMigration.__table__])
+        with Session(engine) as session:
+            done = set(session.exec(select(SchemaMigration.version)).all())
+        for version, name, migrate in MIGRATIONS:
+            if version in done:
+                continue
+            migrate(engine)
+            with Session(engine) as session:
+                session.add(SchemaMigration(version=version, name=name))
+                session.commit()
+            applied.append(f"{version}: {name}")
+    return applied
+
+def check_current(engine: Engine = default_engine):
+    """Raises RuntimeError if the database is behind the code."""
+    version = current_version(engine)
+    if version < LATEST_VERSION:
+        raise RuntimeError(
+            f"Database schema is at version {version}, this code needs {LATEST_VERSION}. "
+            "Run: python -m migrations.migrate (or set DB_AUTO_MIGRATE=true for local development)"
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations")
+    parser.add_argument("--status", action="store_true", help="Show the current and latest version only")
+    args = parser.parse_args()
+    if args.status:
+        print(f"Schema version {current_version()} of {LATEST_VERSION}")
+    else:
+        applied = upgrade()
+        print("\n".join(f"Applied {name}" for name in applied) or "Already up to date")
@@ -0,0 +1,21 @@
+"""
+Recomputes the dashboard totals (OrderStat) from the order table, installing
+the triggers that maintain them if missing. The app does the same on its first
+start; run this after loading orders with the triggers disabled, or to clear
+rounding drift. Safe to re-run.
+
+Usage (from backend/):
+    python -m migrations.rebuild_order_stats
+"""
+from sqlmodel import SQLModel
+from database import engine
+from models import OrderStat
+from services.order_stats import install_order_stats, rebuild_order_stats
+
+def upgrade() -> int:
+    SQLModel.metadata.create_all(engine, tables=[OrderStat.__table__])
+    install_order_stats(engine)
+    return rebuild_order_stats(engine)
+
+if __name__ == "__main__":
+    print(f"Rebuilt {upgrade()} order stat rows")
@@ -0,0 +1,135 @@
+"""
+Local stand-in for the Etsy and Shopify order APIs, for development and tests.
+
+    uvicorn mock_marketplace:app --port 8001
+
+Every shop starts with a few seeded orders. POST /_mock/{platform}/shops/{shop}/orders?count=N
+adds N more, so incremental sync can be exercised. With &webhook_url=http://localhost:8000/integrations/webhooks/{platform}
+it also sends each new order as a webhook, signed with SHOPIFY_WEBHOOK_SECRET / ETSY_WEBHOOK_SECRET.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import random
+import time
+import uuid
+from typing import Dict, List, Optional
+import httpx
+from fastapi import FastAPI, Header, Query
+
+app = FastAPI(title="Mock Marketplace")
+
+CUSTOMERS = [
+    ("John Doe", "john.doe@example.com", "123 Maple Avenue", "Springfield", "IL", "62704", "United States"),
+    ("Sarah Smith", "sarah.smith@example.uk", "42 High Street, Camden", "London", None, "NW1 8QL", "United Kingdom"),
+    ("Hans Muller", "hans.muller@example.de", "Berliner Str. 10", "Berlin", None, "10115", "Germany"),
+    ("Michael Brown", "mike.brown@shopify-test.com", "456 Commerce St", "Toronto", "ON", "M5V 2H1", "Canada"),
+    ("Emma Watson", "emma.w@shopify-test.com", "789 Fifth Avenue", "New York", "NY", "10022", "United States"),
+]
+PRODUCTS = [
+    ("WL-204", "Tropical Jungle Wallpaper", "100x100 cm"),
+    ("CNV-001", "Abstract Canvas Art", "50x70 cm"),
+    ("WL-999", "Mountain View Wallpaper", "300x250 cm"),
+    ("WL-500", "Geometric Pattern Wallpaper", "Roll (10m)"),
+    ("PST-003", "Vintage Map Poster", "A1 Frame"),
+]
+SEED_ORDERS = 3
+
+# (platform, shop) -> orders in ascending id order
+_orders: Dict[tuple, List[dict]] = {}
+_rng = random.Random(42)
+
+def _etsy_receipt(receipt_id: int) -> dict:
+    name, email, street, city, state, zip_code, country = _rng.choice(CUSTOMERS)
+    sku, title, variant = _rng.choice(PRODUCTS)
+    return {
+        "receipt_id": receipt_id,
+        "name": name,
+        "buyer_email": email,
+        "first_line": street,
+        "city": city,
+        "state": state,
+        "zip": zip_code,
+        "country_name": country,
+        "transactions": [{"sku": sku, "title": title, "quantity": _rng.randint(1, 3), "variation": variant}],
+    }
+
+def _shopify_order(order_id: int) -> dict:
+    name, email, street, city, state, zip_code, country = _rng.choice(CUSTOMERS)
+    sku, title, variant = _rng.choice(PRODUCTS)
+    return {
+        "id": order_id,
+        "email": email,
+        "shipping_address": {
+            "name": name, "address1": street, "city": city, "province_code": state,
+            "zip": zip_code, "country": country,
+        },
+        "line_items": [{"sku": sku, "title": title, "quantity": _rng.randint(1, 3), "variant_title": variant}],
+    }
+
+FACTORIES = {"etsy": _etsy_receipt, "shopify": _shopify_order}
+FIRST_IDS = {"etsy": 100000, "shopify": 5000}
+
+def _shop_orders(platform: str, shop: str) -> List[dict]:
+    key = (platform, shop)
+    if key not in _orders:
+        _orders[key] = []
+        _add_orders(platform, shop, SEED_ORDERS)
+    return _orders[key]
+
+def _add_orders(platform: str, shop: str, count: int) -> List[dict]:
+    orders = _orders.setdefault((platform, shop), [])
+    id_field = "receipt_id" if platform == "etsy" else "id"
+    next_id = orders[-1][id_field] + 1 if orders else FIRST_IDS[platform]
+    new = [FACTORIES[platform](next_id + i) for i in range(count)]
+    orders.extend(new)
+    return new
+
+@app.get("/etsy/v3/application/shops/{shop}/receipts")
+def etsy_receipts(shop: str, min_receipt_id: int = 0, limit: int = Query(default=25, le=100), sort_order: str = "asc"):
+    orders = [r for r in _shop_orders("etsy", shop) if r["receipt_id"] >= min_receipt_id]
+    return {"count": len(orders), "results": orders[:limit]}
+
+@app.get("/shopify/admin/api/2024-01/orders.json")
+def shopify_orders(
+    since_id: int = 0,
+    limit: int = Query(default=50, le=250),
+    status: str = "any",
+    x_shopify_shop_domain: str = Header(default="default"),
+):
+    # The real API identifies the shop by hostname; the client also sends it as a header
+    orders = [o for o in _shop_orders("shopify", x_shopify_shop_domain) if o["id"] > since_id]
+    return {"orders": orders[:limit]}
+
+def _signed_webhook(platform: str, shop: str, order: dict):
+    """(body, headers) the way each platform signs its webhooks."""
+    if platform == "shopify":
+        body = json.dumps(order).encode()
+        secret = os.getenv("SHOPIFY_WEBHOOK_SECRET", "")
+        return body, {
+            "X-Shopify-Topic": "orders/create",
+            "X-Shopify-Shop-Domain": shop,
+            "X-Shopify-Webhook-Id": str(uuid.uuid4()),
+            "X-Shopify-Hmac-Sha256": base64.b64encode(hmac.new(secret.encode(), body, hashlib.sha256).digest()).decode(),
+        }
+    # Etsy: a notification naming the receipt, signed per Standard Webhooks
+    body = json.dumps({"event_type": "order.paid", "shop_id": shop, "receipt_id": order["receipt_id"]}).encode()
+    secret = os.getenv("ETSY_WEBHOOK_SECRET", "")
+    key = base64.b64decode(secret.split("_", 1)[1] if secret.startswith("whsec_") else secret)
+    webhook_id, timestamp = f"msg_{uuid.uuid4().hex}", str(int(time.time()))
+    signature = base64.b64encode(hmac.new(key, f"{webhook_id}.{timestamp}.".encode() + body, hashlib.sha256).digest())
+    return body, {"webhook-id": webhook_id, "webhook-timestamp": timestamp, "webhook-signature": f"v1,{signature.decode()}"}
+
+@app.post("/_mock/{platform}/shops/{shop}/orders")
+def add_orders(platform: str, shop: str, count: int = 1, webhook_url: Optional[str] = None):
+    _shop_orders(platform, shop)
+    added = _add_orders(platform, shop, count)
+    statuses = []
+    if webhook_url:
+        with httpx.Client(timeout=10) as client:
+            for order in added:
+                body, headers = _signed_webhook(platform, shop, order)
+                statuses.append(client.post(webhook_url, content=body, headers={**headers, "Content-Type": "application/json"}).status_code)
+    return {"added": len(added), "webhook_statuses": statuses}
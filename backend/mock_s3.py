@@ -0,0 +1,244 @@
+"""
+Local stand-in for an S3-compatible bucket, for development and tests of the
+s3 production storage backend.
+
+    uvicorn mock_s3:app --port 9000
+    PRODUCTION_STORAGE=s3 S3_ENDPOINT_URL=http://localhost:9000 S3_BUCKET=production \
+        S3_ACCESS_KEY_ID=mock S3_SECRET_ACCESS_KEY=mock-secret uvicorn main:app
+
+Implements what services/storage.py uses, path-style: PUT/GET/HEAD/DELETE of
+objects (GET with Range and conditional headers), CopyObject, multipart uploads,
+ListObjectsV2, and SigV4 checks of both signed requests and presigned URLs.
+Buckets spring into existence on first use. Objects are kept under MOCK_S3_DIR
+(a temporary directory by default).
+"""
+import hashlib
+import hmac
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import parse_qsl, unquote
+from xml.sax.saxutils import escape
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import StreamingResponse
+from services.storage import READ_CHUNK_BYTES, UNSIGNED_PAYLOAD, sign_v4
+
+app = FastAPI(title="Mock S3")
+
+ACCESS_KEY_ID = os.getenv("MOCK_S3_ACCESS_KEY_ID", "mock")
+SECRET_ACCESS_KEY = os.getenv("MOCK_S3_SECRET_ACCESS_KEY", "mock-secret")
+ROOT = os.getenv("MOCK_S3_DIR") or tempfile.mkdtemp(prefix="mock_s3_")
+XMLNS = "http://s3.amazonaws.com/doc/2006-03-01/"
+
+# (bucket, key) -> {"etag", "content_type"}; data is on disk
+OBJECTS: Dict[tuple, dict] = {}
+# upload id -> (bucket, key, content type)
+UPLOADS: Dict[str, tuple] = {}
+
+def _error(status: int, code: str, message: str = "") -> Response:
+    body = f'<?xml version="1.0" encoding="UTF-8"?><Error><Code>{code}</Code><Message>{escape(message)}</Message></Error>'
+    return Response(body, status_code=status, media_type="application/xml")
+
+def _xml(body: str) -> Response:
+    return Response(f'<?xml version="1.0" encoding="UTF-8"?>{body}', media_type="application/xml")
+
+def _object_path(bucket: str, key: str) -> str:
+    return os.path.join(ROOT, bucket, hashlib.sha256(key.encode()).hexdigest())
+
+def _check_signature(request: Request) -> Optional[Response]:
+    """None if the request is signed with the mock's credentials, else the error response."""
+    raw_path = request.scope["raw_path"].decode()
+    params = dict(parse_qsl(request.scope["query_string"].decode(), keep_blank_values=True))
+    if "X-Amz-Signature" in params: # Presigned URL
+        signature = params.pop("X-Amz-Signature")
+        credential = params.get("X-Amz-Credential", "")
+        amz_date = params.get("X-Amz-Date", "")
+        signed_names = params.get("X-Amz-SignedHeaders", "").split(";")
+        payload_hash = UNSIGNED_PAYLOAD
+        try:
+            issued = datetime.strptime(amz_date, "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc).timestamp()
+        except ValueError:
+            return _error(403, "AccessDenied", "Bad X-Amz-Date")
+        if time.time() > issued + int(params.get("X-Amz-Expires", "0")):
+            return _error(403, "AccessDenied", "Request has expired")
+    else:
+        authorization = request.headers.get("authorization", "")
+        if not authorization.startswith("AWS4-HMAC-SHA256 "):
+            return _error(403, "AccessDenied", "Missing signature")
+        fields = dict(part.strip().split("=", 1) for part in authorization[len("AWS4-HMAC-SHA256 "):].split(","))
+        credential, signature = fields.get("Credential", ""), fields.get("Signature", "")
+        signed_names = fields.get("SignedHeaders", "").split(";")
+        amz_date = request.headers.get("x-amz-date", "")
+        payload_hash = request.headers.get("x-amz-content-sha256", "")
+
+    access_key, _, scope = credential.partition("/")
+    region = scope.split("/")[1] if scope.count("/") >= 3 else ""
+    if access_key != ACCESS_KEY_ID:
+        return _error(403, "InvalidAccessKeyId", access_key)
+    headers = {name: request.headers.get(name, "") for name in signed_names}
+    _, _, expected = sign_v4(SECRET_ACCESS_KEY, region, amz_date, request.method, raw_path, params, headers, payload_hash)
+    if not hmac.compare_digest(expected, signature):
+        return _error(403, "SignatureDoesNotMatch")
+    return None
+
+async def _receive_to(path: str, request: Request) -> str:
+    """Streams the request body to path; returns its md5."""
+    md5 = hashlib.md5()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        async for chunk in request.stream():
+            md5.update(chunk)
+            f.write(chunk)
+    os.replace(path + ".tmp", path)
+    return md5.hexdigest()
+
+def _read(path: str, first: int, length: int):
+    with open(path, "rb") as f:
+        f.seek(first)
+        while length > 0:
+            chunk = f.read(min(READ_CHUNK_BYTES, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+@app.get("/{bucket}")
+def list_objects(bucket: str, request: Request):
+    """ListObjectsV2"""
+    denied = _check_signature(request)
+    if denied:
+        return denied
+    prefix = request.query_params.get("prefix", "")
+    max_keys = int(request.query_params.get("max-keys", "1000"))
+    after = request.query_params.get("continuation-token", "")
+    keys = sorted(key for b, key in OBJECTS if b == bucket and key.startswith(prefix) and key > after)
+    page, truncated = keys[:max_keys], len(keys) > max_keys
+    contents = []
+    for key in page:
+        path = _object_path(bucket, key)
+        st = os.stat(path)
+        modified = datetime.fromtimestamp(st.st_mtime, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+        contents.append(f"<Contents><Key>{escape(key)}</Key><LastModified>{modified}</LastModified>"
+                        f"<ETag>{escape(OBJECTS[(bucket, key)]['etag'])}</ETag><Size>{st.st_size}</Size></Contents>")
+    token = f"<NextContinuationToken>{escape(page[-1])}</NextContinuationToken>" if truncated else ""
+    return _xml(f'<ListBucketResult xmlns="{XMLNS}"><Name>{bucket}</Name><Prefix>{escape(prefix)}</Prefix>'
+                f"<KeyCount>{len(page)}</KeyCount><IsTruncated>{str(truncated).lower()}</IsTruncated>{token}"
+                f"{''.join(contents)}</ListBucketResult>")
+
+@app.api_route("/{bucket}/{key:path}", methods=["GET", "HEAD", "PUT", "POST", "DELETE"])
+async def object_endpoint(bucket: str, key: str, request: Request):
+    denied = _check_signature(request)
+    if denied:
+        return denied
+    key = unquote(request.scope["raw_path"].decode().split("/", 2)[2])
+    query = request.query_params
+    path = _object_path(bucket, key)
+
+    if request.method == "POST" and "uploads" in query:
+        upload_id = uuid.uuid4().hex
+        UPLOADS[upload_id] = (bucket, key, request.headers.get("content-type", "binary/octet-stream"))
+        os.makedirs(os.path.join(ROOT, "_uploads", upload_id))
+        return _xml(f'<InitiateMultipartUploadResult xmlns="{XMLNS}"><Bucket>{bucket}</Bucket><Key>{escape(key)}</Key>'
+                    f"<UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>")
+
+    if "uploadId" in query:
+        upload_id = query["uploadId"]
+        if upload_id not in UPLOADS:
+            return _error(404, "NoSuchUpload")
+        parts_dir = os.path.join(ROOT, "_uploads", upload_id)
+        if request.method == "PUT":
+            etag = await _receive_to(os.path.join(parts_dir, query["partNumber"]), request)
+            return Response(headers={"ETag": f'"{etag}"'})
+        if request.method == "DELETE":
+            del UPLOADS[upload_id]
+            shutil.rmtree(parts_dir, ignore_errors=True)
+            return Response(status_code=204)
+        # CompleteMultipartUpload: concatenate the listed parts in order
+        body = (await request.body()).decode()
+        numbers = [part.split("</PartNumber>")[0] for part in body.split("<PartNumber>")[1:]]
+        _, _, content_type = UPLOADS.pop(upload_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        digests = b""
+        with open(path + ".tmp", "wb") as out:
+            for number in numbers:
+                with open(os.path.join(parts_dir, number), "rb") as part:
+                    digests += hashlib.md5(part.read()).digest()
+                    part.seek(0)
+                    shutil.copyfileobj(part, out, READ_CHUNK_BYTES)
+        os.replace(path + ".tmp", path)
+        shutil.rmtree(parts_dir, ignore_errors=True)
+        etag = f'"{hashlib.md5(digests).hexdigest()}-{len(numbers)}"'
+        OBJECTS[(bucket, key)] = {"etag": etag, "content_type": content_type}
+        return _xml(f'<CompleteMultipartUploadResult xmlns="{XMLNS}"><Key>{escape(key)}</Key>'
+                    f"<ETag>{escape(etag)}</ETag></CompleteMultipartUploadResult>")
+
+    if request.method == "PUT" and "x-amz-copy-source" in request.headers:
+        source_bucket, _, source_key = unquote(request.headers["x-amz-copy-source"]).lstrip("/").partition("/")
+        source = OBJECTS.get((source_bucket, source_key))
+        if not source:
+            return _error(404, "NoSuchKey", source_key)
+        replace = request.headers.get("x-amz-metadata-directive", "COPY") == "REPLACE"
+        if (source_bucket, source_key) == (bucket, key) and not replace:
+            return _error(400, "InvalidRequest", "This copy request is illegal because it is trying to copy an object "
+                          "to itself without changing the object's metadata")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        md5 = hashlib.md5()
+        with open(_object_path(source_bucket, source_key), "rb") as src, open(path + ".tmp", "wb") as out:
+            for chunk in iter(lambda: src.read(READ_CHUNK_BYTES), b""):
+                md5.update(chunk)
+                out.write(chunk)
+        os.replace(path + ".tmp", path)
+        etag = f'"{md5.hexdigest()}"'
+        content_type = request.headers.get("content-type", "binary/octet-stream") if replace else source["content_type"]
+        OBJECTS[(bucket, key)] = {"etag": etag, "content_type": content_type}
+        modified = datetime.fromtimestamp(os.stat(path).st_mtime, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+        return _xml(f"<CopyObjectResult><LastModified>{modified}</LastModified><ETag>{escape(etag)}</ETag></CopyObjectResult>")
+
+    if request.method == "PUT":
+        etag = f'"{await _receive_to(path, request)}"'
+        OBJECTS[(bucket, key)] = {"etag": etag, "content_type": request.headers.get("content-type", "binary/octet-stream")}
+        return Response(headers={"ETag": etag})
+
+    meta = OBJECTS.get((bucket, key))
+    if request.method == "DELETE":
+        if meta:
+            del OBJECTS[(bucket, key)]
+            os.remove(path)
+        return Response(status_code=204)
+    if not meta:
+        return _error(404, "NoSuchKey", key)
+
+    st = os.stat(path)
+    headers = {
+        "ETag": meta["etag"], "Last-Modified": formatdate(st.st_mtime, usegmt=True), "Accept-Ranges": "bytes",
+        "Content-Type": meta["content_type"],
+    }
+    if "response-content-disposition" in query:
+        headers["Content-Disposition"] = query["response-content-disposition"]
+    if_none_match = request.headers.get("if-none-match")
+    since = request.headers.get("if-modified-since")
+    if (if_none_match is not None and meta["etag"] in if_none_match) or (
+            if_none_match is None and since and int(st.st_mtime) <= parsedate_to_datetime(since).timestamp()):
+        return Response(status_code=304, headers=headers)
+    first, last, status = 0, st.st_size - 1, 200
+    spec = request.headers.get("range", "")
+    if_range = request.headers.get("if-range")
+    if spec.startswith("bytes=") and if_range in (None, meta["etag"], headers["Last-Modified"]):
+        start, _, end = spec[len("bytes="):].partition("-")
+        if start:
+            first, last = int(start), min(int(end), st.st_size - 1) if end else st.st_size - 1
+        else:
+            first = max(0, st.st_size - int(end))
+        if first >= st.st_size:
+            return _error(416, "InvalidRange")
+        status = 206
+        headers["Content-Range"] = f"bytes {first}-{last}/{st.st_size}"
+    headers["Content-Length"] = str(last - first + 1)
+    if request.method == "HEAD":
+        return Response(status_code=status, headers=headers)
+    return StreamingResponse(_read(path, first, last - first + 1), status_code=status, headers=headers)
@@ -0,0 +1,108 @@
+"""
+Local SMTP stand-in for development and tests: accepts every message and prints it.
+
+    python mock_smtp.py --port 1025 [--fail-rate 0.1]
+
+Point the outbox at it with SMTP_HOST=localhost SMTP_PORT=1025 SMTP_STARTTLS=false
+(it speaks plain SMTP only). With
+--fail-rate a share of messages is answered with a temporary 451, to exercise
+retries. Received messages are kept in MockSMTPServer.messages.
+"""
+import argparse
+import asyncio
+import random
+import threading
+from email import message_from_bytes
+from typing import List, Optional
+
+class MockSMTPServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 1025, fail_rate: float = 0.0, verbose: bool = True):
+        self.host = host
+        self.port = port
+        self.fail_rate = fail_rate
+        self.verbose = verbose
+        self.messages: List = [] # email.message.Message, in arrival order
+        self.connections = 0
+        self._rng = random.Random(7)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+
+        async def reply(line: str):
+            writer.write(line.encode() + b"\r\n")
+            await writer.drain()
+
+        await reply("220 mock-smtp ESMTP ready")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                command = line.decode(errors="replace").strip()
+                verb = command.split(" ", 1)[0].upper()
+                if verb == "EHLO":
+                    await reply("250-mock-smtp\r\n250 8BITMIME")
+                elif verb in ("HELO", "RCPT", "RSET", "NOOP"):
+                    await reply("250 OK")
+                elif verb == "MAIL":
+                    if self._rng.random() < self.fail_rate:
+                        await reply("451 4.3.0 Temporary failure, try again later")
+                    else:
+                        await reply("250 OK")
+                elif verb == "DATA":
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    data = []
+                    while True:
+                        chunk = await reader.readline()
+                        if chunk in (b".\r\n", b".\n", b""):
+                            break
+                        data.append(chunk[1:] if chunk.startswith(b"..") else chunk)
+                    message = message_from_bytes(b"".join(data))
+                    self.messages.append(message)
+                    if self.verbose:
+                        print(f"mail to {message['To']}: {message['Subject']}")
+                    await reply("250 OK queued")
+                elif verb == "QUIT":
+                    await reply("221 Bye")
+                    return
+                else:
+                    await reply("502 Command not implemented")
+        finally:
+            writer.close()
+
+    async def serve(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        async with self._server:
+            await self._server.serve_forever()
+
+    def start_in_thread(self) -> int:
+        """Serves from a daemon thread; returns the bound port (pass port=0 for a free one)."""
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._server = self._loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port))
+            self.port = self._server.sockets[0].getsockname()[1]
+            started.set()
+            self._loop.run_forever()
+
+        threading.Thread(target=run, name="mock-smtp", daemon=True).start()
+        started.wait()
+        return self.port
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local SMTP stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    print(f"mock SMTP listening on {args.host}:{args.port}")
+    asyncio.run(MockSMTPServer(args.host, args.port, args.fail_rate).serve())
@@ -1,4 +1,5 @@
-from typing import Optional
+from typing import List, Optional
+from sqlalchemy import Index, UniqueConstraint
 from sqlmodel import Field, SQLModel
 from datetime import datetime
 
@@ -16,7 +17,41 @@ class User(SQLModel, table=True):
     custom_pricing_json: Optional[str] = Field(default=None) # JSON string: {"material_id": unit_price_float}
     allow_on_account_payment: bool = Field(default=False)
 
+class UserPublic(SQLModel):
+    # User as returned by the API: everything but the password hash
+    id: int
+    email: str
+    full_name: str
+    is_active: bool
+    is_admin: bool
+    created_at: datetime
+    discount_percentage: float
+    custom_pricing_json: Optional[str] = None
+    allow_on_account_payment: bool
+
+class UserSummary(SQLModel):
+    id: int
+    email: str
+    full_name: str
+    is_active: bool
+    is_admin: bool
+    created_at: datetime
+    discount_percentage: float
+    allow_on_account_payment: bool
+    has_custom_pricing: bool # Load /admin/users/{id} for the prices themselves
+
 class Order(SQLModel, table=True):
+    # Composite indexes backing keyset pagination on (created_at, id),
+    # optionally narrowed by status / store / source.
+    __table_args__ = (
+        Index("ix_order_created_at_id", "created_at", "id"),
+        Index("ix_order_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_order_store_id_created_at_id", "store_id", "created_at", "id"),
+        Index("ix_order_source_created_at_id", "source", "created_at", "id"),
+        # An external order id is only unique within the store it came from
+        UniqueConstraint("store_id", "external_id", name="uq_order_store_id_external_id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: Optional[int] = Field(foreign_key="user.id", default=None) # Optional for external orders
     
@@ -39,7 +74,7 @@ class Order(SQLModel, table=True):
     line_items_json: str 
     
     # Production Assets
-    production_file_url: Optional[str] = None # Path to generated PDF
+    production_file_url: Optional[str] = None # Storage key of the generated PDF (services/storage.py)
     
     # Shipping Address (Normalized)
     recipient_name: str
@@ -52,9 +87,99 @@ class Order(SQLModel, table=True):
     
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+    # Incremented by every compare-and-set status transition
+    version: int = Field(default=0)
+
+class OrderLineItem(SQLModel, table=True):
+    # Parsed copy of Order.line_items_json, one row per item, so items can be queried by SKU / size / material
+    __table_args__ = (
+        Index("ix_orderlineitem_sku_order_id", "sku", "order_id"),
+        Index("ix_orderlineitem_material_order_id", "material", "order_id"),
+        Index("ix_orderlineitem_width_height", "width_cm", "height_cm"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    order_id: int = Field(foreign_key="order.id", index=True)
+    position: int = Field(default=0) # Index into line_items_json, i.e. the item_index used for production
+    sku: Optional[str] = None
+    title: Optional[str] = None
+    quantity: int = Field(default=1)
+    variant: Optional[str] = None # Raw variant string, e.g. "100x100 cm"
+    width_cm: Optional[float] = None # Parsed from variant; None if it isn't a size
+    height_cm: Optional[float] = None
+    material: Optional[str] = None # wallpaper, canvas, poster
+    image_path: Optional[str] = None
+
 class ShipOrderRequest(SQLModel):
     tracking_number: str
 
+class Shipment(SQLModel):
+    order_id: int
+    tracking_number: str
+
+class BulkVerifyRequest(SQLModel):
+    order_ids: List[int]
+
+class BulkShipRequest(SQLModel):
+    shipments: List[Shipment]
+
+class BulkOrderResult(SQLModel):
+    order_id: Optional[int] = None # None if a CSV row had no valid order id
+    line: Optional[int] = None # CSV line number, for uploads
+    ok: bool
+    status: Optional[str] = None # Order status after the batch
+    tracking_number: Optional[str] = None
+    error: Optional[str] = None
+
+class BulkUpdateResult(SQLModel):
+    updated: int = 0
+    failed: int = 0
+    results: List[BulkOrderResult] = []
+
+class OrderSummary(SQLModel):
+    # What the order lists show. Only these columns are selected (see database.projection),
+    # so listing skips the address and line-items blob.
+    id: int
+    created_at: datetime
+    source: str
+    external_id: Optional[str] = None
+    store_id: Optional[int] = None
+    amount: float
+    currency: str
+    payment_status: str
+    status: str
+    tracking_number: Optional[str] = None
+    recipient_name: str
+    city: str
+    country: str
+
+class ImportedOrderSummary(OrderSummary):
+    line_items_json: str # The import screen lists the items still to configure
+
+class OrderPage(SQLModel):
+    items: List[OrderSummary]
+    next_cursor: Optional[str] = None # Opaque; pass back as ?cursor= to get the next page
+
+class ImportedOrderPage(SQLModel):
+    items: List[ImportedOrderSummary]
+    next_cursor: Optional[str] = None
+
+class OrderStat(SQLModel, table=True):
+    # Running totals per dashboard dimension, kept current by triggers on order
+    # (services/order_stats.py) so the dashboard never aggregates the order table
+    dimension: str = Field(primary_key=True) # status, store, source, day
+    key: str = Field(primary_key=True) # e.g. "shipped", store id ("" for none), "etsy", "2026-10-18"
+    currency: str = Field(primary_key=True)
+    orders: int = Field(default=0)
+    paid_orders: int = Field(default=0)
+    revenue: float = Field(default=0.0) # Sum of amount over paid orders
+
+class OrderStats(SQLModel):
+    by_status: List[OrderStat] = []
+    by_store: List[OrderStat] = []
+    by_source: List[OrderStat] = []
+    daily: List[OrderStat] = [] # Oldest first
+
 class SiteConfig(SQLModel, table=True):
     key: str = Field(primary_key=True)
     value: str
@@ -62,6 +187,11 @@ class SiteConfig(SQLModel, table=True):
     type: str = Field(default="text") # "text", "image", "json"
     label: str # User-friendly label for the admin UI
 
+class ConfigVersion(SQLModel, table=True):
+    # Bumped in the same transaction as any write to the cached table, so every worker can tell its copy is stale
+    name: str = Field(primary_key=True) # e.g., "site_config"
+    version: int = Field(default=0)
+
 class Payment(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     order_id: int = Field(foreign_key="order.id")
@@ -70,7 +200,108 @@ class Payment(SQLModel, table=True):
     method: str = Field(default="credit_card") # credit_card, paypal
     status: str = Field(default="pending") # pending, completed, failed
     transaction_id: Optional[str] = None
+    # Client-supplied key; a retried request with the same key gets this payment back
+    idempotency_key: Optional[str] = Field(default=None, unique=True)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class ProductionJob(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    order_id: int = Field(foreign_key="order.id", index=True)
+    item_index: int = Field(default=0)
+    status: str = Field(default="queued", index=True) # queued, running, succeeded, failed
+    attempts: int = Field(default=0)
+    max_attempts: int = Field(default=3)
+    error: Optional[str] = None
+    file_path: Optional[str] = None # Storage key of the rendered file
+    claim_token: Optional[str] = None # Queue process rendering the job
+    lease_expires_at: Optional[datetime] = None # Another process may take the job over after this
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class GangSheetJob(SQLModel, table=True):
+    """Nesting and rendering of many orders' items onto gang sheets; run by the production job queue."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    order_ids_json: str # Sorted order ids
+    params_json: str # Roll width, segment length, bleed and gap
+    status: str = Field(default="queued", index=True) # queued, running, succeeded, failed
+    attempts: int = Field(default=0)
+    max_attempts: int = Field(default=3)
+    error: Optional[str] = None
+    file_path: Optional[str] = None # Storage key of the placement manifest, which lists the segment files
+    claim_token: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class ArtworkPreflight(SQLModel, table=True):
+    """Size-independent color checks of one artwork file, computed once by services/preflight.py."""
+    key: str = Field(primary_key=True) # Artwork digest plus the analysis settings
+    artwork_digest: str = Field(index=True) # sha256 of the file
+    width_px: int
+    height_px: int
+    mode: str # Pillow mode of the file
+    source_profile: Optional[str] = None # Embedded ICC profile; None means sRGB is assumed
+    cmyk_profile: Optional[str] = None # Press profile used; None means naive GCR separation
+    ink_mean_percent: float # Total area coverage C+M+Y+K, 0-400
+    ink_max_percent: float
+    over_ink_limit_percent: float # Share of the area above PREFLIGHT_MAX_INK_PERCENT
+    out_of_gamut_percent: Optional[float] = None # Share of the area the press can't reproduce; needs a press profile
+    analysis_ms: float
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class ItemPreflight(SQLModel):
+    item_index: int
+    sku: str
+    print_width_cm: float # Including bleed
+    print_height_cm: float
+    effective_dpi: Optional[float] = None # Along the less-resolved axis
+    distortion_percent: Optional[float] = None # How far the artwork's aspect ratio is stretched to fill the print
+    artwork: Optional[ArtworkPreflight] = None
+    warnings: List[str] = []
+
+class OutboxMessage(SQLModel, table=True):
+    """Notification written in the same transaction as the change it announces; sent by the outbox dispatcher."""
+    __table_args__ = (
+        # The dispatcher's claim query: due messages, oldest first
+        Index("ix_outboxmessage_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    event_type: str # order_shipped, payment_completed, production_ready
+    dedup_key: str = Field(unique=True) # One message per event, however often it is emitted
+    recipient: str
+    subject: str
+    body: str
+    status: str = Field(default="pending") # pending, sending, sent, failed
+    attempts: int = Field(default=0)
+    next_attempt_at: datetime = Field(default_factory=datetime.utcnow) # Due time; lease expiry while sending
+    claim_token: Optional[str] = None # Dispatcher holding the lease
+    last_error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    sent_at: Optional[datetime] = None
+
+class WebhookDelivery(SQLModel, table=True):
+    """Verified marketplace webhook, stored as received; imported in batches by services/webhooks.py."""
+    __table_args__ = (
+        # Platforms redeliver until acknowledged: each delivery is queued once
+        UniqueConstraint("platform", "delivery_id", name="uq_webhookdelivery_platform_delivery_id"),
+        # The consumer's claim query: due deliveries, oldest first
+        Index("ix_webhookdelivery_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    platform: str # etsy, shopify
+    delivery_id: str # The platform's id for the event, repeated on redelivery
+    shop: str # Store.shop_name the event belongs to
+    topic: str # e.g. orders/create, order.paid
+    payload: str # Raw request body
+    status: str = Field(default="pending") # pending, processing, done, failed
+    attempts: int = Field(default=0)
+    next_attempt_at: datetime = Field(default_factory=datetime.utcnow) # Due time; lease expiry while processing
+    claim_token: Optional[str] = None
+    last_error: Optional[str] = None
+    received_at: datetime = Field(default_factory=datetime.utcnow)
+    processed_at: Optional[datetime] = None
 
 class Store(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -81,3 +312,12 @@ class Store(SQLModel, table=True):
     is_connected: bool = Field(default=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+    # Incremental sync: platform-specific high-water mark of the last imported order
+    sync_cursor: Optional[str] = None
+    last_synced_at: Optional[datetime] = None
+
+class SchemaMigration(SQLModel, table=True):
+    # Versions applied by migrations/migrate.py
+    version: int = Field(primary_key=True)
+    name: str
+    applied_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,227 @@
+import io
+import mmap
+import os
+import shutil
+import tempfile
+from typing import Iterator, Optional, Tuple
+from PIL import Image
+
+# Hard cap on decoded pixel memory held at once while embedding one artwork
+MAX_IMAGE_MEMORY_MB = int(os.getenv("PRODUCTION_MAX_IMAGE_MB", "512"))
+# Strips are re-encoded as JPEG so the PDF holds compressed data, not raw pixels
+STRIP_JPEG_QUALITY = int(os.getenv("PRODUCTION_JPEG_QUALITY", "92"))
+
+# Largest artwork accepted. Wallpaper-size files (300x250 cm at 150 DPI is about
+# 270 MP) are past Pillow's default decompression-bomb limit, so its guard is set
+# to this rather than the default; it also bounds the disk-backed decode below
+ARTWORK_MAX_PIXELS = int(os.getenv("ARTWORK_MAX_PIXELS", "300000000"))
+Image.MAX_IMAGE_PIXELS = ARTWORK_MAX_PIXELS
+
+class ArtworkTooLarge(ValueError):
+    pass
+
+def open_artwork(path: str) -> Image.Image:
+    """Opens an artwork file without decoding it. Raises ArtworkTooLarge past ARTWORK_MAX_PIXELS."""
+    limit = f"the limit is {ARTWORK_MAX_PIXELS / 1e6:.0f} MP (ARTWORK_MAX_PIXELS)"
+    try:
+        im = Image.open(path)
+    except Image.DecompressionBombError as e: # Past twice the limit: Pillow refuses on its own
+        raise ArtworkTooLarge(f"Artwork {os.path.basename(path)} is too large; {limit}") from e
+    if im.width * im.height > ARTWORK_MAX_PIXELS:
+        im.close()
+        raise ArtworkTooLarge(f"Artwork {os.path.basename(path)} is {im.width}x{im.height} "
+                              f"({im.width * im.height / 1e6:.0f} MP); {limit}")
+    return im
+
+def cm_to_px(size_cm: float, dpi: int) -> int:
+    return max(1, round(size_cm / 2.54 * dpi))
+
+def _pixel_bytes(mode: str) -> int:
+    """Bytes per pixel of Pillow's in-memory layout (RGB is stored padded to four)."""
+    return 1 if mode in ("1", "L", "P") else 2 if mode.startswith("I;16") else 4
+
+def _to_8bit(im: Image.Image) -> Image.Image:
+    """
+    High-bit-depth grayscale scaled down to L. convert() would clip it instead:
+    16-bit values above 255 all become white. Integer images are taken as
+    16-bit (what PNG and TIFF store), float ones as 0-1.
+    """
+    if im.mode.startswith("I;16"):
+        im = im.convert("I")
+    if im.mode == "I":
+        return im.point(lambda v: v / 257).convert("L")
+    if im.mode == "F":
+        return im.point(lambda v: v * 255).convert("L")
+    return im
+
+def _raw_layout(im: Image.Image):
+    """(rawmode, stride, orientation) when the file stores uncompressed rows we can seek into."""
+    if len(im.tile) != 1 or im.tile[0][0] != "raw":
+        return None
+    args = im.tile[0][3]
+    if isinstance(args, str):
+        args = (args, 0, 1)
+    rawmode, stride, orientation = (tuple(args) + (0, 1))[:3]
+    if orientation not in (1, -1):
+        return None
+    if not stride:
+        stride = im.size[0] * len(Image.new(im.mode, (1, 1)).tobytes("raw", rawmode))
+    return rawmode, stride, orientation
+
+def _load_raw_rows(path: str, y0: int, y1: int) -> Image.Image:
+    """Decodes only rows [y0, y1) of an uncompressed image by pointing its tile at them."""
+    im = Image.open(path)
+    rawmode, stride, orientation = _raw_layout(im)
+    width, height = im.size
+    tile = im.tile[0]
+    first_row = y0 if orientation == 1 else height - y1
+    im.tile = [tile._replace(
+        extents=(0, 0, width, y1 - y0),
+        offset=tile.offset + first_row * stride,
+        args=(rawmode, stride, orientation),
+    )]
+    im._size = (width, y1 - y0)
+    im.load()
+    return im
+
+# Modes the decoder can write straight into a memory-mapped file (Pillow's in-memory pixel layout)
+DISK_DECODE_MODES = ("L", "P", "LA", "I;16", "I;16L", "I;16B", "I", "F", "RGB", "RGBA", "RGBX", "CMYK", "YCbCr")
+
+class _FlushingReader:
+    """File wrapper that writes decoded pixels back to disk and drops them from memory before each read."""
+
+    def __init__(self, fp, flush):
+        self._fp = fp
+        self._flush = flush
+
+    def read(self, *args):
+        self._flush()
+        return self._fp.read(*args)
+
+    def __getattr__(self, name):
+        return getattr(self._fp, name)
+
+class _DiskDecodedImage:
+    """
+    Compressed artwork (JPEG, PNG, compressed TIFF) decoded into a memory-mapped
+    temporary file instead of memory. The decoder writes rows in file order;
+    between its reads of the compressed input the written pages are flushed and
+    dropped, and strips are later mapped back from the file one at a time, so
+    only the rows being worked on are resident.
+    """
+
+    def __init__(self, im: Image.Image):
+        self.mode = im.mode
+        self.width, self.height = im.size
+        self.stride = self.width * _pixel_bytes(im.mode)
+        free = shutil.disk_usage(tempfile.gettempdir()).free
+        if self.stride * self.height > free:
+            raise ArtworkTooLarge(f"Decoding {self.width}x{self.height} {im.mode} artwork needs "
+                                  f"{self.stride * self.height >> 20} MB of temporary disk, {free >> 20} MB free")
+        self._file = tempfile.TemporaryFile(prefix="artwork_")
+        self._file.truncate(self.stride * self.height)
+        self._map = mmap.mmap(self._file.fileno(), self.stride * self.height)
+        try:
+            im.im = self._core(0, self.height) # load() decodes into the image it finds, if mode and size match
+            im.fp = _FlushingReader(im.fp, self._release)
+            im.load()
+            self.palette = im.getpalette() if im.mode == "P" else None
+            self._release()
+        finally:
+            im.close() # Drops the mapped core, so the mapping can be closed later
+
+    def _core(self, y0: int, y1: int):
+        return Image.core.map_buffer(self._map, (self.width, y1 - y0), "raw", y0 * self.stride,
+                                     (self.mode, self.stride, 1))
+
+    def _release(self):
+        self._map.flush()
+        if hasattr(mmap, "MADV_DONTNEED"): # Shared file mapping: dropped pages are re-read from the file
+            self._map.madvise(mmap.MADV_DONTNEED)
+
+    def rows(self, y0: int, y1: int) -> Image.Image:
+        strip = Image.new(self.mode, (0, 0))._new(self._core(y0, y1))
+        if self.palette:
+            strip.putpalette(self.palette)
+        return strip
+
+    def release_rows(self):
+        self._release()
+
+    def close(self):
+        try:
+            self._map.close()
+        except BufferError:
+            pass # A strip is still referenced (iteration abandoned); the mapping goes with it
+        self._file.close()
+
+def iter_artwork_strips(
+    path: str,
+    target_w_px: int,
+    target_h_px: int,
+    max_memory_mb: int = MAX_IMAGE_MEMORY_MB,
+) -> Iterator[Tuple[float, float, io.BytesIO]]:
+    """
+    Yields the artwork as horizontal JPEG strips (top to bottom), each with the
+    fraction of the artwork height it starts and ends at.
+
+    The source is only resampled when it has more pixels than the target size.
+    Oversized JPEGs are decoded at reduced scale (DCT draft mode); uncompressed
+    rasters (TIFF, BMP, PPM) are read strip by strip from disk. Compressed
+    artwork is decoded in memory if it fits under max_memory_mb, otherwise into a
+    temporary file that strips are read from (see _DiskDecodedImage). Raises
+    ArtworkTooLarge past ARTWORK_MAX_PIXELS or when the decode doesn't fit.
+    """
+    budget = max_memory_mb * 1024 * 1024
+    im = open_artwork(path)
+    if im.format == "JPEG" and (im.width > target_w_px or im.height > target_h_px):
+        im.draft(im.mode, (target_w_px, target_h_px))
+
+    width, height = im.size
+    bytes_per_pixel = _pixel_bytes(im.mode)
+    out_w, out_h = min(width, target_w_px), min(height, target_h_px)
+    resample = (out_w, out_h) != (width, height)
+
+    streamable = _raw_layout(im) is not None
+    on_disk: Optional[_DiskDecodedImage] = None
+    if not streamable and width * height * bytes_per_pixel > budget:
+        if not im.tile or im.mode not in DISK_DECODE_MODES:
+            raise ArtworkTooLarge(
+                f"Artwork {os.path.basename(path)} ({width}x{height}, {im.format} {im.mode}) needs more than "
+                f"{max_memory_mb} MB to decode; supply JPEG, PNG or TIFF"
+            )
+        on_disk = _DiskDecodedImage(im)
+
+    # A source strip, its resampled copy and the encoder buffer coexist: keep each well under budget
+    rows_per_strip = max(1, budget // 4 // (width * bytes_per_pixel))
+
+    try:
+        for y0 in range(0, height, rows_per_strip):
+            y1 = min(height, y0 + rows_per_strip)
+            if streamable:
+                source = _load_raw_rows(path, y0, y1)
+            elif on_disk:
+                source = on_disk.rows(y0, y1)
+            else:
+                source = im.crop((0, y0, width, y1))
+            strip = _to_8bit(source)
+            if resample:
+                top, bottom = round(y0 * out_h / height), round(y1 * out_h / height)
+                if bottom == top:
+                    source.close()
+                    continue
+                strip = strip.resize((out_w, bottom - top), Image.LANCZOS)
+            if strip.mode not in ("RGB", "L", "CMYK"):
+                strip = strip.convert("RGB")
+
+            buf = io.BytesIO()
+            strip.save(buf, format="JPEG", quality=STRIP_JPEG_QUALITY)
+            strip.close()
+            source.close()
+            if on_disk:
+                on_disk.release_rows()
+            buf.seek(0)
+            yield y0 / height, y1 / height, buf
+    finally:
+        if on_disk:
+            on_disk.close()
@@ -0,0 +1,96 @@
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+from sqlalchemy import event
+from sqlmodel import Session, select, update
+from models import ConfigVersion, SiteConfig
+
+# How long a worker trusts its copy before re-reading the version row (one PK lookup)
+CHECK_INTERVAL_SECONDS = float(os.getenv("CONFIG_CACHE_CHECK_SECONDS", "2"))
+
+def current_version(session: Session, name: str) -> int:
+    row = session.get(ConfigVersion, name)
+    return row.version if row else 0
+
+def bump_version(session: Session, name: str, on_commit: Optional[Callable] = None):
+    """
+    Increments the named version in the caller's transaction; on_commit runs once it commits.
+    The row is created by the migrations, so concurrent first writers don't race to insert it.
+    """
+    result = session.exec(
+        update(ConfigVersion)
+        .where(ConfigVersion.name == name)
+        .values(version=ConfigVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        raise RuntimeError(f"No ConfigVersion row {name!r}; run python -m migrations.migrate")
+    if on_commit is not None:
+        event.listen(session, "after_commit", on_commit, once=True)
+
+class SiteConfigCache:
+    """
+    Read-through cache of the SiteConfig table, shared by all requests of a worker.
+
+    Writers call bump() inside their transaction. The writing worker sees the new
+    version on its next read; other workers notice within CHECK_INTERVAL_SECONDS,
+    when they re-read the version row. Between checks reads never hit the database.
+    """
+
+    NAME = "site_config"
+
+    def __init__(self, check_interval: float = CHECK_INTERVAL_SECONDS):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._version = -1
+        self._rows: Dict[str, SiteConfig] = {}
+        self._checked_at = 0.0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def _refresh(self, session: Session):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return
+            version = current_version(session, self.NAME)
+            if version != self._version:
+                # Detached copies, so callers can't mutate the cache through the session
+                rows = session.exec(select(SiteConfig)).all()
+                self._rows = {row.key: SiteConfig(**row.model_dump()) for row in rows}
+                self._version = version
+            self._checked_at = time.monotonic()
+
+    def all(self, session: Session) -> List[SiteConfig]:
+        self._refresh(session)
+        return list(self._rows.values())
+
+    def group(self, session: Session, group: str) -> Dict[str, str]:
+        self._refresh(session)
+        return {key: row.value for key, row in self._rows.items() if row.group == group}
+
+    def get(self, session: Session, key: str, default: Optional[str] = None) -> Optional[str]:
+        self._refresh(session)
+        row = self._rows.get(key)
+        return row.value if row else default
+
+    def get_bool(self, session: Session, key: str, default: bool = False) -> bool:
+        value = self.get(session, key)
+        return default if value is None else value.lower() == "true"
+
+    def etag(self, session: Session, scope: str) -> str:
+        self._refresh(session)
+        return f'W/"{scope}-{self._version}"'
+
+    def bump(self, session: Session):
+        """Marks SiteConfig as changed. Call before committing the write it belongs to."""
+        bump_version(session, self.NAME, on_commit=self.invalidate)
+
+    def invalidate(self, *args):
+        self._checked_at = 0.0
+
+site_config_cache = SiteConfigCache()
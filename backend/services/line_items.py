@@ -0,0 +1,79 @@
+import json
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlmodel import Session, select
+from models import OrderLineItem
+
+DEFAULT_SIZE_CM = (100.0, 100.0)
+
+# SKU prefix -> material, for items that don't say
+SKU_MATERIALS = {
+    "WL": "wallpaper",
+    "CNV": "canvas",
+    "PST": "poster",
+}
+
+def parse_dimensions(variant: Optional[str]) -> Optional[Tuple[float, float]]:
+    """Parses a variant string like "100x100 cm" into (width, height) in cm, None if it isn't a size."""
+    if variant:
+        try:
+            parts = variant.lower().replace('cm', '').split('x')
+            if len(parts) == 2:
+                return float(parts[0].strip()), float(parts[1].strip())
+        except ValueError:
+            pass
+    return None
+
+def parse_variant_dimensions(variant: Optional[str]) -> Tuple[float, float]:
+    """Like parse_dimensions, falling back to DEFAULT_SIZE_CM."""
+    return parse_dimensions(variant) or DEFAULT_SIZE_CM
+
+def item_size_cm(item: OrderLineItem) -> Tuple[float, float]:
+    """The item's stored print size, DEFAULT_SIZE_CM if its variant isn't a size."""
+    if item.width_cm is None or item.height_cm is None:
+        return DEFAULT_SIZE_CM
+    return item.width_cm, item.height_cm
+
+def unsized_items(items: Iterable[OrderLineItem]) -> Optional[str]:
+    """What's wrong if any item has no print size (its variant isn't a size), else None."""
+    unsized = [f"order {item.order_id} item {item.position} ({item.variant or 'no variant'})"
+               for item in items if item.width_cm is None or item.height_cm is None]
+    if not unsized:
+        return None
+    return "No print size for " + ", ".join(unsized)
+
+def material_for(item: dict) -> Optional[str]:
+    if item.get('material'):
+        return item['material']
+    sku = item.get('sku') or ''
+    return SKU_MATERIALS.get(sku.split('-')[0].upper())
+
+def build_line_items(order_id: Optional[int], line_items_json: str) -> List[OrderLineItem]:
+    """OrderLineItem rows for an order's line_items_json."""
+    rows = []
+    for position, item in enumerate(json.loads(line_items_json or "[]")):
+        dimensions = parse_dimensions(item.get('variant')) or (None, None)
+        rows.append(OrderLineItem(
+            order_id=order_id,
+            position=position,
+            sku=item.get('sku'),
+            title=item.get('title'),
+            quantity=int(item.get('quantity', 1) or 1),
+            variant=item.get('variant'),
+            width_cm=dimensions[0],
+            height_cm=dimensions[1],
+            material=material_for(item),
+            image_path=item.get('image_path'),
+        ))
+    return rows
+
+def line_items_by_order(session: Session, order_ids: Iterable[int]) -> Dict[int, List[OrderLineItem]]:
+    """The orders' line item rows in position order, keyed by order id."""
+    items = defaultdict(list)
+    rows = session.exec(
+        select(OrderLineItem).where(OrderLineItem.order_id.in_(list(order_ids)))
+        .order_by(OrderLineItem.order_id, OrderLineItem.position)
+    )
+    for item in rows:
+        items[item.order_id].append(item)
+    return items
@@ -0,0 +1,111 @@
+import json
+import os
+from typing import Dict, List, Optional, Type
+import httpx
+from sqlmodel import SQLModel
+from models import Store
+
+# Point at the real APIs in production; the defaults are the local mock marketplace (mock_marketplace.py)
+ETSY_API_URL = os.getenv("ETSY_API_URL", "http://localhost:8001/etsy")
+SHOPIFY_API_URL = os.getenv("SHOPIFY_API_URL", "http://localhost:8001/shopify")
+
+PAGE_SIZE = int(os.getenv("SYNC_PAGE_SIZE", "100"))
+
+class OrderPageResult(SQLModel):
+    orders: List[dict] # Standardized dicts for OrderService.import_external_orders
+    cursor: Optional[str] # High-water mark after this page; unchanged when the page is empty
+    has_more: bool
+
+class MarketplaceClient:
+    """
+    Fetches a store's orders newer than a cursor, oldest first, and converts
+    them to our standardized format. Subclasses set `platform` and implement
+    fetch_page; register them in CLIENTS.
+    """
+
+    platform: str = ""
+
+    def __init__(self, http: httpx.AsyncClient):
+        self.http = http
+
+    async def fetch_page(self, store: Store, cursor: Optional[str]) -> OrderPageResult:
+        raise NotImplementedError
+
+    @staticmethod
+    def to_order(order: dict) -> dict:
+        """One platform order, as the API (or a webhook) returns it, in the standardized format."""
+        raise NotImplementedError
+
+class EtsyClient(MarketplaceClient):
+    platform = "etsy"
+
+    async def fetch_page(self, store: Store, cursor: Optional[str]) -> OrderPageResult:
+        response = await self.http.get(
+            f"{ETSY_API_URL}/v3/application/shops/{store.shop_name}/receipts",
+            params={"min_receipt_id": int(cursor or 0) + 1, "limit": PAGE_SIZE, "sort_order": "asc"},
+            headers={"Authorization": f"Bearer {store.access_token}"},
+        )
+        response.raise_for_status()
+        receipts = response.json()["results"]
+        return OrderPageResult(
+            orders=[self.to_order(receipt) for receipt in receipts],
+            cursor=str(receipts[-1]["receipt_id"]) if receipts else cursor,
+            has_more=len(receipts) == PAGE_SIZE,
+        )
+
+    @staticmethod
+    def to_order(receipt: dict) -> dict:
+        return {
+            "external_id": f"ETSY-{receipt['receipt_id']}",
+            "recipient_name": receipt["name"],
+            "recipient_email": receipt.get("buyer_email"),
+            "street": receipt["first_line"],
+            "city": receipt["city"],
+            "state": receipt.get("state"),
+            "zip_code": receipt["zip"],
+            "country": receipt["country_name"],
+            "line_items_json": json.dumps([
+                {"sku": t["sku"], "title": t["title"], "quantity": t["quantity"], "variant": t.get("variation")}
+                for t in receipt["transactions"]
+            ]),
+        }
+
+class ShopifyClient(MarketplaceClient):
+    platform = "shopify"
+
+    async def fetch_page(self, store: Store, cursor: Optional[str]) -> OrderPageResult:
+        response = await self.http.get(
+            f"{SHOPIFY_API_URL}/admin/api/2024-01/orders.json",
+            params={"since_id": cursor or 0, "limit": PAGE_SIZE, "status": "any"},
+            headers={"X-Shopify-Access-Token": store.access_token, "X-Shopify-Shop-Domain": store.shop_name},
+        )
+        response.raise_for_status()
+        orders = response.json()["orders"]
+        return OrderPageResult(
+            orders=[self.to_order(order) for order in orders],
+            cursor=str(orders[-1]["id"]) if orders else cursor,
+            has_more=len(orders) == PAGE_SIZE,
+        )
+
+    @staticmethod
+    def to_order(order: dict) -> dict:
+        address = order["shipping_address"]
+        return {
+            "external_id": f"SHPFY-{order['id']}",
+            "recipient_name": address["name"],
+            "recipient_email": order.get("email"),
+            "street": address["address1"],
+            "city": address["city"],
+            "state": address.get("province_code"),
+            "zip_code": address["zip"],
+            "country": address["country"],
+            "line_items_json": json.dumps([
+                {"sku": li["sku"], "title": li["title"], "quantity": li["quantity"], "variant": li.get("variant_title")}
+                for li in order["line_items"]
+            ]),
+        }
+
+CLIENTS: Dict[str, Type[MarketplaceClient]] = {
+    EtsyClient.platform: EtsyClient,
+    ShopifyClient.platform: ShopifyClient,
+}
@@ -0,0 +1,201 @@
+import bisect
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("METRICS_SLOW_QUERY_MS", "200"))
+# The same SELECT this many times in one request is reported as an N+1 pattern
+N_PLUS_ONE_THRESHOLD = int(os.getenv("METRICS_N_PLUS_ONE_THRESHOLD", "10"))
+# Adds X-Query-Count and Server-Timing to every response
+RESPONSE_HEADERS = os.getenv("METRICS_RESPONSE_HEADERS", "false").strip().lower() in ("1", "true", "yes", "on")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+class RequestStats:
+    """SQL activity of the request being handled; shared with its worker threads via a context var."""
+
+    __slots__ = ("queries", "db_seconds", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements: Counter = Counter()
+
+_request_stats: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("request_stats", default=None)
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+class Metrics:
+    """
+    In-process request and SQL metrics rendered in the Prometheus text format.
+    Each worker process keeps its own numbers; scrape every worker, or run one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: Counter = Counter() # (method, route, status)
+        self.latency: Dict[tuple, Histogram] = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.request_queries: Counter = Counter() # (method, route)
+        self.request_db_seconds: Dict[tuple, float] = defaultdict(float)
+        self.n_plus_one: Counter = Counter()
+        self.in_flight = 0
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.slow_queries = 0
+
+    def request_started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def request_finished(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        key = (method, route)
+        repeated = [(sql, n) for sql, n in stats.statements.items() if n >= N_PLUS_ONE_THRESHOLD]
+        with self._lock:
+            self.in_flight -= 1
+            self.requests[(method, route, status)] += 1
+            self.latency[key].observe(seconds)
+            self.request_queries[key] += stats.queries
+            self.request_db_seconds[key] += stats.db_seconds
+            if repeated:
+                self.n_plus_one[key] += 1
+        for sql, n in repeated:
+            logger.warning("Possible N+1 in %s %s: statement ran %d times: %s", method, route, n, sql)
+
+    def query_finished(self, statement: str, seconds: float):
+        slow = seconds * 1000 >= SLOW_QUERY_MS
+        with self._lock:
+            self.queries.observe(seconds)
+            if slow:
+                self.slow_queries += 1
+        if slow:
+            logger.warning("Slow query (%.0f ms): %s", seconds * 1000, statement)
+
+    def render(self) -> str:
+        lines: List[str] = []
+
+        def header(name: str, kind: str, help_text: str):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histogram(name: str, labels: str, hist: Histogram):
+            cumulative = 0
+            sep = "," if labels else ""
+            for bound, count in zip(hist.buckets, hist.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+            cumulative += hist.counts[-1]
+            lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {cumulative}')
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{name}_sum{suffix} {hist.sum}")
+            lines.append(f"{name}_count{suffix} {cumulative}")
+
+        with self._lock:
+            header("http_requests_total", "counter", "Requests by route and status code.")
+            for (method, route, status), n in sorted(self.requests.items()):
+                lines.append(f'http_requests_total{{method="{method}",route="{route}",status="{status}"}} {n}')
+
+            header("http_request_duration_seconds", "histogram", "Request latency by route.")
+            for (method, route), hist in sorted(self.latency.items()):
+                histogram("http_request_duration_seconds", f'method="{method}",route="{route}"', hist)
+
+            header("http_requests_in_flight", "gauge", "Requests being handled right now.")
+            lines.append(f"http_requests_in_flight {self.in_flight}")
+
+            header("http_request_db_queries_total", "counter", "SQL statements issued while handling requests, by route.")
+            for (method, route), n in sorted(self.request_queries.items()):
+                lines.append(f'http_request_db_queries_total{{method="{method}",route="{route}"}} {n}')
+
+            header("http_request_db_seconds_total", "counter", "Time spent in SQL while handling requests, by route.")
+            for (method, route), seconds in sorted(self.request_db_seconds.items()):
+                lines.append(f'http_request_db_seconds_total{{method="{method}",route="{route}"}} {seconds}')
+
+            header("http_request_n_plus_one_total", "counter", "Requests that repeated one SELECT at least the N+1 threshold.")
+            for (method, route), n in sorted(self.n_plus_one.items()):
+                lines.append(f'http_request_n_plus_one_total{{method="{method}",route="{route}"}} {n}')
+
+            header("db_query_duration_seconds", "histogram", "Duration of every SQL statement, including background work.")
+            histogram("db_query_duration_seconds", "", self.queries)
+
+            header("db_slow_queries_total", "counter", f"Statements slower than {SLOW_QUERY_MS:g} ms.")
+            lines.append(f"db_slow_queries_total {self.slow_queries}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info["query_start"].pop()
+    metrics.query_finished(statement, seconds)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += seconds
+        # Only reads: a batch INSERT legitimately repeats its statement per row
+        if statement.lstrip()[:6].upper() == "SELECT":
+            stats.statements[statement] += 1
+
+def install_sql_hooks(engine: Engine):
+    """Times every statement on the engine and attributes it to the current request."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency, status and SQL counts per route template
+    (e.g. /admin/orders/{order_id}), so label cardinality stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        status = 500
+        metrics.request_started()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if RESPONSE_HEADERS:
+                    app_ms = (time.perf_counter() - started) * 1000
+                    db_ms = stats.db_seconds * 1000
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [
+                        (b"x-query-count", str(stats.queries).encode()),
+                        (b"server-timing", f"db;dur={db_ms:.1f}, app;dur={app_ms:.1f}".encode()),
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            metrics.request_finished(
+                scope["method"], getattr(route, "path", "unmatched"), status, time.perf_counter() - started, stats
+            )
+            _request_stats.reset(token)
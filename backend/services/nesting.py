@@ -0,0 +1,125 @@
+from typing import List, Optional
+from sqlmodel import SQLModel
+
+class NestingPiece(SQLModel):
+    """One printable copy of a line item, trim size without bleed."""
+    order_id: int
+    item_index: int
+    copy_index: int = 0
+    sku: str = "UNKNOWN"
+    width_cm: float
+    height_cm: float
+    image_path: Optional[str] = None
+
+class Placement(SQLModel):
+    order_id: int
+    item_index: int
+    copy_index: int
+    sku: str
+    segment: int
+    # Position of the trim box (bleed excluded), from the segment's bottom-left corner
+    x_cm: float
+    y_cm: float
+    width_cm: float
+    height_cm: float
+    rotated: bool = False
+    image_path: Optional[str] = None
+
+class NestingLayout(SQLModel):
+    roll_width_cm: float
+    bleed_cm: float
+    gap_cm: float
+    segment_lengths_cm: List[float] = []
+    placements: List[Placement] = []
+    unplaced: List[NestingPiece] = []
+    utilization: float = 0.0 # printed trim area / consumed media area
+
+def nest_on_roll(
+    pieces: List[NestingPiece],
+    roll_width_cm: float,
+    bleed_cm: float = 2.0,
+    gap_cm: float = 0.5,
+    max_segment_length_cm: Optional[float] = None,
+) -> NestingLayout:
+    """
+    Packs pieces onto a roll of fixed width with first-fit decreasing-height shelves.
+    Each piece occupies its trim size plus bleed on every side plus a gap to its
+    neighbours. Pieces are turned to lie flat (long side across the roll) when they
+    fit that way, which keeps shelves short. When max_segment_length_cm is set the
+    roll is cut into segments of at most that length, one gang sheet each.
+    Runs in O(n log n + n * shelves), a few thousand pieces take milliseconds.
+    """
+    layout = NestingLayout(roll_width_cm=roll_width_cm, bleed_cm=bleed_cm, gap_cm=gap_cm)
+    pad = 2 * bleed_cm + gap_cm
+    # The last piece in a row/segment does not need a trailing gap
+    usable_width = roll_width_cm + gap_cm
+    usable_length = (max_segment_length_cm + gap_cm) if max_segment_length_cm else float("inf")
+
+    oriented = []
+    for piece in pieces:
+        w, h = piece.width_cm + pad, piece.height_cm + pad
+        rotated = False
+        if h > w and h <= usable_width:
+            w, h, rotated = h, w, True
+        if w > usable_width:
+            if h <= usable_width:
+                w, h, rotated = h, w, not rotated
+            else:
+                layout.unplaced.append(piece)
+                continue
+        if h > usable_length:
+            layout.unplaced.append(piece)
+            continue
+        oriented.append((h, w, rotated, piece))
+
+    oriented.sort(key=lambda entry: (entry[0], entry[1]), reverse=True)
+
+    # Shelves of the open segment: [y, height, used_width]
+    shelves = []
+    segment = 0
+    segment_used = 0.0
+    placed_area = 0.0
+    placements = []
+
+    for h, w, rotated, piece in oriented:
+        shelf = None
+        for candidate in shelves:
+            if candidate[1] >= h and usable_width - candidate[2] >= w:
+                shelf = candidate
+                break
+
+        if shelf is None:
+            if segment_used + h > usable_length:
+                layout.segment_lengths_cm.append(max(segment_used - gap_cm, 0.0))
+                segment += 1
+                segment_used = 0.0
+                shelves = []
+            shelf = [segment_used, h, 0.0]
+            shelves.append(shelf)
+            segment_used += h
+
+        x, y = shelf[2], shelf[0]
+        shelf[2] += w
+        trim_w, trim_h = (piece.height_cm, piece.width_cm) if rotated else (piece.width_cm, piece.height_cm)
+        placements.append(Placement(
+            order_id=piece.order_id,
+            item_index=piece.item_index,
+            copy_index=piece.copy_index,
+            sku=piece.sku,
+            segment=segment,
+            x_cm=round(x + bleed_cm, 3),
+            y_cm=round(y + bleed_cm, 3),
+            width_cm=trim_w,
+            height_cm=trim_h,
+            rotated=rotated,
+            image_path=piece.image_path,
+        ))
+        placed_area += piece.width_cm * piece.height_cm
+
+    if placements:
+        layout.segment_lengths_cm.append(max(segment_used - gap_cm, 0.0))
+
+    layout.placements = placements
+    media_area = roll_width_cm * sum(layout.segment_lengths_cm)
+    layout.utilization = round(placed_area / media_area, 4) if media_area else 0.0
+    return layout
@@ -0,0 +1,187 @@
+import re
+from typing import List, Optional, Tuple, Type
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, SQLModel, select
+from database import as_dicts, projection
+from models import Order, OrderSummary
+
+MAX_TERMS = 8
+
+# One search document per order: recipient fields, external id and the SKUs and
+# titles of its line items. Triggers keep it current, so writers don't need to
+# know about it. Both backends split on non-alphanumerics (ETSY-123456 -> etsy,
+# 123456; john.doe@example.com -> john, doe, example, com) and every query term
+# is a prefix.
+
+SQLITE_ROW = """
+    SELECT o.id, o.recipient_name, o.recipient_email, o.external_id, o.city, o.zip_code,
+           (SELECT group_concat(sku, ' ') FROM orderlineitem WHERE order_id = o.id),
+           (SELECT group_concat(title, ' ') FROM orderlineitem WHERE order_id = o.id)
+    FROM "order" o
+"""
+SQLITE_REFRESH = f"""
+        DELETE FROM order_search WHERE rowid = {{ref}};
+        INSERT INTO order_search (rowid, recipient_name, recipient_email, external_id, city, zip_code, skus, titles)
+        {SQLITE_ROW} WHERE o.id = {{ref}};
+"""
+SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE order_search USING fts5(
+        recipient_name, recipient_email, external_id, city, zip_code, skus, titles,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS order_search_order_insert AFTER INSERT ON "order" BEGIN
+        INSERT INTO order_search (rowid, recipient_name, recipient_email, external_id, city, zip_code, skus, titles)
+        VALUES (NEW.id, NEW.recipient_name, NEW.recipient_email, NEW.external_id, NEW.city, NEW.zip_code, NULL, NULL);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS order_search_order_update
+    AFTER UPDATE OF recipient_name, recipient_email, external_id, city, zip_code ON "order" BEGIN
+        {SQLITE_REFRESH.format(ref="NEW.id")}
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS order_search_order_delete AFTER DELETE ON "order" BEGIN
+        DELETE FROM order_search WHERE rowid = OLD.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS order_search_item_insert AFTER INSERT ON orderlineitem BEGIN
+        {SQLITE_REFRESH.format(ref="NEW.order_id")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS order_search_item_update AFTER UPDATE OF sku, title, order_id ON orderlineitem BEGIN
+        {SQLITE_REFRESH.format(ref="OLD.order_id")}
+        {SQLITE_REFRESH.format(ref="NEW.order_id")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS order_search_item_delete AFTER DELETE ON orderlineitem BEGIN
+        {SQLITE_REFRESH.format(ref="OLD.order_id")}
+    END
+    """,
+]
+SQLITE_BACKFILL = f"""
+    INSERT INTO order_search (rowid, recipient_name, recipient_email, external_id, city, zip_code, skus, titles)
+    {SQLITE_ROW}
+"""
+
+POSTGRES_DOCUMENT = """
+    to_tsvector('simple', regexp_replace(
+        concat_ws(' ', o.recipient_name, o.recipient_email, o.external_id, o.city, o.zip_code,
+                  (SELECT string_agg(concat_ws(' ', sku, title), ' ') FROM orderlineitem WHERE order_id = o.id)),
+        '[^[:alnum:]]+', ' ', 'g'))
+"""
+POSTGRES_DDL = [
+    """
+    CREATE TABLE order_search (
+        order_id INTEGER PRIMARY KEY REFERENCES "order" (id) ON DELETE CASCADE,
+        document TSVECTOR NOT NULL
+    )
+    """,
+    "CREATE INDEX ix_order_search_document ON order_search USING GIN (document)",
+    f"""
+    CREATE OR REPLACE FUNCTION order_search_refresh(target INTEGER) RETURNS void AS $$
+    BEGIN
+        INSERT INTO order_search (order_id, document)
+        SELECT o.id, {POSTGRES_DOCUMENT} FROM "order" o WHERE o.id = target
+        ON CONFLICT (order_id) DO UPDATE SET document = EXCLUDED.document;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION order_search_order_changed() RETURNS trigger AS $$
+    BEGIN
+        PERFORM order_search_refresh(NEW.id);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION order_search_item_changed() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP <> 'INSERT' THEN
+            PERFORM order_search_refresh(OLD.order_id);
+        END IF;
+        IF TG_OP <> 'DELETE' THEN
+            PERFORM order_search_refresh(NEW.order_id);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER order_search_order AFTER INSERT OR UPDATE OF recipient_name, recipient_email, external_id, city, zip_code
+    ON "order" FOR EACH ROW EXECUTE FUNCTION order_search_order_changed()
+    """,
+    """
+    CREATE TRIGGER order_search_item AFTER INSERT OR UPDATE OF sku, title, order_id OR DELETE
+    ON orderlineitem FOR EACH ROW EXECUTE FUNCTION order_search_item_changed()
+    """,
+]
+POSTGRES_BACKFILL = f'INSERT INTO order_search (order_id, document) SELECT o.id, {POSTGRES_DOCUMENT} FROM "order" o'
+
+def install_search_index(engine: Engine) -> bool:
+    """
+    Creates the search index and its triggers if missing, filling it from the
+    existing orders. Safe to run on every start. Returns True if it was built.
+    """
+    backend = engine.dialect.name
+    with engine.begin() as conn:
+        if backend == "sqlite":
+            exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'order_search'")).first()
+            ddl, backfill = SQLITE_DDL, SQLITE_BACKFILL
+        elif backend == "postgresql":
+            exists = conn.execute(text("SELECT to_regclass('order_search')")).scalar()
+            ddl, backfill = POSTGRES_DDL, POSTGRES_BACKFILL
+        else:
+            return False
+        if exists:
+            return False
+        for statement in ddl:
+            conn.exec_driver_sql(statement)
+        conn.exec_driver_sql(backfill)
+    return True
+
+def search_terms(q: str) -> List[str]:
+    return re.findall(r"[^\W_]+", q.lower())[:MAX_TERMS]
+
+def search_orders(
+    session: Session, q: str, limit: int = 50, before_id: Optional[int] = None, schema: Type[SQLModel] = OrderSummary,
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Orders matching every term of q as a prefix, newest first, as dicts of the
+    columns of schema. Returns the page and the cursor (an order id) for the next one.
+    """
+    terms = search_terms(q)
+    if not terms:
+        raise ValueError("Search query has no searchable terms")
+
+    backend = session.get_bind().dialect.name
+    params = {"limit": limit + 1, "before_id": before_id}
+    before = " AND {column} < :before_id" if before_id is not None else ""
+    if backend == "sqlite":
+        params["q"] = " ".join(f'"{term}"*' for term in terms)
+        query = ("SELECT rowid FROM order_search WHERE order_search MATCH :q"
+                 + before.format(column="rowid") + " ORDER BY rowid DESC LIMIT :limit")
+    elif backend == "postgresql":
+        params["q"] = " & ".join(f"{term}:*" for term in terms)
+        query = ("SELECT order_id FROM order_search WHERE document @@ to_tsquery('simple', :q)"
+                 + before.format(column="order_id") + " ORDER BY order_id DESC LIMIT :limit")
+    else:
+        raise ValueError(f"Search is not supported on {backend}")
+
+    ids = list(session.connection().execute(text(query), params).scalars())
+    next_cursor = None
+    if len(ids) > limit:
+        ids = ids[:limit]
+        next_cursor = str(ids[-1])
+    rows = as_dicts(session.exec(select(*projection(Order, schema)).where(Order.id.in_(ids)))) if ids else []
+    orders = {row["id"]: row for row in rows}
+    return [orders[order_id] for order_id in ids if order_id in orders], next_cursor
@@ -1,8 +1,66 @@
-from sqlmodel import Session, select
-from models import Order, Store
-import json
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Type
+from sqlalchemy import case
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, SQLModel, select, update, and_, or_
+from database import as_dicts, projection
+from models import BulkOrderResult, BulkUpdateResult, Order, OrderLineItem, OrderSummary, Shipment, Store
+from services.line_items import build_line_items
+from services.outbox import emit, shipped_message
+from services.pricing import PriceTable, pricing_engine
+import base64
+import csv
+import io
 from datetime import datetime
 
+IN_CLAUSE_CHUNK = 500
+MAX_BULK_ORDERS = 10000
+
+# Statuses a bulk transition refuses to move an order out of
+VERIFY_BLOCKED_STATUSES = ("shipped", "cancelled")
+SHIP_BLOCKED_STATUSES = ("cancelled",)
+
+# (CSV line or None, order id, tracking number or None)
+BulkRow = Tuple[Optional[int], int, Optional[str]]
+
+def encode_cursor(created_at: datetime, order_id: int) -> str:
+    """Opaque keyset cursor pointing just past the given order."""
+    raw = f"{created_at.isoformat()}|{order_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor. Raises ValueError on malformed input."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, order_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(created_at), int(order_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def parse_tracking_csv(text: str) -> Tuple[List[BulkRow], List[BulkOrderResult]]:
+    """
+    Parses `order_id,tracking_number` lines; a header line is optional.
+    Returns the usable rows and a failed result for every malformed line.
+    """
+    rows, errors = [], []
+    for line, cells in enumerate(csv.reader(io.StringIO(text)), start=1):
+        cells = [cell.strip() for cell in cells]
+        if not any(cells):
+            continue
+        if line == 1 and cells[0].lower() == "order_id":
+            continue
+        if len(cells) < 2 or not cells[1]:
+            errors.append(BulkOrderResult(line=line, ok=False, error="Expected order_id,tracking_number"))
+            continue
+        try:
+            rows.append((line, int(cells[0]), cells[1]))
+        except ValueError:
+            errors.append(BulkOrderResult(line=line, ok=False, error=f"Invalid order id {cells[0]!r}"))
+    return rows, errors
+
+class ImportResult(SQLModel):
+    created: int = 0
+    skipped: int = 0
+
 class OrderService:
     def __init__(self, session: Session):
         self.session = session
@@ -13,28 +71,155 @@ class OrderService:
         """
         order = Order(**order_data)
         self.session.add(order)
+        self.session.flush() # Assigns order.id for the line items
+        self.session.add_all(build_line_items(order.id, order.line_items_json))
         self.session.commit()
         self.session.refresh(order)
         return order
 
-    def import_external_order(self, store: Store, external_data: dict) -> Order:
+    def bulk_verify(self, order_ids: Sequence[int]) -> BulkUpdateResult:
+        """Marks the orders paid in one transaction; see _bulk_transition."""
+        return self._bulk_transition([(None, order_id, None) for order_id in order_ids], "paid", VERIFY_BLOCKED_STATUSES)
+
+    def bulk_ship(self, shipments: Sequence[Shipment]) -> BulkUpdateResult:
+        """Ships the orders with their tracking numbers in one transaction; see _bulk_transition."""
+        return self.bulk_ship_rows([(None, s.order_id, s.tracking_number) for s in shipments])
+
+    def bulk_ship_rows(self, rows: Sequence[BulkRow]) -> BulkUpdateResult:
+        return self._bulk_transition(rows, "shipped", SHIP_BLOCKED_STATUSES, before_commit=self._emit_shipped)
+
+    def _emit_shipped(self, shipped: Dict[int, Optional[str]]):
+        ids = list(shipped)
+        messages = []
+        for start in range(0, len(ids), IN_CLAUSE_CHUNK):
+            for order_id, recipient in self.session.exec(
+                select(Order.id, Order.recipient_email).where(Order.id.in_(ids[start:start + IN_CLAUSE_CHUNK]))
+            ).all():
+                messages.append(shipped_message(order_id, recipient, shipped[order_id]))
+        emit(self.session, messages)
+
+    def _bulk_transition(
+        self,
+        rows: Sequence[BulkRow],
+        target: str,
+        blocked: Tuple[str, ...],
+        before_commit: Optional[Callable[[Dict[int, Optional[str]]], None]] = None,
+    ) -> BulkUpdateResult:
         """
-        Converts external platform data (via our standardized format) into an Order.
+        Moves many orders to `target` with chunked set-based UPDATEs and a single commit.
+        Unknown, duplicate or blocked orders are reported per row and skipped;
+        they don't abort the rest of the batch. before_commit gets the changed
+        orders (id -> tracking number) to add work to the same transaction.
         """
-        # check for existing
-        existing = self.session.exec(
-            select(Order).where(Order.external_id == external_data['external_id'])
-        ).first()
-        
-        if existing:
-            return existing
+        if len(rows) > MAX_BULK_ORDERS:
+            raise ValueError(f"At most {MAX_BULK_ORDERS} orders per batch")
+
+        # Lock the rows (PostgreSQL) so statuses can't change between check and update
+        order_ids = list({order_id for _, order_id, _ in rows})
+        statuses: Dict[int, str] = {}
+        for start in range(0, len(order_ids), IN_CLAUSE_CHUNK):
+            statuses.update(self.session.exec(
+                select(Order.id, Order.status)
+                .where(Order.id.in_(order_ids[start:start + IN_CLAUSE_CHUNK]))
+                .with_for_update()
+            ).all())
+
+        results, accepted = [], {}
+        for line, order_id, tracking_number in rows:
+            status = statuses.get(order_id)
+            error = None
+            if order_id in accepted:
+                error = "Duplicate order id in batch"
+            elif status is None:
+                error = "Order not found"
+            elif status in blocked:
+                error = f"Order is {status}"
+            else:
+                accepted[order_id] = tracking_number
+            results.append(BulkOrderResult(
+                order_id=order_id, line=line, ok=error is None, status=status,
+                tracking_number=tracking_number, error=error,
+            ))
+
+        ids = list(accepted)
+        changed = set()
+        for start in range(0, len(ids), IN_CLAUSE_CHUNK):
+            chunk = ids[start:start + IN_CLAUSE_CHUNK]
+            values = {"status": target, "version": Order.version + 1}
+            if any(accepted[order_id] is not None for order_id in chunk):
+                values["tracking_number"] = case(
+                    {order_id: accepted[order_id] for order_id in chunk}, value=Order.id, else_=Order.tracking_number
+                )
+            # The status guard repeats the check for databases without row locks (SQLite)
+            outcome = self.session.exec(
+                update(Order).where(Order.id.in_(chunk), Order.status.not_in(blocked)).values(**values)
+            )
+            if outcome.rowcount == len(chunk):
+                changed.update(chunk)
+            else:
+                changed.update(self.session.exec(
+                    select(Order.id).where(Order.id.in_(chunk), Order.status == target)
+                ).all())
+        if before_commit is not None and changed:
+            before_commit({order_id: accepted[order_id] for order_id in changed})
+        self.session.commit()
+
+        for row in results:
+            if row.order_id in changed:
+                row.status = target
+            elif row.ok:
+                row.ok, row.error = False, "Order changed concurrently"
+        updated = sum(1 for row in results if row.ok)
+        return BulkUpdateResult(updated=updated, failed=len(results) - updated, results=results)
 
-        order = Order(
+    def list_orders(
+        self,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        status: Optional[str] = None,
+        store_id: Optional[int] = None,
+        source: Optional[str] = None,
+        schema: Type[SQLModel] = OrderSummary,
+    ) -> Tuple[List[dict], Optional[str]]:
+        """
+        Keyset-paginated order listing, newest first, ordered by (created_at, id).
+        Selects only the columns of schema and returns them as plain dicts, ready
+        to encode, with the cursor for the next page (None on the last page).
+        """
+        query = select(*projection(Order, schema))
+        if status is not None:
+            query = query.where(Order.status == status)
+        if store_id is not None:
+            query = query.where(Order.store_id == store_id)
+        if source is not None:
+            query = query.where(Order.source == source)
+
+        if cursor:
+            created_at, order_id = decode_cursor(cursor)
+            query = query.where(or_(
+                Order.created_at < created_at,
+                and_(Order.created_at == created_at, Order.id < order_id),
+            ))
+
+        # Fetch one extra row to know whether another page exists
+        query = query.order_by(Order.created_at.desc(), Order.id.desc()).limit(limit + 1)
+        rows = as_dicts(self.session.exec(query))
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+        return rows, next_cursor
+
+    def _build_external_order(self, store: Store, external_data: dict, prices: PriceTable) -> Tuple[Order, List[OrderLineItem]]:
+        """The order and its line items; set the items' order_id once the order has an id."""
+        line_items = build_line_items(None, external_data['line_items_json'])
+        return Order(
             user_id=store.user_id,
             store_id=store.id,
             source=store.platform,
             external_id=external_data['external_id'],
-            amount=0, # Calculated later or imported
+            amount=prices.order_amount(line_items), # Store owner's prices
             status="draft", # Needs configuration usually
             line_items_json=external_data['line_items_json'],
             recipient_name=external_data['recipient_name'],
@@ -44,8 +229,77 @@ class OrderService:
             state=external_data.get('state'),
             zip_code=external_data['zip_code'],
             country=external_data['country']
-        )
+        ), line_items
+
+    def _existing_external_ids(self, store: Store, external_ids: Iterable[str]) -> set:
+        ids = list(external_ids)
+        existing = set()
+        # Chunked to stay under the bound-parameter limit of the driver
+        for start in range(0, len(ids), IN_CLAUSE_CHUNK):
+            existing.update(self.session.exec(
+                select(Order.external_id).where(
+                    Order.store_id == store.id,
+                    Order.external_id.in_(ids[start:start + IN_CLAUSE_CHUNK]),
+                )
+            ).all())
+        return existing
+
+    def import_external_orders(self, store: Store, batch: List[dict]) -> ImportResult:
+        """
+        Imports a batch of external orders for a store in a single transaction.
+        Orders already known for this store (or repeated within the batch) are skipped.
+        """
+        # Dedup within the batch first, keeping the first occurrence
+        unique = {}
+        for data in batch:
+            unique.setdefault(data['external_id'], data)
+
+        # A concurrent import may win the race on the unique constraint; retry once
+        # with a fresh lookup so the counts stay accurate.
+        prices = pricing_engine.table_for(self.session, store.user_id)
+        for attempt in range(2):
+            existing = self._existing_external_ids(store, unique.keys())
+            built = [
+                self._build_external_order(store, data, prices)
+                for external_id, data in unique.items()
+                if external_id not in existing
+            ]
+            new_orders = [order for order, _ in built]
+            self.session.add_all(new_orders)
+            try:
+                self.session.flush() # One multi-row INSERT; assigns ids for the line items
+                for order, line_items in built:
+                    for line_item in line_items:
+                        line_item.order_id = order.id
+                    self.session.add_all(line_items)
+                self.session.commit()
+                break
+            except IntegrityError:
+                self.session.rollback()
+                if attempt:
+                    raise
+
+        return ImportResult(created=len(new_orders), skipped=len(batch) - len(new_orders))
+
+    def import_external_order(self, store: Store, external_data: dict) -> Order:
+        """
+        Converts external platform data (via our standardized format) into an Order.
+        """
+        # check for existing
+        existing = self.session.exec(
+            select(Order).where(Order.store_id == store.id, Order.external_id == external_data['external_id'])
+        ).first()
+        
+        if existing:
+            return existing
+
+        prices = pricing_engine.table_for(self.session, store.user_id)
+        order, line_items = self._build_external_order(store, external_data, prices)
         self.session.add(order)
+        self.session.flush()
+        for line_item in line_items:
+            line_item.order_id = order.id
+        self.session.add_all(line_items)
         self.session.commit()
         self.session.refresh(order)
         return order
@@ -0,0 +1,150 @@
+from datetime import datetime, timedelta
+from typing import Dict
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlmodel import Session, or_, select
+from models import OrderStat, OrderStats
+
+# Each order contributes to one OrderStat row per dimension: +1 order, and its
+# amount if paid. Triggers move that contribution when the order is created,
+# changes status / payment / store / source, or is deleted, so every writer
+# (ORM, bulk UPDATEs, sync, raw SQL) keeps the totals current in its own
+# transaction. An update only touches the rows of the dimensions it moved.
+#
+# Key expressions per dimension; {r} is NEW / OLD / o.
+DIMENSIONS = {
+    "status": "{r}.status",
+    "store": "COALESCE(CAST({r}.store_id AS TEXT), '')",
+    "source": "{r}.source",
+    "day": {"sqlite": "date({r}.created_at)", "postgresql": "to_char({r}.created_at, 'YYYY-MM-DD')"},
+}
+# Columns that change an order's contribution regardless of dimension
+CONTRIBUTION_COLUMNS = ("currency", "payment_status", "amount")
+WATCHED_COLUMNS = "status, payment_status, amount, currency, store_id, source, created_at"
+TRIGGER_NAME = "order_stats_insert"
+
+def _key(dimension: str, backend: str, row: str) -> str:
+    expr = DIMENSIONS[dimension]
+    return (expr[backend] if isinstance(expr, dict) else expr).format(r=row)
+
+def _apply(backend: str, row: str, sign: int, only_changed: bool) -> str:
+    """Statements adding (sign=1) or removing (sign=-1) the contribution of row to every dimension."""
+    statements = []
+    for dimension in DIMENSIONS:
+        guard = "TRUE"
+        if only_changed:
+            differs = "IS NOT" if backend == "sqlite" else "IS DISTINCT FROM"
+            changed = [f"{_key(dimension, backend, 'OLD')} {differs} {_key(dimension, backend, 'NEW')}"]
+            changed += [f"OLD.{column} {differs} NEW.{column}" for column in CONTRIBUTION_COLUMNS]
+            guard = " OR ".join(changed)
+        paid = f"{row}.payment_status = 'paid'"
+        statements.append(f"""
+        INSERT INTO orderstat (dimension, key, currency, orders, paid_orders, revenue)
+        SELECT '{dimension}', {_key(dimension, backend, row)}, {row}.currency, {sign},
+               CASE WHEN {paid} THEN {sign} ELSE 0 END, CASE WHEN {paid} THEN {sign} * {row}.amount ELSE 0 END
+        WHERE {guard}
+        ON CONFLICT (dimension, key, currency) DO UPDATE SET
+            orders = orderstat.orders + excluded.orders,
+            paid_orders = orderstat.paid_orders + excluded.paid_orders,
+            revenue = orderstat.revenue + excluded.revenue;""")
+    return "".join(statements)
+
+def _sqlite_ddl():
+    return [
+        f'CREATE TRIGGER {TRIGGER_NAME} AFTER INSERT ON "order" BEGIN {_apply("sqlite", "NEW", 1, False)} END',
+        f"""CREATE TRIGGER order_stats_update AFTER UPDATE OF {WATCHED_COLUMNS} ON "order" BEGIN
+            {_apply("sqlite", "OLD", -1, True)}
+            {_apply("sqlite", "NEW", 1, True)}
+        END""",
+        f'CREATE TRIGGER order_stats_delete AFTER DELETE ON "order" BEGIN {_apply("sqlite", "OLD", -1, False)} END',
+    ]
+
+def _postgres_ddl():
+    return [
+        f"""
+        CREATE OR REPLACE FUNCTION order_stats_changed() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                {_apply("postgresql", "NEW", 1, False)}
+            ELSIF TG_OP = 'DELETE' THEN
+                {_apply("postgresql", "OLD", -1, False)}
+            ELSE
+                {_apply("postgresql", "OLD", -1, True)}
+                {_apply("postgresql", "NEW", 1, True)}
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        f"""
+        CREATE TRIGGER {TRIGGER_NAME} AFTER INSERT OR UPDATE OF {WATCHED_COLUMNS} OR DELETE
+        ON "order" FOR EACH ROW EXECUTE FUNCTION order_stats_changed()
+        """,
+    ]
+
+def _rebuild(conn: Connection, backend: str) -> int:
+    if backend == "postgresql":
+        # Hold off order writers (readers carry on) so no trigger runs mid-rebuild
+        conn.exec_driver_sql('LOCK TABLE "order" IN SHARE MODE')
+    conn.exec_driver_sql("DELETE FROM orderstat")
+    for dimension in DIMENSIONS:
+        conn.exec_driver_sql(f"""
+            INSERT INTO orderstat (dimension, key, currency, orders, paid_orders, revenue)
+            SELECT '{dimension}', {_key(dimension, backend, "o")}, o.currency, COUNT(*),
+                   SUM(CASE WHEN o.payment_status = 'paid' THEN 1 ELSE 0 END),
+                   SUM(CASE WHEN o.payment_status = 'paid' THEN o.amount ELSE 0 END)
+            FROM "order" o GROUP BY 2, 3
+        """)
+    return conn.execute(text("SELECT COUNT(*) FROM orderstat")).scalar()
+
+def install_order_stats(engine: Engine) -> bool:
+    """
+    Creates the triggers that maintain OrderStat if missing, and fills it from
+    the existing orders in the same transaction. Safe to run on every start.
+    Returns True if they were installed.
+    """
+    backend = engine.dialect.name
+    with engine.begin() as conn:
+        if backend == "sqlite":
+            exists = conn.execute(text(f"SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = '{TRIGGER_NAME}'")).first()
+            ddl = _sqlite_ddl()
+        elif backend == "postgresql":
+            exists = conn.execute(text(f"SELECT 1 FROM pg_trigger WHERE tgname = '{TRIGGER_NAME}'")).first()
+            ddl = _postgres_ddl()
+        else:
+            return False
+        if exists:
+            return False
+        for statement in ddl:
+            conn.exec_driver_sql(statement)
+        _rebuild(conn, backend)
+    return True
+
+def rebuild_order_stats(engine: Engine) -> int:
+    """Recomputes OrderStat from the order table. Returns the number of rows written."""
+    with engine.begin() as conn:
+        return _rebuild(conn, engine.dialect.name)
+
+def read_order_stats(session: Session, days: int = 30) -> OrderStats:
+    """
+    Dashboard totals from the precomputed rows: a handful of statuses, stores
+    and sources plus one row per day, whatever the number of orders.
+    """
+    since = (datetime.utcnow().date() - timedelta(days=days - 1)).isoformat()
+    rows = session.exec(
+        select(OrderStat)
+        .where(OrderStat.orders != 0)
+        .where(or_(OrderStat.dimension != "day", OrderStat.key >= since))
+        .order_by(OrderStat.dimension, OrderStat.key, OrderStat.currency)
+    ).all()
+
+    grouped: Dict[str, list] = {dimension: [] for dimension in DIMENSIONS}
+    for row in rows:
+        # Repeated float additions and subtractions leave residue past the cent
+        grouped[row.dimension].append(OrderStat(
+            dimension=row.dimension, key=row.key, currency=row.currency,
+            orders=row.orders, paid_orders=row.paid_orders, revenue=round(row.revenue, 2),
+        ))
+    return OrderStats(
+        by_status=grouped["status"], by_store=grouped["store"], by_source=grouped["source"], daily=grouped["day"]
+    )
@@ -0,0 +1,321 @@
+import hashlib
+import logging
+import os
+import queue
+import random
+import smtplib
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import event
+from sqlmodel import Session, select, update
+from database import engine
+from models import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+# Without SMTP_HOST messages are logged instead of sent (development)
+SMTP_HOST = os.getenv("SMTP_HOST", "")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USER = os.getenv("SMTP_USER", "")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").strip().lower() in ("1", "true", "yes", "on")
+SMTP_TIMEOUT_SECONDS = float(os.getenv("SMTP_TIMEOUT_SECONDS", "30"))
+MAIL_FROM = os.getenv("MAIL_FROM", "orders@localhost")
+
+BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "2"))
+SMTP_CONNECTIONS = int(os.getenv("OUTBOX_SMTP_CONNECTIONS", "4"))
+MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+BACKOFF_BASE_SECONDS = float(os.getenv("OUTBOX_BACKOFF_BASE_SECONDS", "5"))
+BACKOFF_MAX_SECONDS = float(os.getenv("OUTBOX_BACKOFF_MAX_SECONDS", "3600"))
+# A claimed batch not finished within this is picked up again (dispatcher died mid-send)
+LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "120"))
+IN_CLAUSE_CHUNK = 500
+
+# ---------------------------------------------------------------------------
+# Producing messages, inside the caller's transaction
+
+def shipped_message(order_id: int, recipient: Optional[str], tracking_number: Optional[str]) -> OutboxMessage:
+    return OutboxMessage(
+        event_type="order_shipped",
+        dedup_key=f"order_shipped:{order_id}:{tracking_number}",
+        recipient=recipient or "",
+        subject=f"Your order #{order_id} has shipped",
+        body=f"Your order #{order_id} is on its way. Tracking number: {tracking_number}",
+    )
+
+def payment_message(order_id: int, recipient: Optional[str], payment_id: int, amount: float, currency: str) -> OutboxMessage:
+    return OutboxMessage(
+        event_type="payment_completed",
+        dedup_key=f"payment_completed:{payment_id}",
+        recipient=recipient or "",
+        subject=f"Payment received for order #{order_id}",
+        body=f"We received your payment of {amount:.2f} {currency} for order #{order_id}.",
+    )
+
+def production_message(order_id: int, recipient: Optional[str], item_index: int) -> OutboxMessage:
+    return OutboxMessage(
+        event_type="production_ready",
+        dedup_key=f"production_ready:{order_id}:{item_index}",
+        recipient=recipient or "",
+        subject=f"Order #{order_id} is in production",
+        body=f"The print files for order #{order_id} are ready and your order is now in production.",
+    )
+
+def emit(session: Session, messages: Iterable[OutboxMessage]) -> int:
+    """
+    Adds messages to the caller's transaction, so they are stored if and only if
+    the change they announce commits. Messages without a recipient, or whose
+    dedup_key is already in the outbox, are dropped. Returns how many were added.
+    """
+    unique: Dict[str, OutboxMessage] = {}
+    for message in messages:
+        if message.recipient:
+            unique.setdefault(message.dedup_key, message)
+    keys = list(unique)
+    for start in range(0, len(keys), IN_CLAUSE_CHUNK):
+        for key in session.exec(
+            select(OutboxMessage.dedup_key).where(OutboxMessage.dedup_key.in_(keys[start:start + IN_CLAUSE_CHUNK]))
+        ).all():
+            del unique[key]
+    if unique:
+        session.add_all(unique.values())
+        event.listen(session, "after_commit", outbox_dispatcher.wake, once=True)
+    return len(unique)
+
+# ---------------------------------------------------------------------------
+# Delivering them
+
+def backoff_seconds(attempts: int) -> float:
+    """Exponential backoff with jitter: about 5s, 10s, 20s ... capped at BACKOFF_MAX_SECONDS."""
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** max(0, attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+def to_email(message: OutboxMessage) -> EmailMessage:
+    email = EmailMessage()
+    email["From"] = MAIL_FROM
+    email["To"] = message.recipient
+    email["Subject"] = message.subject
+    # Stable per event, so a resend after a crash between send and bookkeeping can be recognized downstream
+    digest = hashlib.sha256(message.dedup_key.encode()).hexdigest()[:32]
+    email["Message-ID"] = f"<{digest}@{MAIL_FROM.rsplit('@', 1)[-1]}>"
+    email.set_content(message.body)
+    return email
+
+class SMTPConnectionPool:
+    """Keeps authenticated SMTP connections open between batches instead of one handshake per message."""
+
+    def __init__(self, host: str, port: int, size: int):
+        self.host = host
+        self.port = port
+        self._idle: "queue.LifoQueue[smtplib.SMTP]" = queue.LifoQueue(maxsize=size)
+
+    def _connect(self) -> smtplib.SMTP:
+        conn = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT_SECONDS)
+        if SMTP_STARTTLS:
+            conn.starttls()
+        if SMTP_USER:
+            conn.login(SMTP_USER, SMTP_PASSWORD)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn, reused = self._idle.get_nowait(), True
+        except queue.Empty:
+            conn, reused = self._connect(), False
+        try:
+            yield conn, reused
+        except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused) as e:
+            # The server rejected this message; the session itself is fine unless it is closing (421)
+            if getattr(e, "smtp_code", None) == 421:
+                self._discard(conn)
+            else:
+                self._release(conn)
+            raise
+        except Exception:
+            self._discard(conn)
+            raise
+        self._release(conn)
+
+    def _release(self, conn: smtplib.SMTP):
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            self._discard(conn)
+
+    @staticmethod
+    def _discard(conn: smtplib.SMTP):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                conn.quit()
+            except Exception:
+                self._discard(conn)
+
+class OutboxDispatcher:
+    """
+    Background thread draining OutboxMessage in batches. Every worker process
+    runs one; batches are claimed with a lease, so no two dispatchers send the
+    same message, and a batch abandoned by a dead process is retried after
+    LEASE_SECONDS. Failed sends back off exponentially; 5xx replies and
+    exhausted attempts mark the message failed.
+    """
+
+    def __init__(self, batch_size: Optional[int] = None, connections: Optional[int] = None,
+                 smtp_host: Optional[str] = None, smtp_port: Optional[int] = None):
+        self.batch_size = batch_size or BATCH_SIZE
+        self.connections = connections or SMTP_CONNECTIONS
+        self.smtp_host = SMTP_HOST if smtp_host is None else smtp_host
+        self.smtp_port = smtp_port or SMTP_PORT
+        self._pool = SMTPConnectionPool(self.smtp_host, self.smtp_port, self.connections) if self.smtp_host else None
+        self._senders: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._senders = ThreadPoolExecutor(max_workers=self.connections, thread_name_prefix="outbox-smtp")
+        self._thread = threading.Thread(target=self._run, name="outbox-dispatcher", daemon=True)
+        self._thread.start()
+
+    def shutdown(self, timeout: float = 10):
+        thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        thread.join(timeout)
+        self._senders.shutdown(wait=True)
+        self._senders = None
+        if self._pool is not None:
+            self._pool.close()
+
+    def wake(self, *_):
+        """Skips the rest of the poll interval; called after a transaction that emitted messages commits."""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                claimed = self.dispatch_once()
+            except Exception:
+                logger.exception("Outbox dispatch failed")
+                claimed = 0
+            if claimed < self.batch_size:
+                self._wake.wait(POLL_SECONDS)
+                self._wake.clear()
+
+    def dispatch_once(self) -> int:
+        """Claims, sends and records one batch. Returns the number of messages claimed."""
+        token = uuid.uuid4().hex
+        messages = self._claim(token)
+        if not messages:
+            return 0
+        if self._senders is None:
+            results = [self._deliver(message) for message in messages]
+        else:
+            results = list(self._senders.map(self._deliver, messages))
+        self._record(token, messages, results)
+        return len(messages)
+
+    def _claim(self, token: str) -> List[OutboxMessage]:
+        now = datetime.utcnow()
+        due = (
+            OutboxMessage.status.in_(("pending", "sending")), # "sending" here means an expired lease
+            OutboxMessage.next_attempt_at <= now,
+        )
+        with Session(engine) as session:
+            ids = session.exec(
+                select(OutboxMessage.id).where(*due)
+                .order_by(OutboxMessage.next_attempt_at, OutboxMessage.id)
+                .limit(self.batch_size)
+            ).all()
+            if not ids:
+                return []
+            # Conditional on still being due: a concurrent dispatcher's claim pushes
+            # next_attempt_at into the future, so each row is taken once.
+            session.exec(
+                update(OutboxMessage)
+                .where(OutboxMessage.id.in_(ids), *due)
+                .values(
+                    status="sending",
+                    claim_token=token,
+                    attempts=OutboxMessage.attempts + 1,
+                    next_attempt_at=now + timedelta(seconds=LEASE_SECONDS),
+                )
+            )
+            session.commit()
+            return list(session.exec(select(OutboxMessage).where(OutboxMessage.claim_token == token)).all())
+
+    def _deliver(self, message: OutboxMessage) -> Tuple[Optional[str], bool]:
+        """Returns (error, permanent); (None, False) when sent."""
+        if self._pool is None:
+            logger.info("SMTP_HOST not set; not sending email to %s: %s", message.recipient, message.subject)
+            return None, False
+        email = to_email(message)
+        try:
+            for _ in range(2):
+                try:
+                    with self._pool.connection() as (conn, reused):
+                        conn.send_message(email)
+                    return None, False
+                except smtplib.SMTPServerDisconnected:
+                    # An idle pooled connection may have been dropped by the server; retry once on a new one
+                    if not reused:
+                        raise
+            return "SMTP server disconnected", False
+        except smtplib.SMTPRecipientsRefused as e:
+            code = min(code for code, _ in e.recipients.values())
+            return f"Recipient refused: {e.recipients}", code >= 500
+        except smtplib.SMTPResponseException as e:
+            return f"{e.smtp_code} {e.smtp_error!r}", e.smtp_code >= 500
+        except (smtplib.SMTPException, OSError) as e:
+            return repr(e), False
+
+    def _record(self, token: str, messages: List[OutboxMessage], results: List[Tuple[Optional[str], bool]]):
+        now = datetime.utcnow()
+        sent_ids = [message.id for message, (error, _) in zip(messages, results) if error is None]
+        with Session(engine) as session:
+            for start in range(0, len(sent_ids), IN_CLAUSE_CHUNK):
+                session.exec(
+                    update(OutboxMessage)
+                    .where(OutboxMessage.id.in_(sent_ids[start:start + IN_CLAUSE_CHUNK]), OutboxMessage.claim_token == token)
+                    .values(status="sent", sent_at=now, claim_token=None, last_error=None)
+                )
+            for message, (error, permanent) in zip(messages, results):
+                if error is None:
+                    continue
+                give_up = permanent or message.attempts >= MAX_ATTEMPTS
+                logger.warning("Outbox message %s attempt %s failed%s: %s", message.id, message.attempts,
+                               " permanently" if give_up else "", error)
+                session.exec(
+                    update(OutboxMessage)
+                    .where(OutboxMessage.id == message.id, OutboxMessage.claim_token == token)
+                    .values(
+                        status="failed" if give_up else "pending",
+                        claim_token=None,
+                        last_error=error,
+                        next_attempt_at=now + timedelta(seconds=backoff_seconds(message.attempts)),
+                    )
+                )
+            session.commit()
+
+outbox_dispatcher = OutboxDispatcher()
@@ -0,0 +1,296 @@
+import json
+import tempfile
+import zlib
+from collections import Counter
+from itertools import groupby
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from sqlmodel import Session, select
+from database import engine
+from models import Order, OrderLineItem
+
+SLIP_COLUMNS = [
+    Order.id, Order.external_id, Order.source, Order.created_at, Order.tracking_number,
+    Order.recipient_name, Order.street, Order.city, Order.state, Order.zip_code, Order.country,
+]
+ITEM_COLUMNS = [
+    OrderLineItem.id.label("item_id"), OrderLineItem.sku, OrderLineItem.title, OrderLineItem.variant,
+    OrderLineItem.quantity,
+]
+
+# Rows per fetch from the server-side cursor, and bytes of finished pages per chunk sent
+FETCH_SIZE = 500
+CHUNK_BYTES = 64 * 1024
+# Manifest rows are spooled while the slips render; beyond this they go to a temporary file
+MANIFEST_SPOOL_BYTES = 1024 * 1024
+
+PAGE_W, PAGE_H = A4
+MARGIN = 40
+ROW_H = 14
+BOTTOM = 60
+FONTS = {"F1": "Helvetica", "F2": "Helvetica-Bold"}
+
+# (title, x, max width) of table columns; width 0 means a number right-aligned at x
+SLIP_TABLE = [("SKU", 40, 95), ("Item", 140, 255), ("Size", 400, 110), ("Qty", 555, 0)]
+PICK_LIST_TABLE = [("SKU", 40, 300), ("Units", 450, 0)]
+MANIFEST_TABLE = [("Order", 40, 80), ("Recipient", 125, 140), ("City", 270, 100), ("Country", 375, 45),
+                  ("Units", 450, 0), ("Tracking", 460, 95)]
+SLIP_TABLE_TOP = PAGE_H - 250
+MANIFEST_TABLE_TOP = PAGE_H - 95 # On continuation pages
+
+def _fit(value, font: str, size: float, width: float) -> str:
+    text = "" if value is None else str(value)
+    if not width or stringWidth(text, FONTS[font], size) <= width:
+        return text
+    while text and stringWidth(text + "...", FONTS[font], size) > width:
+        text = text[:-1]
+    return text + "..."
+
+def _pdf_string(text: str) -> str:
+    # Standard fonts use WinAnsiEncoding: cp1252, anything else becomes "?"
+    text = text.encode("cp1252", "replace").decode("latin-1")
+    return "(" + text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+class _Page:
+    """Content stream of one page (or page template), built from a few drawing operators."""
+
+    def __init__(self, template: Optional[str] = None):
+        self.ops: List[str] = [f"/{template} Do"] if template else []
+
+    def text(self, x: float, y: float, value, size: float = 9, font: str = "F1", width: float = 0, right: bool = False):
+        text = _fit(value, font, size, width)
+        if right:
+            x -= stringWidth(text, FONTS[font], size)
+        self.ops.append(f"BT /{font} {size} Tf 1 0 0 1 {x:.2f} {y:.2f} Tm {_pdf_string(text)} Tj ET")
+
+    def rule(self, y: float, width: float = 0.5):
+        self.ops.append(f"{width} w {MARGIN} {y:.2f} m {PAGE_W - MARGIN:.2f} {y:.2f} l S")
+
+    def table_header(self, columns, y: float):
+        for title, x, width in columns:
+            self.text(x, y, title, font="F2", right=not width)
+        self.rule(y - 4)
+
+    def row(self, columns, y: float, values):
+        for (_, x, width), value in zip(columns, values):
+            self.text(x, y, value, width=width, right=not width)
+
+    def data(self) -> bytes:
+        return "\n".join(self.ops).encode("latin-1")
+
+class _PdfWriter:
+    """
+    Writes PDF objects as soon as they are complete. Only object offsets are
+    kept for the cross-reference table, so pages don't accumulate in memory the
+    way they do in a reportlab canvas until save().
+    """
+
+    def __init__(self):
+        self.offset = 0
+        self.offsets: Dict[int, int] = {}
+        self.last_num = 0
+
+    def reserve(self) -> int:
+        self.last_num += 1
+        return self.last_num
+
+    def _out(self, data: bytes) -> bytes:
+        self.offset += len(data)
+        return data
+
+    def header(self) -> bytes:
+        return self._out(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def obj(self, num: int, body: str) -> bytes:
+        self.offsets[num] = self.offset
+        return self._out(f"{num} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+
+    def stream(self, num: int, data: bytes, entries: str = "") -> bytes:
+        self.offsets[num] = self.offset
+        data = zlib.compress(data)
+        return self._out(
+            f"{num} 0 obj\n<< {entries} /Length {len(data)} /Filter /FlateDecode >>\nstream\n".encode("latin-1")
+            + data + b"\nendstream\nendobj\n"
+        )
+
+    def trailer(self, root: int, info: int) -> bytes:
+        xref = [f"xref\n0 {self.last_num + 1}\n", "0000000000 65535 f \n"]
+        xref += [f"{self.offsets[num]:010d} 00000 n \n" for num in range(1, self.last_num + 1)]
+        xref.append(f"trailer\n<< /Size {self.last_num + 1} /Root {root} 0 R /Info {info} 0 R >>\n"
+                    f"startxref\n{self.offset}\n%%EOF\n")
+        return self._out("".join(xref).encode("latin-1"))
+
+class PackingSlipDocument:
+    """
+    Streams one PDF with a packing slip per matching order (more pages if the
+    items don't fit on one) preceded by a shipping manifest: totals, a pick list
+    per SKU and one row per order. Fonts and the static part of each page are
+    written once and shared by every page; pages are sent as they are rendered.
+    """
+
+    def __init__(
+        self,
+        status: Optional[str] = "in_production",
+        day: Optional[date] = None,
+        store_id: Optional[int] = None,
+        source: Optional[str] = None,
+    ):
+        self.status, self.day = status, day
+        # One row per line item, so a single streamed query carries the orders and their items
+        query = select(*SLIP_COLUMNS, *ITEM_COLUMNS).outerjoin(OrderLineItem, OrderLineItem.order_id == Order.id)
+        if status is not None:
+            query = query.where(Order.status == status)
+        if day is not None:
+            start = datetime.combine(day, time.min)
+            query = query.where(Order.created_at >= start, Order.created_at < start + timedelta(days=1))
+        if store_id is not None:
+            query = query.where(Order.store_id == store_id)
+        if source is not None:
+            query = query.where(Order.source == source)
+        self.query = query.order_by(Order.created_at, Order.id, OrderLineItem.position)
+
+    def filename(self) -> str:
+        return f"packing-slips-{self.day or datetime.utcnow().date()}-{self.status or 'all'}.pdf"
+
+    def _rows(self) -> Iterator[Tuple[tuple, List[tuple]]]:
+        """Each order with its line items (ITEM_COLUMNS)."""
+        # Own session: the response body is produced after the request's session is gone
+        with Session(engine) as session:
+            result = session.exec(self.query.execution_options(stream_results=True, yield_per=FETCH_SIZE))
+            for _, rows in groupby(result, key=lambda row: row.id):
+                rows = list(rows)
+                yield rows[0], [row for row in rows if row.item_id is not None]
+
+    def __iter__(self) -> Iterator[bytes]:
+        pending = []
+        size = 0
+        for data in self._objects():
+            pending.append(data)
+            size += len(data)
+            if size >= CHUNK_BYTES:
+                yield b"".join(pending)
+                pending, size = [], 0
+        yield b"".join(pending)
+
+    def _objects(self) -> Iterator[bytes]:
+        pdf = _PdfWriter()
+        catalog, pages_root, info, resources = (pdf.reserve() for _ in range(4))
+        yield pdf.header()
+
+        fonts = {name: pdf.reserve() for name in FONTS}
+        for name, num in fonts.items():
+            yield pdf.obj(num, f"<< /Type /Font /Subtype /Type1 /BaseFont /{FONTS[name]} /Encoding /WinAnsiEncoding >>")
+        font_dict = "<< " + " ".join(f"/{name} {num} 0 R" for name, num in fonts.items()) + " >>"
+        templates = {"Slip": self._slip_template(), "Manifest": self._manifest_template()}
+        template_nums = {name: pdf.reserve() for name in templates}
+        for name, template in templates.items():
+            yield pdf.stream(template_nums[name], template.data(),
+                             f"/Type /XObject /Subtype /Form /BBox [0 0 {PAGE_W:.2f} {PAGE_H:.2f}] /Resources << /Font {font_dict} >>")
+        xobjects = " ".join(f"/{name} {num} 0 R" for name, num in template_nums.items())
+        yield pdf.obj(resources, f"<< /Font {font_dict} /XObject << {xobjects} >> >>")
+
+        def page(content: _Page, kids: List[int]) -> bytes:
+            contents, num = pdf.reserve(), pdf.reserve()
+            kids.append(num)
+            return pdf.stream(contents, content.data()) + pdf.obj(num, (
+                f"<< /Type /Page /Parent {pages_root} 0 R /MediaBox [0 0 {PAGE_W:.2f} {PAGE_H:.2f}] "
+                f"/Resources {resources} 0 R /Contents {contents} 0 R >>"
+            ))
+
+        slip_pages, manifest_pages = [], []
+        units_by_sku = Counter()
+        orders = 0
+        with tempfile.SpooledTemporaryFile(max_size=MANIFEST_SPOOL_BYTES, mode="w+") as manifest_rows:
+            for order, items in self._rows():
+                orders += 1
+                units = 0
+                for item in items:
+                    units_by_sku[item.sku or 'UNKNOWN'] += item.quantity
+                    units += item.quantity
+                for content in self._slip_pages(order, items):
+                    yield page(content, slip_pages)
+                manifest_rows.write(json.dumps([
+                    order.external_id or order.id, order.recipient_name, order.city, order.country,
+                    units, order.tracking_number,
+                ]) + "\n")
+            manifest_rows.seek(0)
+            rows = (json.loads(line) for line in manifest_rows)
+            for content in self._manifest_pages(orders, len(slip_pages), units_by_sku, rows):
+                yield page(content, manifest_pages)
+
+        # The manifest renders last (it needs the totals) but comes first in the document
+        kids = manifest_pages + slip_pages
+        yield pdf.obj(pages_root, f"<< /Type /Pages /Kids [{' '.join(f'{k} 0 R' for k in kids)}] /Count {len(kids)} >>")
+        yield pdf.obj(catalog, f"<< /Type /Catalog /Pages {pages_root} 0 R >>")
+        yield pdf.obj(info, f"<< /Title {_pdf_string(self.filename())} /Producer (packing_slips) "
+                            f"/CreationDate (D:{datetime.utcnow():%Y%m%d%H%M%S}Z) >>")
+        yield pdf.trailer(catalog, info)
+
+    @staticmethod
+    def _slip_template() -> _Page:
+        template = _Page()
+        template.text(MARGIN, PAGE_H - 60, "PACKING SLIP", size=18, font="F2")
+        template.rule(PAGE_H - 72, width=1)
+        template.text(MARGIN, PAGE_H - 95, "Ship to", font="F2")
+        template.text(330, PAGE_H - 95, "Order", font="F2")
+        template.table_header(SLIP_TABLE, SLIP_TABLE_TOP)
+        template.rule(BOTTOM - 10)
+        template.text(MARGIN, BOTTOM - 25, "Please check the contents of your parcel. Thank you for your order!", size=8)
+        return template
+
+    @staticmethod
+    def _manifest_template() -> _Page:
+        template = _Page()
+        template.text(MARGIN, PAGE_H - 60, "SHIPPING MANIFEST", size=18, font="F2")
+        template.rule(PAGE_H - 72, width=1)
+        return template
+
+    def _slip_pages(self, order, items: List[tuple]) -> Iterator[_Page]:
+        rows_per_page = int((SLIP_TABLE_TOP - BOTTOM) // ROW_H) - 1
+        chunks = [items[i:i + rows_per_page] for i in range(0, len(items), rows_per_page)] or [[]]
+        for number, chunk in enumerate(chunks, 1):
+            content = _Page("Slip")
+            city = " ".join(part for part in (order.zip_code, order.city, order.state) if part and part != "-")
+            for offset, line in enumerate([order.recipient_name, order.street, city, order.country]):
+                content.text(MARGIN, PAGE_H - 112 - offset * ROW_H, line, size=10, width=270)
+            details = [
+                f"#{order.external_id or order.id} ({order.source})",
+                f"Placed {order.created_at:%Y-%m-%d}",
+                f"Tracking {order.tracking_number or '-'}",
+                f"Page {number} of {len(chunks)}",
+            ]
+            for offset, line in enumerate(details):
+                content.text(330, PAGE_H - 112 - offset * ROW_H, line, size=10, width=225)
+            for offset, item in enumerate(chunk):
+                content.row(SLIP_TABLE, SLIP_TABLE_TOP - (offset + 1.5) * ROW_H, [
+                    item.sku or 'UNKNOWN', item.title, item.variant, item.quantity,
+                ])
+            yield content
+
+    def _manifest_pages(self, orders: int, slip_pages: int, units_by_sku: Counter, rows: Iterator[list]) -> Iterator[_Page]:
+        content = _Page("Manifest")
+        content.text(MARGIN, PAGE_H - 95, f"Status {self.status or 'any'}, created {self.day or 'any day'}. "
+                                          f"Generated {datetime.utcnow():%Y-%m-%d %H:%M} UTC", size=10)
+        content.text(MARGIN, PAGE_H - 95 - ROW_H, f"{orders} orders, {sum(units_by_sku.values())} units, "
+                                                  f"{slip_pages} packing slip pages", size=10, font="F2")
+        y = PAGE_H - 95 - ROW_H * 3
+        # Pick list, then the orders; a table continued on a new page repeats its header
+        sections = [(PICK_LIST_TABLE, sorted(units_by_sku.items())), (MANIFEST_TABLE, rows)]
+        for columns, section in sections:
+            if y < BOTTOM + 3 * ROW_H:
+                yield content
+                content, y = _Page("Manifest"), MANIFEST_TABLE_TOP
+            content.table_header(columns, y)
+            y -= ROW_H * 1.5
+            for values in section:
+                if y < BOTTOM:
+                    yield content
+                    content, y = _Page("Manifest"), MANIFEST_TABLE_TOP
+                    content.table_header(columns, y)
+                    y -= ROW_H * 1.5
+                content.row(columns, y, values)
+                y -= ROW_H
+            y -= ROW_H
+        yield content
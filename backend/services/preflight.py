@@ -0,0 +1,217 @@
+import io
+import os
+import time
+from functools import lru_cache
+from typing import List, Optional, Tuple
+from PIL import Image, ImageChops, ImageCms, ImageMath, ImageStat
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+from models import ArtworkPreflight, ItemPreflight, Order, OrderLineItem
+from services.artwork import iter_artwork_strips, open_artwork
+from services.line_items import item_size_cm, line_items_by_order
+from services.production_cache import cache_key, file_digest
+
+# Below this many pixels per inch at the printed size the artwork gets a warning
+MIN_DPI = int(os.getenv("PREFLIGHT_MIN_DPI", "100"))
+# Total area coverage (C+M+Y+K, percent) the press and media accept
+MAX_INK_PERCENT = int(os.getenv("PREFLIGHT_MAX_INK_PERCENT", "300"))
+# Press ICC profile (RGB->CMYK output profile); empty: naive separation, no gamut check
+CMYK_PROFILE = os.getenv("PREFLIGHT_CMYK_PROFILE", "")
+# CIE76 distance between the intended and the printable color counted as out of gamut
+GAMUT_DELTA_E = float(os.getenv("PREFLIGHT_GAMUT_DELTA_E", "10"))
+# Longest side of the downsampled copy the color checks run on
+PROXY_PX = int(os.getenv("PREFLIGHT_PROXY_PX", "1000"))
+# Ink and gamut problems covering less of the area than this are not reported
+AREA_WARN_PERCENT = float(os.getenv("PREFLIGHT_AREA_WARN_PERCENT", "1"))
+MAX_DISTORTION_PERCENT = float(os.getenv("PREFLIGHT_MAX_DISTORTION_PERCENT", "2"))
+
+# Bump whenever analyze_artwork changes what it measures; it invalidates stored results
+ANALYSIS_VERSION = "2"
+
+# Everything besides the artwork that changes a preflight report
+SETTINGS = {
+    "version": ANALYSIS_VERSION,
+    "min_dpi": MIN_DPI,
+    "max_ink_percent": MAX_INK_PERCENT,
+    "cmyk_profile": CMYK_PROFILE,
+    "gamut_delta_e": GAMUT_DELTA_E,
+    "proxy_px": PROXY_PX,
+    "area_warn_percent": AREA_WARN_PERCENT,
+    "max_distortion_percent": MAX_DISTORTION_PERCENT,
+}
+# The subset stored ArtworkPreflight rows depend on; the rest only changes warnings
+ANALYSIS_SETTINGS = ("version", "max_ink_percent", "gamut_delta_e", "proxy_px")
+
+INTENT = ImageCms.Intent.RELATIVE_COLORIMETRIC
+
+@lru_cache(maxsize=1)
+def _press(path: str):
+    """(profile, description, CMYK->LAB transform) of the press profile; loaded once per process."""
+    profile = ImageCms.ImageCmsProfile(path)
+    if profile.profile.xcolor_space.strip() != "CMYK":
+        raise ValueError(f"PREFLIGHT_CMYK_PROFILE {path} is not a CMYK profile")
+    to_lab = ImageCms.buildTransform(profile, ImageCms.createProfile("LAB"), "CMYK", "LAB", renderingIntent=INTENT)
+    return profile, ImageCms.getProfileDescription(profile).strip(), to_lab
+
+def _analysis_key(digest: str) -> str:
+    press = file_digest(CMYK_PROFILE) if CMYK_PROFILE else None
+    return cache_key(artwork=digest, press_profile=press, **{name: SETTINGS[name] for name in ANALYSIS_SETTINGS})
+
+def _source_profile(icc: Optional[bytes], mode: str):
+    """The embedded ICC profile if it matches the pixel data, else None (sRGB is assumed)."""
+    if not icc:
+        return None
+    try:
+        profile = ImageCms.ImageCmsProfile(io.BytesIO(icc))
+    except (OSError, ImageCms.PyCMSError):
+        return None
+    return profile if profile.profile.xcolor_space.strip() == ("CMYK" if mode == "CMYK" else "RGB") else None
+
+def _proxy(path: str, width: int, height: int) -> Image.Image:
+    """
+    The artwork downsampled to PROXY_PX on its longest side, assembled from the
+    same bounded-memory strips the production renderer embeds. Those are 8-bit
+    already (16-bit artwork is scaled down, not clipped), so gray only needs RGB.
+    """
+    scale = min(1.0, PROXY_PX / max(width, height))
+    target = (max(1, round(width * scale)), max(1, round(height * scale)))
+    strips = [Image.open(jpeg) for _, _, jpeg in iter_artwork_strips(path, *target)]
+    proxy = Image.new(strips[0].mode, (strips[0].width, sum(s.height for s in strips)))
+    y = 0
+    for strip in strips:
+        proxy.paste(strip, (0, y))
+        y += strip.height
+    return proxy if proxy.mode in ("RGB", "CMYK") else proxy.convert("RGB")
+
+def _naive_cmyk(rgb: Image.Image) -> Image.Image:
+    """Device RGB -> CMYK with full gray replacement (K = min(C, M, Y)), for when no press profile is set."""
+    c, m, y = ImageChops.invert(rgb).split()
+    k = ImageChops.darker(ImageChops.darker(c, m), y)
+    return Image.merge("CMYK", [ImageChops.subtract(c, k), ImageChops.subtract(m, k), ImageChops.subtract(y, k), k])
+
+def _ink_coverage(cmyk: Image.Image) -> Tuple[float, float, float]:
+    """(mean, max, share of the area over MAX_INK_PERCENT) of the total ink, in percent."""
+    c, m, y, k = cmyk.split()
+    total = ImageMath.lambda_eval(lambda a: a["c"] + a["m"] + a["y"] + a["k"], c=c, m=m, y=y, k=k)
+    limit = MAX_INK_PERCENT * 255 // 100 # I images compare with ints only
+    over = ImageMath.lambda_eval(lambda a: a["total"] > limit, total=total)
+    # ImageStat bins 32-bit images into a 256-entry histogram: take the mean per 8-bit channel, the mask as L
+    return (
+        sum(ImageStat.Stat(cmyk).mean) * 100 / 255,
+        total.getextrema()[1] * 100 / 255,
+        ImageStat.Stat(over.convert("L")).mean[0] * 100,
+    )
+
+def _out_of_gamut(wanted: Image.Image, printed: Image.Image) -> float:
+    """Share of the area, in percent, where two LAB images differ by more than GAMUT_DELTA_E."""
+    l1, a1, b1 = wanted.split()
+    l2, a2, b2 = printed.split()
+    # Pillow's LAB stores L as 0-255 for 0-100 and a/b offset by 128; offsets cancel out
+    over = ImageMath.lambda_eval(
+        lambda a: ((a["float"](a["l1"]) - a["l2"]) * (100 / 255)) ** 2
+        + (a["float"](a["a1"]) - a["a2"]) ** 2 + (a["float"](a["b1"]) - a["b2"]) ** 2 > GAMUT_DELTA_E ** 2,
+        l1=l1, l2=l2, a1=a1, a2=a2, b1=b1, b2=b2,
+    )
+    return ImageStat.Stat(over.convert("L")).mean[0] * 100
+
+def analyze_artwork(path: str, digest: Optional[str] = None) -> ArtworkPreflight:
+    """
+    Measures ink coverage and, with a press profile, out-of-gamut area on a
+    downsampled copy. RGB artwork is separated with an ICC transform from its
+    embedded profile (or sRGB); CMYK artwork is taken as already separated.
+    Pass the file's digest if the caller has it, to save hashing it again.
+    """
+    digest = digest or file_digest(path)
+    started = time.perf_counter()
+    with open_artwork(path) as im:
+        width, height, mode, icc = im.width, im.height, im.mode, im.info.get("icc_profile")
+    proxy = _proxy(path, width, height)
+    source = _source_profile(icc, proxy.mode)
+
+    out_of_gamut = press_name = None
+    if proxy.mode == "CMYK":
+        cmyk = proxy
+    elif CMYK_PROFILE:
+        press, press_name, press_to_lab = _press(CMYK_PROFILE)
+        rgb = source or ImageCms.createProfile("sRGB")
+        cmyk = ImageCms.applyTransform(proxy, ImageCms.buildTransform(rgb, press, "RGB", "CMYK", renderingIntent=INTENT))
+        # Intended color vs. what the press prints for it
+        wanted = ImageCms.applyTransform(
+            proxy, ImageCms.buildTransform(rgb, ImageCms.createProfile("LAB"), "RGB", "LAB", renderingIntent=INTENT)
+        )
+        out_of_gamut = round(_out_of_gamut(wanted, ImageCms.applyTransform(cmyk, press_to_lab)), 2)
+    else:
+        cmyk = _naive_cmyk(proxy)
+    ink_mean, ink_max, over_limit = _ink_coverage(cmyk)
+
+    return ArtworkPreflight(
+        key=_analysis_key(digest),
+        artwork_digest=digest,
+        width_px=width,
+        height_px=height,
+        mode=mode,
+        source_profile=ImageCms.getProfileDescription(source).strip() if source else None,
+        cmyk_profile=press_name,
+        ink_mean_percent=round(ink_mean, 1),
+        ink_max_percent=round(ink_max, 1),
+        over_ink_limit_percent=round(over_limit, 2),
+        out_of_gamut_percent=out_of_gamut,
+        analysis_ms=round((time.perf_counter() - started) * 1000, 1),
+    )
+
+def preflight_artwork(session: Session, path: str) -> ArtworkPreflight:
+    """Stored analysis of the file's contents under the current settings; computed on first use."""
+    digest = file_digest(path)
+    key = _analysis_key(digest)
+    row = session.get(ArtworkPreflight, key)
+    if row:
+        return row
+    row = analyze_artwork(path, digest)
+    session.add(row)
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback() # Another worker analyzed the same file meanwhile
+        return session.get(ArtworkPreflight, key)
+    session.refresh(row)
+    return row
+
+def _size_warnings(report: ItemPreflight, artwork: ArtworkPreflight) -> List[str]:
+    width_in, height_in = report.print_width_cm / 2.54, report.print_height_cm / 2.54
+    report.effective_dpi = round(min(artwork.width_px / width_in, artwork.height_px / height_in), 1)
+    stretch = (artwork.width_px / artwork.height_px) / (report.print_width_cm / report.print_height_cm)
+    report.distortion_percent = round(abs(stretch - 1) * 100, 1)
+
+    warnings = []
+    if report.effective_dpi < MIN_DPI:
+        warnings.append(f"Low resolution: {report.effective_dpi:.0f} dpi at this size (minimum {MIN_DPI})")
+    if report.distortion_percent > MAX_DISTORTION_PERCENT:
+        warnings.append(f"Artwork aspect ratio is stretched {report.distortion_percent:.1f}% to fill the print")
+    if artwork.over_ink_limit_percent > AREA_WARN_PERCENT:
+        warnings.append(f"{artwork.over_ink_limit_percent:.1f}% of the area exceeds {MAX_INK_PERCENT}% ink "
+                        f"(max {artwork.ink_max_percent:.0f}%)")
+    if artwork.out_of_gamut_percent is not None and artwork.out_of_gamut_percent > AREA_WARN_PERCENT:
+        warnings.append(f"{artwork.out_of_gamut_percent:.1f}% of the area is outside the press gamut")
+    return warnings
+
+def preflight_item(session: Session, item: OrderLineItem, bleed_cm: float = 2.0) -> ItemPreflight:
+    """Checks a line item's artwork against the size it prints at, bleed included."""
+    width_cm, height_cm = item_size_cm(item)
+    report = ItemPreflight(
+        item_index=item.position,
+        sku=item.sku or 'UNKNOWN',
+        print_width_cm=width_cm + 2 * bleed_cm,
+        print_height_cm=height_cm + 2 * bleed_cm,
+    )
+    image_path = item.image_path
+    if not image_path:
+        report.warnings = ["No artwork"]
+    elif not os.path.exists(image_path):
+        report.warnings = [f"Artwork file {os.path.basename(image_path)} not found"]
+    else:
+        report.artwork = preflight_artwork(session, image_path)
+        report.warnings = _size_warnings(report, report.artwork)
+    return report
+
+def preflight_order(session: Session, order: Order, bleed_cm: float = 2.0) -> List[ItemPreflight]:
+    return [preflight_item(session, item, bleed_cm) for item in line_items_by_order(session, [order.id])[order.id]]
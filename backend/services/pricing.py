@@ -0,0 +1,148 @@
+import json
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+from sqlmodel import Field, Session, SQLModel
+from models import OrderLineItem, User
+from services.config_cache import CHECK_INTERVAL_SECONDS, bump_version, current_version
+
+logger = logging.getLogger(__name__)
+
+# Default unit prices per m², by material id (same ids as the admin pricing dialog)
+DEFAULT_PRICES_PER_SQM = {
+    "non-woven": 11.0,
+    "textured": 13.0,
+    "peel-stick": 14.0,
+    "deluxe-textile": 15.0,
+    "canvas-peel-stick": 18.0,
+}
+# Line item materials (services/line_items.py) -> price id; other materials are looked up by name,
+# so a user's custom pricing can price them
+MATERIAL_PRICE_IDS = {
+    "wallpaper": "non-woven",
+    "canvas": "canvas-peel-stick",
+}
+# Items whose material isn't known (no material, unknown SKU prefix) are priced as the base wallpaper
+DEFAULT_MATERIAL_ID = "non-woven"
+
+def price_id_for(item: OrderLineItem) -> str:
+    if not item.material:
+        return DEFAULT_MATERIAL_ID
+    return MATERIAL_PRICE_IDS.get(item.material, item.material)
+
+class QuoteItem(SQLModel):
+    material_id: str = DEFAULT_MATERIAL_ID
+    width_cm: float = Field(gt=0)
+    height_cm: float = Field(gt=0)
+    quantity: int = Field(default=1, gt=0)
+
+class QuoteLine(SQLModel):
+    material_id: str
+    area_sqm: float
+    unit_price: float # Per piece, after discount
+    total: float
+    priced: bool = True # False for unknown materials
+
+class QuoteRequest(SQLModel):
+    user_id: Optional[int] = None # Without a user, list prices apply
+    items: List[QuoteItem]
+
+class Quote(SQLModel):
+    currency: str = "USD"
+    lines: List[QuoteLine]
+    total: float
+
+class PriceTable:
+    """A user's effective price per m² for every material, overrides and discount already applied."""
+
+    def __init__(self, per_sqm: Dict[str, float]):
+        self.per_sqm = per_sqm
+
+    @classmethod
+    def compile(cls, user: Optional[User]) -> "PriceTable":
+        prices = dict(DEFAULT_PRICES_PER_SQM)
+        discount = 0.0
+        if user is not None:
+            discount = user.discount_percentage or 0.0
+            if user.custom_pricing_json:
+                try:
+                    overrides = json.loads(user.custom_pricing_json)
+                    prices.update({material: float(price) for material, price in overrides.items()})
+                except (ValueError, TypeError, AttributeError):
+                    logger.warning("Ignoring malformed custom_pricing_json of user %s", user.id)
+        factor = 1 - discount / 100
+        return cls({material: price * factor for material, price in prices.items()})
+
+    def price(self, material_id: str, width_cm: float, height_cm: float, quantity: int = 1) -> QuoteLine:
+        area = (width_cm / 100) * (height_cm / 100)
+        per_sqm = self.per_sqm.get(material_id)
+        if per_sqm is None:
+            return QuoteLine(material_id=material_id, area_sqm=round(area, 4), unit_price=0.0, total=0.0, priced=False)
+        unit_price = area * per_sqm
+        return QuoteLine(
+            material_id=material_id,
+            area_sqm=round(area, 4),
+            unit_price=round(unit_price, 2),
+            total=round(unit_price * quantity, 2),
+        )
+
+    def order_amount(self, items: List[OrderLineItem]) -> float:
+        """Total for an order's line items; items without a size or with an unpriced material add nothing."""
+        total = 0.0
+        for item in items:
+            per_sqm = self.per_sqm.get(price_id_for(item))
+            if item.width_cm is None or item.height_cm is None or per_sqm is None:
+                continue
+            total += item.width_cm / 100 * item.height_cm / 100 * per_sqm * item.quantity
+        return round(total, 2)
+
+class PricingEngine:
+    """
+    Per-worker cache of compiled PriceTables. update_user_pricing bumps the
+    "pricing" version; other workers drop their tables when they see it change.
+    """
+
+    NAME = "pricing"
+
+    def __init__(self, check_interval: float = CHECK_INTERVAL_SECONDS):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._tables: Dict[Optional[int], PriceTable] = {}
+        self._version = -1
+        self._checked_at = 0.0
+
+    def _refresh(self, session: Session):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            version = current_version(session, self.NAME)
+            if version != self._version:
+                self._tables = {}
+                self._version = version
+            self._checked_at = time.monotonic()
+
+    def table_for(self, session: Session, user_id: Optional[int]) -> PriceTable:
+        self._refresh(session)
+        table = self._tables.get(user_id)
+        if table is None:
+            user = session.get(User, user_id) if user_id is not None else None
+            table = self._tables[user_id] = PriceTable.compile(user)
+        return table
+
+    def quote(self, session: Session, user_id: Optional[int], items: List[QuoteItem]) -> Quote:
+        table = self.table_for(session, user_id)
+        lines = [table.price(i.material_id, i.width_cm, i.height_cm, i.quantity) for i in items]
+        return Quote(lines=lines, total=round(sum(line.total for line in lines), 2))
+
+    def bump(self, session: Session):
+        """Call before committing a change to a user's pricing fields."""
+        bump_version(session, self.NAME, on_commit=self.invalidate)
+
+    def invalidate(self, *args):
+        with self._lock:
+            self._tables = {}
+            self._checked_at = 0.0
+
+pricing_engine = PricingEngine()
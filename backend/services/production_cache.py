@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+from services.storage import FileStorage, StoredFile
+
+CACHE_MAX_MB = int(os.getenv("PRODUCTION_CACHE_MAX_MB", "5120"))
+CACHE_MAX_AGE_DAYS = float(os.getenv("PRODUCTION_CACHE_MAX_AGE_DAYS", "30"))
+# A hit only refreshes a file's last-access time once this much older; on S3 that rewrites the object
+TOUCH_INTERVAL_SECONDS = 3600
+
+# Per-process counters. Lookups run in the production pool workers, which send theirs back
+# with each job's result (see counters / add_counters); an API process reports the renders it queued
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+_stats_lock = threading.Lock()
+
+# Artwork digests keyed by (path, size, mtime) so unchanged files are hashed once per process
+_digest_memo: Dict[Tuple[str, int, int], str] = {}
+
+def _count(name: str, n: int = 1):
+    with _stats_lock:
+        _stats[name] += n
+
+def counters() -> Dict[str, int]:
+    with _stats_lock:
+        return dict(_stats)
+
+def add_counters(counts: Dict[str, int]):
+    """Adds counts taken in another process."""
+    with _stats_lock:
+        for name, n in counts.items():
+            _stats[name] += n
+
+def file_digest(path: str) -> str:
+    """sha256 of a file's contents, read in chunks."""
+    st = os.stat(path)
+    memo_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    digest = _digest_memo.get(memo_key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        digest = _digest_memo[memo_key] = h.hexdigest()
+    return digest
+
+def _last_used(f: StoredFile) -> float:
+    return max(f.modified, f.accessed or 0)
+
+def cache_key(**parts) -> str:
+    """Stable hash of everything that affects the rendered bytes."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+class ProductionFileCache:
+    """
+    Content-addressed store for rendered production files, kept in storage
+    under prefix. Files are named after their cache key; a hit touches the
+    file, which eviction uses as last-access time. Files that a succeeded
+    production job or an order points at are never evicted.
+    """
+
+    def __init__(self, storage: FileStorage, prefix: str = "items/", max_mb: int = CACHE_MAX_MB,
+                 max_age_days: float = CACHE_MAX_AGE_DAYS):
+        self.storage = storage
+        self.prefix = prefix
+        self.max_bytes = max_mb * 1024 * 1024
+        self.max_age_seconds = max_age_days * 86400
+
+    def key_for(self, key: str, stem: str) -> str:
+        """Storage key of the file with the given cache key."""
+        return f"{self.prefix}{stem}_{key[:20]}.pdf"
+
+    def lookup(self, key: str) -> Optional[str]:
+        stored = self.storage.stat(key)
+        if stored:
+            if time.time() - _last_used(stored) > TOUCH_INTERVAL_SECONDS:
+                self.storage.touch(key)
+            _count("hits")
+            return key
+        _count("misses")
+        return None
+
+    def stored(self, key: str):
+        """Call after a new file has been written under key."""
+        _count("stores")
+        self.evict()
+
+    def _files(self) -> List[StoredFile]:
+        return [f for f in self.storage.list(self.prefix) if f.key.endswith(".pdf")]
+
+    def _referenced(self) -> Set[str]:
+        """Keys of files that jobs or orders still hand out for download."""
+        from sqlmodel import Session, select
+        from database import engine
+        from models import Order, ProductionJob
+
+        with Session(engine) as session:
+            jobs = session.exec(select(ProductionJob.file_path).where(
+                ProductionJob.status == "succeeded", ProductionJob.file_path.startswith(self.prefix)
+            )).all()
+            orders = session.exec(select(Order.production_file_url).where(
+                Order.production_file_url.startswith(self.prefix)
+            )).all()
+        return set(jobs) | set(orders)
+
+    def evict(self) -> int:
+        """Drops unreferenced files past max age, then least recently used ones until under max size."""
+        now = time.time()
+        files = self._files()
+        evicted = 0
+        total = sum(f.size for f in files)
+        referenced = None
+        for f in sorted(files, key=_last_used):
+            if now - _last_used(f) <= self.max_age_seconds and total <= self.max_bytes:
+                break
+            if referenced is None:
+                referenced = self._referenced()
+            if f.key in referenced:
+                continue
+            self.storage.delete(f.key)
+            total -= f.size
+            evicted += 1
+
+        if evicted:
+            _count("evictions", evicted)
+        return evicted
+
+    def stats(self) -> dict:
+        files = self._files()
+        counts = counters()
+        lookups = counts["hits"] + counts["misses"]
+        return {
+            **counts,
+            "hit_rate": round(counts["hits"] / lookups, 4) if lookups else 0.0,
+            "storage": self.storage.name,
+            "files": len(files),
+            "size_bytes": sum(f.size for f in files),
+            "max_bytes": self.max_bytes,
+            "max_age_days": self.max_age_seconds / 86400,
+        }
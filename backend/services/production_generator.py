@@ -1,69 +1,243 @@
 import os
+import tempfile
+import time
+from typing import List, Optional
+from reportlab import rl_config
 from reportlab.pdfgen import canvas
 from reportlab.lib.units import cm
-from PIL import Image
-from models import Order
+from sqlmodel import Session, select
+from models import ItemPreflight, Order, OrderLineItem
+from services.line_items import item_size_cm, line_items_by_order, unsized_items
+from services.nesting import NestingLayout, NestingPiece, nest_on_roll
+from services.artwork import MAX_IMAGE_MEMORY_MB, STRIP_JPEG_QUALITY, cm_to_px, iter_artwork_strips
+from services.production_cache import ProductionFileCache, cache_key, file_digest
+from services.storage import FileStorage, get_storage
+from services import preflight
+
+# Bump whenever the rendering code changes what ends up in the file; it invalidates the cache
+GENERATOR_VERSION = "4"
+
+# Write binary streams; ASCII85 would inflate every embedded artwork strip by 25%
+rl_config.useA85 = 0
+
+class GangSheetResult(NestingLayout):
+    files: List[str] = [] # Storage keys, one per roll segment
+    manifest_path: str = "" # Storage key of the placement manifest
+    layout_seconds: float = 0.0
 
 class ProductionGenerator:
-    def __init__(self, output_dir="production_files"):
-        self.output_dir = output_dir
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
+    def __init__(self, storage: Optional[FileStorage] = None, dpi: Optional[int] = None, max_image_memory_mb: Optional[int] = None, bleed_cm: float = 2.0):
+        self.storage = storage or get_storage()
+        self.dpi = dpi or int(os.getenv("PRODUCTION_DPI", "150"))
+        self.max_image_memory_mb = max_image_memory_mb or MAX_IMAGE_MEMORY_MB
+        self.bleed_cm = bleed_cm
+        self.cache = ProductionFileCache(self.storage)
+
+    def _item(self, order: Order, item_index: int) -> OrderLineItem:
+        from database import engine
 
-    def generate_pdf(self, order: Order, item_index: int = 0) -> str:
+        with Session(engine) as session:
+            item = session.exec(select(OrderLineItem).where(
+                OrderLineItem.order_id == order.id, OrderLineItem.position == item_index
+            )).first()
+        if item is None:
+            raise ValueError("Item index out of range")
+        return item
+
+    def _storage_key(self, order: Order, item_index: int, item: OrderLineItem) -> str:
+        """Storage key of the item's file, named after a hash of everything that goes into it."""
+        image_path = item.image_path
+        key = cache_key(
+            version=GENERATOR_VERSION,
+            label=order.external_id or order.id,
+            item_index=item_index,
+            item=item.model_dump(exclude={"id", "order_id"}),
+            artwork=file_digest(image_path) if image_path else None,
+            bleed_cm=self.bleed_cm,
+            dpi=self.dpi,
+            jpeg_quality=STRIP_JPEG_QUALITY,
+            preflight=preflight.SETTINGS, # The slug prints the preflight result
+        )
+        return self.cache.key_for(key, f"{order.external_id or order.id}_{item.sku or 'UNKNOWN'}_{item_index}")
+
+    def generate_pdf(self, order: Order, item_index: int = 0, use_cache: bool = True) -> str:
         """
-        Generates a print-ready PDF for a specific line item in the order.
-        Assumes line_items_json is parsed and contains 'dimensions' (e.g., '100x100 cm') and 'image_path'.
+        Generates a print-ready PDF for a specific line item in the order, at the
+        size stored on its OrderLineItem row.
+        Returns the file's storage key; an identical earlier rendering is returned
+        from the cache without re-rendering.
         """
-        # Parse item data (simplified)
-        import json
-        items = json.loads(order.line_items_json)
-        if item_index >= len(items):
-             raise ValueError("Item index out of range")
-        
-        item = items[item_index]
-        sku = item.get('sku', 'UNKNOWN')
-        # Simulate getting dimensions from variant string if not explicit
-        # In real app, we parse "100x100 cm" -> width=100, height=100
-        # For prototype, let's hardcode or try to parse simple string
-        
-        width_cm = 100.0
-        height_cm = 100.0
-        
-        if 'variant' in item:
-            try:
-                # Naive parse: "100x100 cm"
-                parts = item['variant'].lower().replace('cm', '').split('x')
-                if len(parts) == 2:
-                    width_cm = float(parts[0].strip())
-                    height_cm = float(parts[1].strip())
-            except:
-                pass # Fallback to default
+        item = self._item(order, item_index)
+        key = self._storage_key(order, item_index, item)
+        if use_cache and self.cache.lookup(key):
+            return key
+
+        sku = item.sku or 'UNKNOWN'
+        width_cm, height_cm = item_size_cm(item)
         
         # Bleed configuration
-        bleed_cm = 2.0
+        bleed_cm = self.bleed_cm
         final_width_cm = width_cm + (2 * bleed_cm)
         final_height_cm = height_cm + (2 * bleed_cm)
         
-        filename = f"{order.external_id or order.id}_{sku}_{item_index}.pdf"
-        filepath = os.path.join(self.output_dir, filename)
-        
-        # Create PDF
-        c = canvas.Canvas(filepath, pagesize=(final_width_cm * cm, final_height_cm * cm))
-        
-        # Add cut line info
-        c.setStrokeColorRGB(1, 0, 0) # Red cut line
-        c.setLineWidth(1)
-        c.rect(bleed_cm * cm, bleed_cm * cm, width_cm * cm, height_cm * cm)
-        
-        # Add text info
-        c.setFont("Helvetica", 12)
-        c.drawString(2 * cm, final_height_cm * cm - 2 * cm, f"Order: {order.external_id or order.id}")
-        c.drawString(2 * cm, final_height_cm * cm - 2.5 * cm, f"SKU: {sku}")
-        c.drawString(2 * cm, final_height_cm * cm - 3 * cm, f"Size: {width_cm}x{height_cm} cm (+{bleed_cm}cm bleed)")
-        
-        # In real implementation: Draw Image
-        # if 'image_path' in item: c.drawImage(...)
-        
-        c.save()
-        return filepath
+        # reportlab streams the saved document into storage; readers never see a partial file
+        with self.storage.open_write(key) as out:
+            c = canvas.Canvas(out, pagesize=(final_width_cm * cm, final_height_cm * cm))
+
+            # Artwork covers the bleed area too
+            if item.image_path:
+                self._draw_artwork(c, item.image_path, 0, 0, final_width_cm, final_height_cm)
+            
+            # Add cut line info
+            c.setStrokeColorRGB(1, 0, 0) # Red cut line
+            c.setLineWidth(1)
+            c.rect(bleed_cm * cm, bleed_cm * cm, width_cm * cm, height_cm * cm)
+            
+            # Add text info
+            c.setFont("Helvetica", 12)
+            c.drawString(2 * cm, final_height_cm * cm - 2 * cm, f"Order: {order.external_id or order.id}")
+            c.drawString(2 * cm, final_height_cm * cm - 2.5 * cm, f"SKU: {sku}")
+            c.drawString(2 * cm, final_height_cm * cm - 3 * cm, f"Size: {width_cm}x{height_cm} cm (+{bleed_cm}cm bleed)")
+            if item.image_path:
+                self._draw_preflight(c, self._preflight(item), 2 * cm, final_height_cm * cm - 3.5 * cm)
+            
+            c.save()
+        self.cache.stored(key)
+        return key
+
+    def _preflight(self, item: OrderLineItem) -> ItemPreflight:
+        """The item's preflight report; the artwork analysis is reused if this file was checked before."""
+        from database import engine
+
+        with Session(engine) as session:
+            return preflight.preflight_item(session, item, self.bleed_cm)
+
+    def _draw_preflight(self, c: canvas.Canvas, report: ItemPreflight, x: float, y: float):
+        artwork = report.artwork
+        if artwork:
+            gamut = "n/a" if artwork.out_of_gamut_percent is None else f"{artwork.out_of_gamut_percent:.1f}%"
+            c.drawString(x, y, f"Preflight: {report.effective_dpi:.0f} dpi, ink max {artwork.ink_max_percent:.0f}%, "
+                               f"out of gamut {gamut}")
+            y -= 0.5 * cm
+        c.setFillColorRGB(0.85, 0.3, 0) # Warnings in orange
+        for warning in report.warnings:
+            c.drawString(x, y, f"! {warning}")
+            y -= 0.5 * cm
+        c.setFillColorRGB(0, 0, 0)
+
+    def _draw_artwork(self, c: canvas.Canvas, image_path: str, x_cm: float, y_cm: float, width_cm: float, height_cm: float):
+        """
+        Embeds the artwork into the box as horizontal strips so that only one strip
+        is decoded at a time, however large the print is. What stays resident until
+        the canvas is saved is the JPEG-compressed strip data, not raw pixels.
+        """
+        strips = iter_artwork_strips(
+            image_path,
+            cm_to_px(width_cm, self.dpi),
+            cm_to_px(height_cm, self.dpi),
+            max_memory_mb=self.max_image_memory_mb,
+        )
+        for top, bottom, jpeg in strips:
+            # reportlab only passes JPEG data through untouched when given a file path;
+            # an ImageReader would be decoded back to raw RGB in memory
+            with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as tmp:
+                tmp.write(jpeg.getbuffer())
+            try:
+                # PDF y grows upwards, strips come top first
+                c.drawImage(
+                    tmp.name,
+                    x_cm * cm,
+                    (y_cm + height_cm * (1 - bottom)) * cm,
+                    width=width_cm * cm,
+                    height=height_cm * (bottom - top) * cm,
+                )
+            finally:
+                os.remove(tmp.name)
+
+    def generate_gang_sheets(
+        self,
+        orders: List[Order],
+        roll_width_cm: float,
+        max_segment_length_cm: Optional[float] = None,
+        bleed_cm: float = 2.0,
+        gap_cm: float = 0.5,
+        name: Optional[str] = None,
+    ) -> GangSheetResult:
+        """
+        Nests every line item (times its quantity) of the given orders onto a roll and
+        writes one gang-sheet PDF per roll segment plus a JSON placement manifest to storage.
+        Files are named after a hash of the layout and artwork unless a name is given.
+        Raises ValueError if an item has no print size.
+        """
+        from database import engine
+
+        with Session(engine) as session:
+            items = line_items_by_order(session, [order.id for order in orders])
+        unsized = unsized_items([item for order in orders for item in items[order.id]])
+        if unsized:
+            raise ValueError(unsized)
+        pieces = []
+        for order in orders:
+            for item in items[order.id]:
+                width_cm, height_cm = item.width_cm, item.height_cm
+                for copy_index in range(item.quantity):
+                    pieces.append(NestingPiece(
+                        order_id=order.id,
+                        item_index=item.position,
+                        copy_index=copy_index,
+                        sku=item.sku or 'UNKNOWN',
+                        width_cm=width_cm,
+                        height_cm=height_cm,
+                        image_path=item.image_path,
+                    ))
+
+        started = time.perf_counter()
+        layout = nest_on_roll(pieces, roll_width_cm, bleed_cm=bleed_cm, gap_cm=gap_cm,
+                              max_segment_length_cm=max_segment_length_cm)
+        result = GangSheetResult(**layout.model_dump(), layout_seconds=round(time.perf_counter() - started, 4))
+
+        if not name:
+            artwork = sorted({p.image_path for p in layout.placements if p.image_path})
+            name = "gang_" + cache_key(
+                version=GENERATOR_VERSION,
+                layout=layout.model_dump(),
+                artwork={path: file_digest(path) for path in artwork},
+                dpi=self.dpi,
+                jpeg_quality=STRIP_JPEG_QUALITY,
+            )[:20]
+        by_segment = {}
+        for placement in layout.placements:
+            by_segment.setdefault(placement.segment, []).append(placement)
+
+        for segment, length_cm in enumerate(layout.segment_lengths_cm):
+            key = f"{name}_seg{segment + 1}.pdf"
+            with self.storage.open_write(key) as out:
+                c = canvas.Canvas(out, pagesize=(roll_width_cm * cm, length_cm * cm))
+                c.setFont("Helvetica", 10)
+                for placement in by_segment.get(segment, []):
+                    if placement.image_path:
+                        box_w = placement.width_cm + 2 * bleed_cm
+                        box_h = placement.height_cm + 2 * bleed_cm
+                        c.saveState()
+                        c.translate((placement.x_cm - bleed_cm) * cm, (placement.y_cm - bleed_cm) * cm)
+                        if placement.rotated:
+                            # Artwork keeps its own orientation; turn the canvas instead
+                            c.translate(box_w * cm, 0)
+                            c.rotate(90)
+                            box_w, box_h = box_h, box_w
+                        self._draw_artwork(c, placement.image_path, 0, 0, box_w, box_h)
+                        c.restoreState()
+                    # Red cut line around the trim box; bleed extends outside it
+                    c.setStrokeColorRGB(1, 0, 0)
+                    c.setLineWidth(1)
+                    c.rect(placement.x_cm * cm, placement.y_cm * cm, placement.width_cm * cm, placement.height_cm * cm)
+                    c.drawString((placement.x_cm + 0.5) * cm, (placement.y_cm + 0.5) * cm,
+                                 f"#{placement.order_id} {placement.sku} [{placement.item_index}.{placement.copy_index}]")
+                c.showPage()
+                c.save()
+            result.files.append(key)
+
+        result.manifest_path = f"{name}_manifest.json"
+        with self.storage.open_write(result.manifest_path, "application/json") as out:
+            out.write(result.model_dump_json(indent=2).encode())
+        return result
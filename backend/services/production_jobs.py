@@ -0,0 +1,334 @@
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple, Type, Union
+from sqlalchemy import or_, update
+from sqlmodel import Session, select
+from database import engine
+from models import GangSheetJob, Order, OrderLineItem, ProductionJob
+from services.outbox import emit, production_message
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+# Order statuses a finished production file moves into in_production; later ones only get the new file
+PRE_PRODUCTION_STATUSES = ("draft", "pending", "ready_for_print")
+# A process renews the leases of jobs it is rendering every third of this; once a
+# lease runs out (the process died) any other process takes the job over
+LEASE_SECONDS = float(os.getenv("PRODUCTION_JOB_LEASE_SECONDS", "300"))
+
+Job = Union[ProductionJob, GangSheetJob]
+JobModel = Type[Job]
+# Job tables the queue runs; they share the status, attempt and lease columns
+JOB_MODELS: Tuple[JobModel, ...] = (ProductionJob, GangSheetJob)
+
+def _render(order_data: dict, item_index: int) -> Tuple[str, Dict[str, int]]:
+    """
+    Runs inside a pool worker. Only plain data crosses the process boundary,
+    the generator (reportlab, Pillow) is imported in the worker. Returns the
+    file's storage key and the cache counters this render moved.
+    """
+    from services import production_cache
+    from services.production_generator import ProductionGenerator
+
+    before = production_cache.counters()
+    key = ProductionGenerator().generate_pdf(Order(**order_data), item_index=item_index)
+    return key, {name: n - before[name] for name, n in production_cache.counters().items()}
+
+def _render_gang_sheets(order_ids: List[int], params: dict) -> str:
+    """Runs inside a pool worker; returns the storage key of the placement manifest."""
+    from services.production_generator import ProductionGenerator
+
+    with Session(engine) as session:
+        orders = session.exec(select(Order).where(Order.id.in_(order_ids)).order_by(Order.id)).all()
+    return ProductionGenerator().generate_gang_sheets(orders, **params).manifest_path
+
+class ProductionJobQueue:
+    """
+    Local job queue for production-file rendering, backed by a process pool.
+    Job state lives in the ProductionJob and GangSheetJob tables so it survives
+    restarts. Every server process runs one; a job is rendered by the process
+    whose claim on it (a conditional UPDATE with its token and a lease, as in
+    the outbox) wins.
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_attempts: Optional[int] = None):
+        self.workers = workers or int(os.getenv("PRODUCTION_WORKERS", "2"))
+        self.max_attempts = max_attempts or int(os.getenv("PRODUCTION_JOB_MAX_ATTEMPTS", "3"))
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._running = False
+        self._lock = threading.Lock()
+        self._token = uuid.uuid4().hex
+        self._in_flight: Set[Tuple[str, int]] = set() # (table, job id)
+        self._stop = threading.Event()
+        self._heartbeat: Optional[threading.Thread] = None
+
+    def start(self):
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            self._stop.clear()
+            self._heartbeat = threading.Thread(target=self._renew_leases, name="production-jobs", daemon=True)
+            self._heartbeat.start()
+        self._resume_pending()
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            self._running = False
+            pool, self._pool = self._pool, None
+            heartbeat, self._heartbeat = self._heartbeat, None
+        self._stop.set()
+        if heartbeat is not None:
+            heartbeat.join()
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+    def _renew_leases(self):
+        while not self._stop.wait(LEASE_SECONDS / 3):
+            try:
+                with Session(engine) as session:
+                    for model in JOB_MODELS:
+                        session.exec(
+                            update(model)
+                            .where(model.claim_token == self._token, model.status == "running")
+                            .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=LEASE_SECONDS))
+                        )
+                    session.commit()
+                # Jobs of processes that died since
+                self._resume_pending()
+            except Exception:
+                logger.exception("Renewing production job leases failed")
+
+    def _executor(self) -> ProcessPoolExecutor:
+        # Created on the first job rather than at startup, so workers that never
+        # render don't pay for the pool (semaphores, resource tracker) on boot
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a threaded server process can deadlock in the child
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._pool
+
+    def _drop_pool(self, pool: ProcessPoolExecutor):
+        """Discards a broken pool (a worker died, e.g. OOM-killed); the next job starts a new one."""
+        with self._lock:
+            if self._pool is not pool:
+                return # Already replaced
+            self._pool = None
+        # Its pending futures have failed with BrokenProcessPool already
+        pool.shutdown(wait=False)
+
+    def enqueue(self, session: Session, order: Order, item_index: int = 0) -> ProductionJob:
+        """
+        Queues rendering of one order item. An already active job for it is returned as is.
+        Raises ValueError if the order has no such item.
+        """
+        existing = session.exec(
+            select(ProductionJob).where(
+                ProductionJob.order_id == order.id,
+                ProductionJob.item_index == item_index,
+                ProductionJob.status.in_(ACTIVE_STATUSES),
+            )
+        ).first()
+        if existing:
+            return existing
+
+        # Unchanged items are cache hits in the worker; hashing their artwork here would hold up the request
+        item = session.exec(select(OrderLineItem.id).where(
+            OrderLineItem.order_id == order.id, OrderLineItem.position == item_index
+        )).first()
+        if item is None:
+            raise ValueError("Item index out of range")
+
+        job = ProductionJob(order_id=order.id, item_index=item_index, max_attempts=self.max_attempts)
+        session.add(job)
+        session.commit()
+        session.refresh(job)
+        self._submit(ProductionJob, job.id)
+        return job
+
+    def enqueue_gang_sheets(self, session: Session, order_ids: List[int], params: dict) -> GangSheetJob:
+        """Queues gang sheets of the orders' items. An active job for the same orders and params is returned as is."""
+        order_ids_json = json.dumps(sorted(set(order_ids)))
+        params_json = json.dumps(params, sort_keys=True)
+        existing = session.exec(
+            select(GangSheetJob).where(
+                GangSheetJob.order_ids_json == order_ids_json,
+                GangSheetJob.params_json == params_json,
+                GangSheetJob.status.in_(ACTIVE_STATUSES),
+            )
+        ).first()
+        if existing:
+            return existing
+
+        job = GangSheetJob(order_ids_json=order_ids_json, params_json=params_json, max_attempts=self.max_attempts)
+        session.add(job)
+        session.commit()
+        session.refresh(job)
+        self._submit(GangSheetJob, job.id)
+        return job
+
+    def _resume_pending(self):
+        # Jobs that were queued or mid-render when their process died
+        if not self._running:
+            return
+        for model in JOB_MODELS:
+            for job_id in self._claim(model):
+                self._dispatch(model, job_id)
+
+    def _submit(self, model: JobModel, job_id: int):
+        if not self._running:
+            self.start()
+            return # start() resumes every active job, including this one
+        for job_id in self._claim(model, [job_id]):
+            self._dispatch(model, job_id)
+
+    def _claim(self, model: JobModel, job_ids: Optional[List[int]] = None) -> List[int]:
+        """Takes unclaimed and lease-expired active jobs (of job_ids, if given); returns the ids won."""
+        now = datetime.utcnow()
+        claimable = (
+            model.status.in_(ACTIVE_STATUSES),
+            or_(model.claim_token.is_(None), model.lease_expires_at <= now),
+        )
+        with Session(engine) as session:
+            query = select(model.id).where(*claimable)
+            if job_ids is not None:
+                query = query.where(model.id.in_(job_ids))
+            with self._lock:
+                ids = [job_id for job_id in session.exec(query).all()
+                       if (model.__tablename__, job_id) not in self._in_flight]
+            if not ids:
+                return []
+            # Conditional on still being claimable, so concurrent claims take each job once
+            session.exec(
+                update(model)
+                .where(model.id.in_(ids), *claimable)
+                .values(
+                    status="running",
+                    claim_token=self._token,
+                    lease_expires_at=now + timedelta(seconds=LEASE_SECONDS),
+                    attempts=model.attempts + 1,
+                    updated_at=now,
+                )
+            )
+            session.commit()
+            return list(session.exec(
+                select(model.id).where(model.id.in_(ids), model.claim_token == self._token)
+            ).all())
+
+    def _dispatch(self, model: JobModel, job_id: int):
+        with Session(engine) as session:
+            job = session.get(model, job_id)
+            if job is None:
+                return
+            if model is GangSheetJob:
+                task = (_render_gang_sheets, json.loads(job.order_ids_json), json.loads(job.params_json))
+            else:
+                order = session.get(Order, job.order_id)
+                if not order:
+                    self._mark_failed(session, job, "Order not found")
+                    return
+                task = (_render, order.model_dump(), job.item_index)
+
+        with self._lock:
+            self._in_flight.add((model.__tablename__, job_id))
+        pool = self._executor()
+        try:
+            future = pool.submit(*task)
+        except BrokenProcessPool:
+            # Broke before this job reached it: not an attempt; hand it to a new pool
+            self._drop_pool(pool)
+            with self._lock:
+                self._in_flight.discard((model.__tablename__, job_id))
+            with Session(engine) as session:
+                job = session.get(model, job_id)
+                if job is None or job.claim_token != self._token:
+                    return
+                job.attempts -= 1
+                self._release(session, job, status="queued")
+            if self._running:
+                self._submit(model, job_id)
+            return
+        future.add_done_callback(lambda f: self._on_done(model, job_id, f, pool))
+
+    def _on_done(self, model: JobModel, job_id: int, future: Future, pool: ProcessPoolExecutor):
+        with self._lock:
+            self._in_flight.discard((model.__tablename__, job_id))
+
+        with Session(engine) as session:
+            job = session.get(model, job_id)
+            if job is None or job.claim_token != self._token:
+                # Deleted, or the lease ran out and another process took the job over
+                logger.warning("Production job %s is no longer held by this process; dropping its result", job_id)
+                return
+            if future.cancelled():
+                # Shutting down; hand the job back so the next process to start resumes it
+                self._release(session, job, status="queued")
+                return
+
+            error = future.exception()
+            if isinstance(error, BrokenProcessPool):
+                # A worker died mid-render; every job it held fails this attempt and is retried on a new pool
+                self._drop_pool(pool)
+            if error is None and model is GangSheetJob:
+                job.file_path = future.result()
+                job.error = None
+                self._release(session, job, status="succeeded")
+                return
+            order = session.get(Order, job.order_id) if error is None else None
+            if error is None and order is None:
+                self._mark_failed(session, job, "Order not found")
+                return
+            if error is None:
+                from services.production_cache import add_counters
+
+                filepath, cache_counts = future.result()
+                add_counters(cache_counts)
+                job.file_path = filepath
+                job.error = None
+                self._release(session, job, status="succeeded", commit=False)
+
+                session.exec(update(Order).where(Order.id == order.id).values(production_file_url=filepath))
+                # Only a finished file moves the order into production, and never back from shipped or cancelled
+                moved = session.exec(
+                    update(Order)
+                    .where(Order.id == order.id, Order.status.in_(PRE_PRODUCTION_STATUSES))
+                    .values(status="in_production", version=Order.version + 1)
+                ).rowcount
+                if moved: # The customer hears about it once, not on every regeneration
+                    emit(session, [production_message(order.id, order.recipient_email, job.item_index)])
+                session.commit()
+                return
+
+            logger.warning("Production job %s attempt %s failed: %s", job_id, job.attempts, error)
+            if job.attempts >= job.max_attempts:
+                self._mark_failed(session, job, str(error))
+                return
+            job.error = str(error)
+            self._release(session, job, status="queued")
+
+        if self._running:
+            self._submit(model, job_id)
+
+    def _mark_failed(self, session: Session, job: Job, error: str):
+        job.error = error
+        self._release(session, job, status="failed")
+
+    def _release(self, session: Session, job: Job, status: str, commit: bool = True):
+        job.status = status
+        job.claim_token = None
+        job.lease_expires_at = None
+        job.updated_at = datetime.utcnow()
+        session.add(job)
+        if commit:
+            session.commit()
+
+job_queue = ProductionJobQueue()
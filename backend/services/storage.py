@@ -0,0 +1,396 @@
+"""
+Where production files live. Generators write and the API reads them by key
+(e.g. "items/ETSY-1_WL-204_0_ab12cd.pdf"), never by local path, so render
+workers and API nodes on different machines share the files once the S3
+backend is configured.
+
+    PRODUCTION_STORAGE=local   files under PRODUCTION_STORAGE_DIR (default)
+    PRODUCTION_STORAGE=s3      any S3-compatible bucket (AWS, MinIO, R2, ...);
+                               mock_s3.py is a local stand-in for development
+"""
+import hashlib
+import hmac
+import os
+import tempfile
+import threading
+import time
+import xml.etree.ElementTree as ET
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote, urlsplit
+import httpx
+from sqlmodel import SQLModel
+
+PRODUCTION_STORAGE = os.getenv("PRODUCTION_STORAGE", "local")
+STORAGE_DIR = os.getenv("PRODUCTION_STORAGE_DIR", "production_files")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL", "https://s3.amazonaws.com")
+S3_BUCKET = os.getenv("S3_BUCKET", "")
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+S3_ACCESS_KEY_ID = os.getenv("S3_ACCESS_KEY_ID", "")
+S3_SECRET_ACCESS_KEY = os.getenv("S3_SECRET_ACCESS_KEY", "")
+S3_PART_MB = max(5, int(os.getenv("S3_PART_MB", "16"))) # S3 rejects multipart parts under 5 MB
+S3_PRESIGN_SECONDS = int(os.getenv("S3_PRESIGN_SECONDS", "900"))
+
+READ_CHUNK_BYTES = 256 * 1024
+UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+S3_NS = "{http://s3.amazonaws.com/doc/2006-03-01/}"
+
+class StorageError(OSError):
+    pass
+
+class StoredFile(SQLModel):
+    key: str
+    size: int
+    modified: float # Unix time of the last write (S3: or touch)
+    etag: str # Quoted, as sent in the ETag header
+    accessed: Optional[float] = None # Last touch, for backends that track it apart from modified
+
+class FileStorage:
+    """Backend interface. Keys are relative, "/"-separated paths."""
+    name = ""
+
+    @contextmanager
+    def open_write(self, key: str, content_type: str = "application/pdf"):
+        """
+        File-like object to stream the contents into. The file only appears under
+        its key once the block exits cleanly; on an exception it is discarded.
+        """
+        writer = self._writer(key, content_type)
+        try:
+            yield writer
+        except BaseException:
+            writer.abort()
+            raise
+        writer.commit()
+
+    def _writer(self, key: str, content_type: str):
+        raise NotImplementedError
+
+    def stat(self, key: str) -> Optional[StoredFile]:
+        """None if there is no such file."""
+        raise NotImplementedError
+
+    def read(self, key: str, first: int = 0, last: Optional[int] = None) -> Iterator[bytes]:
+        """Chunks of bytes first..last (inclusive; None for the end of the file)."""
+        raise NotImplementedError
+
+    def touch(self, key: str):
+        """Marks the file as used, for least-recently-used eviction."""
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def list(self, prefix: str = "") -> Iterator[StoredFile]:
+        raise NotImplementedError
+
+    def presigned_url(self, key: str, filename: Optional[str] = None) -> Optional[str]:
+        """Time-limited URL clients can download the file from directly, or None if the backend has none."""
+        return None
+
+# Extended attribute holding a local file's ETag (an md5 of its contents, like S3's)
+ETAG_XATTR = "user.etag"
+
+class _LocalWriter:
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        # Unique temporary name next to the target, so concurrent writers of one key don't collide
+        self._file = tempfile.NamedTemporaryFile(dir=os.path.dirname(path), prefix=os.path.basename(path) + ".",
+                                                 suffix=".part", delete=False)
+        self.name = path
+        self._md5 = hashlib.md5()
+
+    def write(self, data) -> int:
+        self._md5.update(data)
+        return self._file.write(data)
+
+    def commit(self):
+        self._file.close()
+        try:
+            os.setxattr(self._file.name, ETAG_XATTR, f'"{self._md5.hexdigest()}"'.encode())
+        except (AttributeError, OSError):
+            pass # No xattrs (platform or filesystem): the ETag falls back to size and mtime
+        os.replace(self._file.name, self.path)
+
+    def abort(self):
+        self._file.close()
+        os.remove(self._file.name)
+
+class LocalStorage(FileStorage):
+    """Files in a directory. Only shared between nodes if the directory is (e.g. NFS)."""
+    name = "local"
+
+    def __init__(self, root: str = STORAGE_DIR):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid storage key: {key!r}")
+        return path
+
+    def _writer(self, key: str, content_type: str) -> _LocalWriter:
+        return _LocalWriter(self.path(key))
+
+    def _stored(self, key: str, st: os.stat_result) -> StoredFile:
+        try:
+            etag = os.getxattr(self.path(key), ETAG_XATTR).decode()
+        except (AttributeError, OSError):
+            etag = f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+        return StoredFile(key=key, size=st.st_size, modified=st.st_mtime, etag=etag, accessed=st.st_atime)
+
+    def stat(self, key: str) -> Optional[StoredFile]:
+        try:
+            return self._stored(key, os.stat(self.path(key)))
+        except FileNotFoundError:
+            return None
+
+    def read(self, key: str, first: int = 0, last: Optional[int] = None) -> Iterator[bytes]:
+        with open(self.path(key), "rb") as f:
+            f.seek(first)
+            remaining = None if last is None else last - first + 1
+            while remaining is None or remaining > 0:
+                chunk = f.read(READ_CHUNK_BYTES if remaining is None else min(READ_CHUNK_BYTES, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def touch(self, key: str):
+        # Access time only: mtime backs Last-Modified, which must not change while the contents don't
+        path = self.path(key)
+        try:
+            os.utime(path, ns=(time.time_ns(), os.stat(path).st_mtime_ns))
+        except FileNotFoundError:
+            pass # Evicted in the meantime
+
+    def delete(self, key: str):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass # Another worker got there first
+
+    def list(self, prefix: str = "") -> Iterator[StoredFile]:
+        directory = prefix.rpartition("/")[0]
+        top = self.path(directory) if directory else self.root
+        if not os.path.isdir(top):
+            return
+        for dirpath, _, filenames in os.walk(top):
+            for filename in filenames:
+                key = os.path.relpath(os.path.join(dirpath, filename), self.root).replace(os.sep, "/")
+                if not key.startswith(prefix) or filename.endswith(".part"):
+                    continue
+                try:
+                    yield self._stored(key, os.stat(os.path.join(dirpath, filename)))
+                except FileNotFoundError:
+                    pass
+
+def _quote(value: str, safe: str = "-_.~") -> str:
+    return quote(str(value), safe=safe)
+
+def canonical_query(params: Dict[str, str]) -> str:
+    return "&".join(f"{_quote(k)}={_quote(v)}" for k, v in sorted(params.items()))
+
+def _hmac(key: bytes, msg: str) -> bytes:
+    return hmac.new(key, msg.encode(), hashlib.sha256).digest()
+
+def sign_v4(secret_key: str, region: str, amz_date: str, method: str, path: str, params: Dict[str, str],
+            headers: Dict[str, str], payload_hash: str = UNSIGNED_PAYLOAD) -> Tuple[str, str, str]:
+    """
+    AWS Signature Version 4 for the s3 service. headers are the signed ones, lower-case.
+    Returns (credential scope, signed header list, signature).
+    """
+    signed = sorted(headers)
+    canonical_request = "\n".join([
+        method, path, canonical_query(params),
+        "".join(f"{name}:{headers[name].strip()}\n" for name in signed), ";".join(signed), payload_hash,
+    ])
+    scope = f"{amz_date[:8]}/{region}/s3/aws4_request"
+    string_to_sign = "\n".join(["AWS4-HMAC-SHA256", amz_date, scope, hashlib.sha256(canonical_request.encode()).hexdigest()])
+    key = _hmac(f"AWS4{secret_key}".encode(), amz_date[:8])
+    for part in (region, "s3", "aws4_request"):
+        key = _hmac(key, part)
+    return scope, ";".join(signed), hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+
+class _S3Writer:
+    """Uploads in parts of S3_PART_MB as data comes in; small files go up in a single PUT."""
+
+    def __init__(self, storage: "S3Storage", key: str, content_type: str):
+        self.storage = storage
+        self.key = key
+        self.name = key
+        self.content_type = content_type
+        self._buffer = bytearray()
+        self._upload_id: Optional[str] = None
+        self._parts: List[Tuple[int, str]] = [] # (part number, ETag)
+
+    def write(self, data) -> int:
+        view = memoryview(data).cast("B")
+        while view:
+            take = self.storage.part_bytes - len(self._buffer)
+            self._buffer += view[:take]
+            view = view[take:]
+            if len(self._buffer) >= self.storage.part_bytes:
+                self._upload_part()
+        return len(data)
+
+    def _upload_part(self):
+        if self._upload_id is None:
+            response = self.storage._request("POST", self.key, {"uploads": ""}, headers={"content-type": self.content_type})
+            self._upload_id = ET.fromstring(response.content).findtext(f"{S3_NS}UploadId")
+        number = len(self._parts) + 1
+        response = self.storage._request("PUT", self.key, {"partNumber": str(number), "uploadId": self._upload_id},
+                                         content=bytes(self._buffer))
+        self._parts.append((number, response.headers["etag"]))
+        self._buffer.clear()
+
+    def commit(self):
+        if self._upload_id is None:
+            self.storage._request("PUT", self.key, content=bytes(self._buffer), headers={"content-type": self.content_type})
+            return
+        if self._buffer:
+            self._upload_part()
+        body = "".join(f"<Part><PartNumber>{n}</PartNumber><ETag>{etag}</ETag></Part>" for n, etag in self._parts)
+        response = self.storage._request("POST", self.key, {"uploadId": self._upload_id},
+                                         content=f"<CompleteMultipartUpload>{body}</CompleteMultipartUpload>".encode())
+        # Completion can fail after the 200 status line has been sent
+        if b"<Error>" in response.content:
+            raise StorageError(f"S3 upload of {self.key} failed: {response.text[:200]}")
+
+    def abort(self):
+        if self._upload_id is not None:
+            try:
+                self.storage._request("DELETE", self.key, {"uploadId": self._upload_id})
+            except (httpx.HTTPError, StorageError):
+                pass # Left for the bucket's abort-incomplete-uploads lifecycle rule
+
+class S3Storage(FileStorage):
+    """
+    S3-compatible object storage over plain HTTP with SigV4 signing, path-style
+    addressing. Objects can't be touched in place; touch copies an object onto
+    itself, which resets its Last-Modified (and a multipart upload's ETag).
+    """
+    name = "s3"
+
+    def __init__(self, bucket: str = S3_BUCKET, endpoint_url: str = S3_ENDPOINT_URL, region: str = S3_REGION,
+                 access_key_id: str = S3_ACCESS_KEY_ID, secret_access_key: str = S3_SECRET_ACCESS_KEY,
+                 part_mb: int = S3_PART_MB, presign_seconds: int = S3_PRESIGN_SECONDS):
+        if not bucket:
+            raise ValueError("S3_BUCKET is not set")
+        self.bucket = bucket
+        self.endpoint_url = endpoint_url.rstrip("/")
+        self.host = urlsplit(self.endpoint_url).netloc
+        self.region = region
+        self.access_key_id = access_key_id
+        self.secret_access_key = secret_access_key
+        self.part_bytes = part_mb * 1024 * 1024
+        self.presign_seconds = presign_seconds
+        self._client = httpx.Client(timeout=httpx.Timeout(60, connect=10))
+
+    def _path(self, key: str) -> str:
+        return f"/{self.bucket}/{_quote(key, safe='-_.~/')}" if key else f"/{self.bucket}"
+
+    def _request(self, method: str, key: str, params: Optional[Dict[str, str]] = None, content: Optional[bytes] = None,
+                 headers: Optional[Dict[str, str]] = None, stream: bool = False, ok: Tuple[int, ...] = ()) -> httpx.Response:
+        params = params or {}
+        amz_date = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        path = self._path(key)
+        signed = {"host": self.host, "x-amz-content-sha256": UNSIGNED_PAYLOAD, "x-amz-date": amz_date}
+        scope, signed_headers, signature = sign_v4(self.secret_access_key, self.region, amz_date, method, path, params, signed)
+        signed["authorization"] = (f"AWS4-HMAC-SHA256 Credential={self.access_key_id}/{scope}, "
+                                   f"SignedHeaders={signed_headers}, Signature={signature}")
+        url = self.endpoint_url + path + (f"?{canonical_query(params)}" if params else "")
+        request = self._client.build_request(method, url, content=content, headers={**(headers or {}), **signed})
+        response = self._client.send(request, stream=stream)
+        if response.status_code >= 300 and response.status_code not in ok:
+            if stream:
+                response.read()
+                response.close()
+            raise StorageError(f"S3 {method} {key or self.bucket}: HTTP {response.status_code} {response.text[:200]}")
+        return response
+
+    def _writer(self, key: str, content_type: str) -> _S3Writer:
+        return _S3Writer(self, key, content_type)
+
+    def stat(self, key: str) -> Optional[StoredFile]:
+        response = self._request("HEAD", key, ok=(404,))
+        if response.status_code == 404:
+            return None
+        return StoredFile(key=key, size=int(response.headers["content-length"]), etag=response.headers["etag"],
+                          modified=parsedate_to_datetime(response.headers["last-modified"]).timestamp())
+
+    def read(self, key: str, first: int = 0, last: Optional[int] = None) -> Iterator[bytes]:
+        headers = {"range": f"bytes={first}-{'' if last is None else last}"}
+        response = self._request("GET", key, headers=headers, stream=True)
+        try:
+            yield from response.iter_bytes(READ_CHUNK_BYTES)
+        finally:
+            response.close()
+
+    def touch(self, key: str):
+        head = self._request("HEAD", key, ok=(404,))
+        if head.status_code == 404:
+            return # Evicted in the meantime
+        # A copy onto itself is only allowed when it replaces the metadata, content type included
+        response = self._request("PUT", key, headers={
+            "x-amz-copy-source": self._path(key), "x-amz-metadata-directive": "REPLACE",
+            "content-type": head.headers.get("content-type", "binary/octet-stream"),
+        }, ok=(404,))
+        # S3 can fail a copy after sending 200, with the error in the body
+        if response.status_code == 200 and b"<Error>" in response.content:
+            raise StorageError(f"S3 touch {key}: {response.text[:200]}")
+
+    def delete(self, key: str):
+        self._request("DELETE", key, ok=(404,))
+
+    def list(self, prefix: str = "") -> Iterator[StoredFile]:
+        params = {"list-type": "2", "prefix": prefix}
+        while True:
+            page = ET.fromstring(self._request("GET", "", params).content)
+            for item in page.iter(f"{S3_NS}Contents"):
+                modified = datetime.fromisoformat(item.findtext(f"{S3_NS}LastModified").replace("Z", "+00:00"))
+                yield StoredFile(key=item.findtext(f"{S3_NS}Key"), size=int(item.findtext(f"{S3_NS}Size")),
+                                 modified=modified.timestamp(), etag=item.findtext(f"{S3_NS}ETag"))
+            token = page.findtext(f"{S3_NS}NextContinuationToken")
+            if page.findtext(f"{S3_NS}IsTruncated") != "true" or not token:
+                return
+            params["continuation-token"] = token
+
+    def presigned_url(self, key: str, filename: Optional[str] = None) -> Optional[str]:
+        if self.presign_seconds <= 0:
+            return None # Downloads are proxied through the API instead
+        amz_date = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        params = {
+            "X-Amz-Algorithm": "AWS4-HMAC-SHA256",
+            "X-Amz-Credential": f"{self.access_key_id}/{amz_date[:8]}/{self.region}/s3/aws4_request",
+            "X-Amz-Date": amz_date,
+            "X-Amz-Expires": str(self.presign_seconds),
+            "X-Amz-SignedHeaders": "host",
+        }
+        if filename:
+            params["response-content-disposition"] = f"attachment; filename*=utf-8''{_quote(filename)}"
+        path = self._path(key)
+        _, _, signature = sign_v4(self.secret_access_key, self.region, amz_date, "GET", path, params, {"host": self.host})
+        return f"{self.endpoint_url}{path}?{canonical_query(params)}&X-Amz-Signature={signature}"
+
+BACKENDS: Dict[str, Callable[[], FileStorage]] = {
+    LocalStorage.name: LocalStorage,
+    S3Storage.name: S3Storage,
+}
+
+_storage: Optional[FileStorage] = None
+_storage_lock = threading.Lock()
+
+def get_storage() -> FileStorage:
+    """The configured backend, created once per process."""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            if PRODUCTION_STORAGE not in BACKENDS:
+                raise ValueError(f"Unknown PRODUCTION_STORAGE {PRODUCTION_STORAGE!r}, expected one of {sorted(BACKENDS)}")
+            _storage = BACKENDS[PRODUCTION_STORAGE]()
+        return _storage
@@ -0,0 +1,209 @@
+import asyncio
+import collections
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Tuple
+import httpx
+from sqlmodel import Session, SQLModel, select
+from database import engine
+from models import Store
+from services.marketplace_clients import CLIENTS, MarketplaceClient, OrderPageResult
+from services.order_service import OrderService
+
+logger = logging.getLogger(__name__)
+
+# Per-platform limits: parallel stores in flight and API requests per second
+PLATFORM_CONCURRENCY = {
+    "etsy": int(os.getenv("SYNC_ETSY_CONCURRENCY", "4")),
+    "shopify": int(os.getenv("SYNC_SHOPIFY_CONCURRENCY", "4")),
+}
+PLATFORM_RATE_LIMITS = {
+    "etsy": float(os.getenv("SYNC_ETSY_RATE_PER_SEC", "10")),
+    "shopify": float(os.getenv("SYNC_SHOPIFY_RATE_PER_SEC", "2")),
+}
+DEFAULT_CONCURRENCY = 2
+DEFAULT_RATE_PER_SEC = 2.0
+HTTP_TIMEOUT_SECONDS = float(os.getenv("SYNC_HTTP_TIMEOUT_SECONDS", "30"))
+
+class StoreSyncResult(SQLModel):
+    store_id: int
+    platform: str
+    created: int = 0
+    skipped: int = 0
+    pages: int = 0
+    cursor: Optional[str] = None
+    error: Optional[str] = None
+
+class RateLimiter:
+    """
+    Token bucket: at most `rate` acquisitions per second, bursts up to `burst`.
+    Thread-safe, so every event loop in the process (requests, the webhook
+    consumer's) draws from the same bucket.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    async def acquire(self):
+        # Reserve a token, letting the balance go negative, then sleep until it is due
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate) - 1
+            self.updated = now
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            await asyncio.sleep(wait)
+
+class ConcurrencyLimit:
+    """Async semaphore shared across threads and event loops; waiters are served in order."""
+
+    def __init__(self, value: int):
+        self._value = value
+        self._lock = threading.Lock()
+        self._waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = collections.deque()
+
+    async def __aenter__(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._value > 0 and not self._waiters:
+                self._value -= 1
+                return
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                queued = waiter in self._waiters
+                if queued:
+                    self._waiters.remove(waiter)
+            # A slot handed over just before the cancellation is passed on; one still
+            # on its way finds the future cancelled and _grant passes it on
+            if not queued and not waiter[1].cancelled():
+                self._release()
+            raise
+
+    async def __aexit__(self, *exc):
+        self._release()
+
+    def _release(self):
+        with self._lock:
+            while self._waiters:
+                loop, future = self._waiters.popleft()
+                try:
+                    loop.call_soon_threadsafe(self._grant, future)
+                    return
+                except RuntimeError:
+                    continue # Its loop has closed
+            self._value += 1
+
+    def _grant(self, future: asyncio.Future):
+        if future.done(): # Cancelled meanwhile
+            self._release()
+        else:
+            future.set_result(None)
+
+# Per process, not per SyncEngine: every sync in the process shares the platform's limits
+_limits: Dict[str, Tuple[ConcurrencyLimit, RateLimiter]] = {}
+_limits_lock = threading.Lock()
+
+def platform_limits(platform: str) -> Tuple[ConcurrencyLimit, RateLimiter]:
+    with _limits_lock:
+        if platform not in _limits:
+            _limits[platform] = (
+                ConcurrencyLimit(PLATFORM_CONCURRENCY.get(platform, DEFAULT_CONCURRENCY)),
+                RateLimiter(PLATFORM_RATE_LIMITS.get(platform, DEFAULT_RATE_PER_SEC)),
+            )
+        return _limits[platform]
+
+class SyncEngine:
+    """
+    Pulls new orders from every connected store concurrently. Each platform has
+    its own concurrency cap and rate limit, shared by all syncs in the process;
+    each store resumes from its persisted sync_cursor, so a run only fetches
+    orders it hasn't seen. A store that fails is reported in its result and
+    doesn't affect the others.
+    """
+
+    def __init__(self, http: Optional[httpx.AsyncClient] = None, clients: Optional[Dict[str, type]] = None):
+        self._http = http
+        self.clients = clients or CLIENTS
+
+    async def sync_all(self) -> List[StoreSyncResult]:
+        def connected_stores():
+            with Session(engine) as session:
+                return session.exec(select(Store).where(Store.is_connected == True)).all()
+
+        stores = await asyncio.to_thread(connected_stores)
+        return await self.sync_stores(stores)
+
+    async def sync_stores(self, stores: List[Store]) -> List[StoreSyncResult]:
+        owns_http = self._http is None
+        http = self._http or httpx.AsyncClient(timeout=HTTP_TIMEOUT_SECONDS)
+        try:
+            return await asyncio.gather(*(self._sync_store(http, store) for store in stores))
+        finally:
+            if owns_http:
+                await http.aclose()
+
+    async def _sync_store(self, http: httpx.AsyncClient, store: Store) -> StoreSyncResult:
+        result = StoreSyncResult(store_id=store.id, platform=store.platform, cursor=store.sync_cursor)
+        client_class = self.clients.get(store.platform)
+        if client_class is None:
+            result.error = f"No client for platform {store.platform}"
+            return result
+
+        client: MarketplaceClient = client_class(http)
+        semaphore, limiter = platform_limits(store.platform)
+        async with semaphore:
+            try:
+                while True:
+                    await limiter.acquire()
+                    page = await client.fetch_page(store, result.cursor)
+                    result.pages += 1
+                    if page.orders:
+                        created, skipped = await asyncio.to_thread(self._import_page, store, page)
+                        result.created += created
+                        result.skipped += skipped
+                    result.cursor = page.cursor
+                    if not page.has_more:
+                        break
+                await asyncio.to_thread(self._mark_synced, store.id, store.shop_name)
+            except (httpx.HTTPError, KeyError, ValueError) as e:
+                # The cursor only advances with committed pages, so the next run resumes here
+                logger.warning("Sync of store %s failed: %r", store.id, e)
+                result.error = repr(e)
+            except Exception as e:
+                logger.exception("Sync of store %s failed", store.id)
+                result.error = repr(e)
+        return result
+
+    @staticmethod
+    def _import_page(store: Store, page: OrderPageResult):
+        with Session(engine) as session:
+            imported = OrderService(session).import_external_orders(store, page.orders)
+            # Advance the high-water mark after the orders are committed. A crash in
+            # between re-fetches the page, and the import dedups it.
+            db_store = session.get(Store, store.id)
+            if db_store.shop_name == store.shop_name: # Not reconnected to another shop meanwhile
+                db_store.sync_cursor = page.cursor
+                session.add(db_store)
+            session.commit()
+        return imported.created, imported.skipped
+
+    @staticmethod
+    def _mark_synced(store_id: int, shop_name: str):
+        with Session(engine) as session:
+            db_store = session.get(Store, store_id)
+            if db_store.shop_name != shop_name:
+                return
+            db_store.last_synced_at = datetime.utcnow()
+            session.add(db_store)
+            session.commit()
@@ -0,0 +1,340 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Mapping, Optional, Tuple
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, func, select, update
+from database import engine
+from models import Store, WebhookDelivery
+from services.outbox import backoff_seconds
+
+logger = logging.getLogger(__name__)
+
+# Signing secrets from each platform's app settings; a platform without one has no webhook endpoint
+WEBHOOK_SECRETS = {
+    "etsy": os.getenv("ETSY_WEBHOOK_SECRET", ""),
+    "shopify": os.getenv("SHOPIFY_WEBHOOK_SECRET", ""),
+}
+MAX_BODY_BYTES = int(os.getenv("WEBHOOK_MAX_BODY_KB", "1024")) * 1024
+# Signed timestamps older than this are rejected as replays
+TIMESTAMP_TOLERANCE_SECONDS = int(os.getenv("WEBHOOK_TIMESTAMP_TOLERANCE_SECONDS", "300"))
+
+BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "200"))
+# After a delivery arrives, wait this long so a burst is imported as one batch
+COALESCE_SECONDS = float(os.getenv("WEBHOOK_COALESCE_SECONDS", "1"))
+# Picks up deliveries acknowledged by other processes
+POLL_SECONDS = float(os.getenv("WEBHOOK_POLL_SECONDS", "2"))
+# With this many deliveries waiting, new ones are refused (503) and the platform retries later
+MAX_BACKLOG = int(os.getenv("WEBHOOK_MAX_BACKLOG", "10000"))
+MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "8"))
+LEASE_SECONDS = float(os.getenv("WEBHOOK_LEASE_SECONDS", "300"))
+
+class WebhookRejected(ValueError):
+    """Missing or invalid signature."""
+
+# ---------------------------------------------------------------------------
+# Receiving: verify and queue, nothing else
+
+def _header(headers: Mapping[str, str], name: str) -> str:
+    value = headers.get(name)
+    if not value:
+        raise ValueError(f"Missing {name} header")
+    return value
+
+class WebhookPlatform:
+    """
+    Signature scheme and payload format of one platform's webhooks. Subclasses
+    set `platform`, implement verify and orders; register them in PLATFORMS.
+    """
+
+    platform: str = ""
+
+    def verify(self, secret: str, body: bytes, headers: Mapping[str, str]) -> WebhookDelivery:
+        """The delivery to queue. Raises WebhookRejected on a bad signature, ValueError if malformed."""
+        raise NotImplementedError
+
+    def orders(self, delivery: WebhookDelivery) -> Optional[List[dict]]:
+        """Standardized orders carried by the delivery, or None if it only announces changes (sync the store)."""
+        raise NotImplementedError
+
+class ShopifyWebhooks(WebhookPlatform):
+    """
+    Base64 HMAC-SHA256 of the body in X-Shopify-Hmac-Sha256; the payload is the
+    full order. Import only inserts new orders, so subscribe to orders/create
+    alone; other topics are refused rather than acknowledged and dropped.
+    """
+
+    platform = "shopify"
+    ORDER_TOPICS = ("orders/create",)
+
+    def verify(self, secret: str, body: bytes, headers: Mapping[str, str]) -> WebhookDelivery:
+        expected = base64.b64encode(hmac.new(secret.encode(), body, hashlib.sha256).digest()).decode()
+        if not hmac.compare_digest(expected.encode(), headers.get("x-shopify-hmac-sha256", "").encode()):
+            raise WebhookRejected("Invalid Shopify webhook signature")
+        topic = _header(headers, "x-shopify-topic")
+        if topic not in self.ORDER_TOPICS:
+            raise ValueError(f"Shopify topic {topic} is not handled; subscribe to {', '.join(self.ORDER_TOPICS)} only")
+        return WebhookDelivery(
+            platform=self.platform,
+            delivery_id=_header(headers, "x-shopify-webhook-id"),
+            shop=_header(headers, "x-shopify-shop-domain"),
+            topic=topic,
+            payload=body.decode(),
+        )
+
+    def orders(self, delivery: WebhookDelivery) -> Optional[List[dict]]:
+        from services.marketplace_clients import ShopifyClient
+
+        if delivery.topic not in self.ORDER_TOPICS: # Queued before other topics were refused
+            raise ValueError(f"Shopify topic {delivery.topic} is not handled")
+        return [ShopifyClient.to_order(json.loads(delivery.payload))]
+
+class EtsyWebhooks(WebhookPlatform):
+    """
+    Standard Webhooks signing: webhook-signature holds "v1,<base64 HMAC-SHA256>"
+    of "{webhook-id}.{webhook-timestamp}.{body}" keyed with the whsec_ secret.
+    Events name the shop and receipt but don't carry it, so the store is synced.
+    """
+
+    platform = "etsy"
+
+    def verify(self, secret: str, body: bytes, headers: Mapping[str, str]) -> WebhookDelivery:
+        delivery_id = _header(headers, "webhook-id")
+        timestamp = _header(headers, "webhook-timestamp")
+        try:
+            key = base64.b64decode(secret.split("_", 1)[1] if secret.startswith("whsec_") else secret)
+            age = abs(time.time() - int(timestamp))
+        except ValueError:
+            raise ValueError("Malformed Etsy webhook secret or timestamp")
+        signed = f"{delivery_id}.{timestamp}.".encode() + body
+        expected = base64.b64encode(hmac.new(key, signed, hashlib.sha256).digest()).decode()
+        # Several space-separated signatures during secret rotation; check all of them
+        valid = False
+        for candidate in headers.get("webhook-signature", "").split():
+            version, _, signature = candidate.partition(",")
+            valid |= version == "v1" and hmac.compare_digest(expected.encode(), signature.encode())
+        if not valid or age > TIMESTAMP_TOLERANCE_SECONDS:
+            raise WebhookRejected("Invalid or expired Etsy webhook signature")
+        try:
+            event = json.loads(body)
+            shop, topic = str(event["shop_id"]), event["event_type"]
+        except (ValueError, KeyError, TypeError):
+            raise ValueError("Etsy webhook payload needs shop_id and event_type")
+        return WebhookDelivery(platform=self.platform, delivery_id=delivery_id, shop=shop, topic=topic,
+                               payload=body.decode())
+
+    def orders(self, delivery: WebhookDelivery) -> Optional[List[dict]]:
+        return None
+
+PLATFORMS: Dict[str, WebhookPlatform] = {
+    ShopifyWebhooks.platform: ShopifyWebhooks(),
+    EtsyWebhooks.platform: EtsyWebhooks(),
+}
+
+def verify(platform: str, body: bytes, headers: Mapping[str, str]) -> WebhookDelivery:
+    """Checks size and signature. Raises KeyError for a platform without webhooks configured."""
+    if platform not in PLATFORMS or not WEBHOOK_SECRETS.get(platform):
+        raise KeyError(platform)
+    if len(body) > MAX_BODY_BYTES:
+        raise ValueError(f"Webhook body over {MAX_BODY_BYTES // 1024} KB")
+    return PLATFORMS[platform].verify(WEBHOOK_SECRETS[platform], body, headers)
+
+def enqueue(delivery: WebhookDelivery) -> bool:
+    """Stores the delivery; False if this delivery was queued before (a redelivery)."""
+    with Session(engine) as session:
+        session.add(delivery)
+        try:
+            session.commit()
+        except IntegrityError:
+            session.rollback()
+            return False
+    webhook_consumer.wake()
+    return True
+
+# ---------------------------------------------------------------------------
+# Importing, in batches
+
+class WebhookConsumer:
+    """
+    Background thread importing queued deliveries. A new delivery wakes it;
+    it waits COALESCE_SECONDS for the rest of a burst, then claims a batch with
+    a lease (as the outbox dispatcher does) and handles it per store: orders in
+    the payloads go through OrderService.import_external_orders in one
+    transaction, which skips external_ids already imported; stores with
+    notification-only events get one incremental sync however many arrived.
+    Failures are retried with backoff.
+    """
+
+    def __init__(self, batch_size: Optional[int] = None):
+        self.batch_size = batch_size or BATCH_SIZE
+        self.backlog = 0 # Deliveries waiting, as of the last round
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="webhook-consumer", daemon=True)
+        self._thread.start()
+
+    def shutdown(self, timeout: float = 10):
+        thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        thread.join(timeout)
+
+    def wake(self):
+        self._wake.set()
+
+    def overloaded(self) -> bool:
+        return self.backlog >= MAX_BACKLOG
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                claimed = self.consume_once()
+            except Exception:
+                logger.exception("Webhook import failed")
+                claimed = 0
+            if claimed < self.batch_size and self._wake.wait(POLL_SECONDS):
+                self._stop.wait(COALESCE_SECONDS)
+            self._wake.clear()
+
+    def consume_once(self) -> int:
+        """Claims, imports and records one batch. Returns the number of deliveries claimed."""
+        token = uuid.uuid4().hex
+        deliveries = self._claim(token)
+        if deliveries:
+            self._record(token, deliveries, self._process(deliveries))
+        return len(deliveries)
+
+    def _claim(self, token: str) -> List[WebhookDelivery]:
+        now = datetime.utcnow()
+        due = (
+            WebhookDelivery.status.in_(("pending", "processing")), # "processing" here means an expired lease
+            WebhookDelivery.next_attempt_at <= now,
+        )
+        with Session(engine) as session:
+            self.backlog = session.exec(
+                select(func.count()).select_from(WebhookDelivery)
+                .where(WebhookDelivery.status.in_(("pending", "processing")))
+            ).one()
+            ids = session.exec(
+                select(WebhookDelivery.id).where(*due)
+                .order_by(WebhookDelivery.next_attempt_at, WebhookDelivery.id)
+                .limit(self.batch_size)
+            ).all()
+            if not ids:
+                return []
+            session.exec(
+                update(WebhookDelivery)
+                .where(WebhookDelivery.id.in_(ids), *due)
+                .values(
+                    status="processing",
+                    claim_token=token,
+                    attempts=WebhookDelivery.attempts + 1,
+                    next_attempt_at=now + timedelta(seconds=LEASE_SECONDS),
+                )
+            )
+            session.commit()
+            return list(session.exec(
+                select(WebhookDelivery).where(WebhookDelivery.claim_token == token).order_by(WebhookDelivery.id)
+            ).all())
+
+    def _process(self, deliveries: List[WebhookDelivery]) -> Dict[int, Tuple[Optional[str], bool]]:
+        """(error, permanent) per delivery id; (None, False) when imported."""
+        from services.order_service import OrderService
+
+        results: Dict[int, Tuple[Optional[str], bool]] = {}
+        by_store: Dict[Tuple[str, str], List[WebhookDelivery]] = defaultdict(list)
+        for delivery in deliveries:
+            by_store[(delivery.platform, delivery.shop)].append(delivery)
+
+        with Session(engine) as session:
+            stores = {
+                (store.platform, store.shop_name): store
+                for store in session.exec(select(Store).where(
+                    Store.is_connected == True, Store.shop_name.in_({shop for _, shop in by_store})
+                )).all()
+            }
+        to_sync: Dict[int, Tuple[Store, List[WebhookDelivery]]] = {}
+        for key, group in by_store.items():
+            store = stores.get(key)
+            if store is None:
+                results.update({d.id: (f"No connected {key[0]} store {key[1]}", True) for d in group})
+                continue
+            orders, carried = [], []
+            for delivery in group:
+                try:
+                    payload_orders = PLATFORMS[delivery.platform].orders(delivery)
+                except (ValueError, KeyError, TypeError) as e:
+                    results[delivery.id] = (f"Unusable delivery: {e!r}", True)
+                    continue
+                if payload_orders is None:
+                    to_sync.setdefault(store.id, (store, []))[1].append(delivery)
+                else:
+                    orders.extend(payload_orders)
+                    carried.append(delivery)
+            if carried:
+                try:
+                    with Session(engine) as session:
+                        imported = OrderService(session).import_external_orders(store, orders)
+                    logger.info("Webhooks for store %s: %s orders imported, %s already known",
+                                store.id, imported.created, imported.skipped)
+                    results.update({d.id: (None, False) for d in carried})
+                except Exception as e:
+                    results.update({d.id: (repr(e), False) for d in carried})
+
+        if to_sync:
+            from services.sync_engine import SyncEngine
+
+            # Platform limits are per process, so this shares them with syncs started through the API
+            synced = asyncio.run(SyncEngine().sync_stores([store for store, _ in to_sync.values()]))
+            for result in synced:
+                error = (f"Sync failed: {result.error}", False) if result.error else (None, False)
+                results.update({d.id: error for d in to_sync[result.store_id][1]})
+        return results
+
+    def _record(self, token: str, deliveries: List[WebhookDelivery], results: Dict[int, Tuple[Optional[str], bool]]):
+        now = datetime.utcnow()
+        with Session(engine) as session:
+            done = [d.id for d in deliveries if results[d.id][0] is None]
+            if done:
+                session.exec(
+                    update(WebhookDelivery)
+                    .where(WebhookDelivery.id.in_(done), WebhookDelivery.claim_token == token)
+                    .values(status="done", processed_at=now, claim_token=None, last_error=None)
+                )
+            for delivery in deliveries:
+                error, permanent = results[delivery.id]
+                if error is None:
+                    continue
+                give_up = permanent or delivery.attempts >= MAX_ATTEMPTS
+                logger.warning("Webhook delivery %s attempt %s failed%s: %s", delivery.id, delivery.attempts,
+                               " permanently" if give_up else "", error)
+                session.exec(
+                    update(WebhookDelivery)
+                    .where(WebhookDelivery.id == delivery.id, WebhookDelivery.claim_token == token)
+                    .values(
+                        status="failed" if give_up else "pending",
+                        claim_token=None,
+                        last_error=error,
+                        next_attempt_at=now + timedelta(seconds=backoff_seconds(delivery.attempts)),
+                    )
+                )
+            session.commit()
+
+webhook_consumer = WebhookConsumer()
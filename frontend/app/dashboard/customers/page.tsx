@@ -19,7 +19,8 @@ interface User {
     is_admin: boolean;
     created_at: string;
     discount_percentage: number;
-    custom_pricing_json: string | null;
+    allow_on_account_payment: boolean;
+    has_custom_pricing: boolean;
 }
 
 export default function CustomersPage() {
@@ -148,7 +149,7 @@ export default function CustomersPage() {
                                             )}
                                         </TableCell>
                                         <TableCell>
-                                            {user.custom_pricing_json ? (
+                                            {user.has_custom_pricing ? (
                                                 <Badge variant="secondary" className="bg-blue-100 text-blue-700 hover:bg-blue-100 border-blue-200">
                                                     Custom Prices
                                                 </Badge>
@@ -41,7 +41,7 @@ export default function ImportOrdersPage() {
             const res = await fetch(`${API_URL}/integrations/orders`);
             if (res.ok) {
                 const data = await res.json();
-                setOrders(data);
+                setOrders(data.items);
             }
         } catch (error) {
             console.error("Failed to fetch orders", error);
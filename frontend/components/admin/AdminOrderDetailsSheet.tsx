@@ -128,8 +128,20 @@ export function AdminOrderDetailsSheet({ order, open, onOpenChange, onStatusChan
                                                         });
                                                         if (!res.ok) throw new Error('Generation failed');
 
+                                                        // Rendering runs as a background job; poll until it finishes
+                                                        let job = await res.json();
+                                                        while (job.status === 'queued' || job.status === 'running') {
+                                                            await new Promise((resolve) => setTimeout(resolve, 1000));
+                                                            const jobRes = await fetch(`${API_URL}/admin/production-jobs/${job.id}`);
+                                                            if (!jobRes.ok) throw new Error('Generation failed');
+                                                            job = await jobRes.json();
+                                                        }
+                                                        if (job.status !== 'succeeded') throw new Error(job.error || 'Generation failed');
+
                                                         // Trigger download
-                                                        const blob = await res.blob();
+                                                        const fileRes = await fetch(`${API_URL}/admin/production-jobs/${job.id}/download`);
+                                                        if (!fileRes.ok) throw new Error('Download failed');
+                                                        const blob = await fileRes.blob();
                                                         const url = window.URL.createObjectURL(blob);
                                                         const a = document.createElement('a');
                                                         a.href = url;
@@ -25,7 +25,6 @@ interface User {
     id: number;
     full_name: string;
     discount_percentage: number;
-    custom_pricing_json: string | null;
     allow_on_account_payment?: boolean;
 }
 
@@ -45,17 +44,25 @@ export function CustomerPricingDialog({ user, open, onOpenChange }: CustomerPric
         if (user) {
             setDiscount(user.discount_percentage.toString());
             setAllowOnAccount(!!user.allow_on_account_payment);
-            try {
-                const parsedPrices = user.custom_pricing_json ? JSON.parse(user.custom_pricing_json) : {};
-                const initialPrices: Record<string, string> = {};
-                TEXTURES.forEach(t => {
-                    initialPrices[t.id] = parsedPrices[t.id] ? parsedPrices[t.id].toString() : '';
-                });
-                setPrices(initialPrices);
-            } catch (e) {
-                console.error("Failed to parse pricing JSON", e);
-                setPrices({});
-            }
+            setPrices({});
+            if (!open) return;
+            // The customer list only says whether custom prices exist; load them for editing
+            const loadPrices = async () => {
+                try {
+                    const response = await fetch(`${API_URL}/admin/users/${user.id}`);
+                    const detail = response.ok ? await response.json() : {};
+                    const parsedPrices = detail.custom_pricing_json ? JSON.parse(detail.custom_pricing_json) : {};
+                    const initialPrices: Record<string, string> = {};
+                    TEXTURES.forEach(t => {
+                        initialPrices[t.id] = parsedPrices[t.id] ? parsedPrices[t.id].toString() : '';
+                    });
+                    setPrices(initialPrices);
+                } catch (e) {
+                    console.error("Failed to load custom pricing", e);
+                    setPrices({});
+                }
+            };
+            loadPrices();
         }
     }, [user, open]);
 